@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+YouTube批量下载工具 - 磁盘空间准入控制
+
+任务开始下载前，根据所选格式的 filesize/filesize_approx 估算下载和合并过程中的最大磁盘占用，
+在下载目录所在磁盘上预留这部分空间。剩余空间不足时任务继续排队，
+等其他任务完成或取消、释放预留后再开始，避免多个大文件同时下载把磁盘写满导致全部失败。
+
+预留量会扣除任务已经写入磁盘的字节数，避免与磁盘上已占用的空间重复计算。
+"""
+
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger('admission')
+
+# 分别下载视频和音频后再合并时，合并期间原始文件和合并结果同时存在
+MERGE_OVERHEAD = 2.0
+
+# 磁盘空间不足时，任务重新尝试准入前的等待时间（秒）
+RETRY_DELAY = 15.0
+
+
+class WaitForSpace(Exception):
+    """暂时没有足够的磁盘空间，任务应稍后再试"""
+
+
+class DiskSpaceError(Exception):
+    """即使其他任务都结束，磁盘空间也不足以完成该任务"""
+
+
+def format_size(size):
+    """把字节数格式化为便于阅读的字符串"""
+    for unit, scale in (('GB', 1024 ** 3), ('MB', 1024 ** 2), ('KB', 1024)):
+        if size >= scale:
+            return f"{size / scale:.1f}{unit}"
+    return f"{size}B"
+
+
+class _Reservation:
+    __slots__ = ('size', 'written')
+    
+    def __init__(self, size, written):
+        self.size = size
+        # 返回任务已写入磁盘字节数的函数
+        self.written = written
+    
+    def remaining(self):
+        try:
+            written = self.written() or 0
+        except Exception:
+            written = 0
+        return max(0, self.size - written)
+
+
+class DiskAdmission:
+    """按下载目录的剩余空间决定任务能否开始下载（线程安全）"""
+    
+    def __init__(self, path, min_free=512 * 1024 ** 2, merge_overhead=MERGE_OVERHEAD):
+        """初始化准入控制
+        
+        Args:
+            path: 下载目录
+            min_free: 始终保留的剩余空间（字节）
+            merge_overhead: 需要合并时，最大占用与所选格式大小之和的比例
+        """
+        self.path = path
+        self.min_free = max(0, int(min_free))
+        self.merge_overhead = merge_overhead
+        self.lock = threading.Lock()
+        self._reservations = {}
+    
+    def set_path(self, path):
+        """下载目录变化时调用"""
+        with self.lock:
+            self.path = path
+    
+    def estimate(self, formats, merge=False):
+        """估算下载所选格式的最大磁盘占用
+        
+        Args:
+            formats: yt-dlp选中的格式列表
+            merge: 下载后是否需要合并或转码
+        
+        Returns:
+            int: 字节数，格式没有大小信息时为0
+        """
+        size = sum(fmt.get('filesize') or fmt.get('filesize_approx') or 0 for fmt in formats)
+        return int(size * self.merge_overhead) if merge else int(size)
+    
+    def reserve(self, job_id, size, written=None):
+        """为任务预留磁盘空间
+        
+        Args:
+            job_id: 任务ID，重复预留时替换原来的预留
+            size: 需要预留的字节数
+            written: 返回任务已写入字节数的函数
+        
+        Raises:
+            WaitForSpace: 其他任务释放空间后可以开始
+            DiskSpaceError: 磁盘总剩余空间也不够
+        """
+        with self.lock:
+            self._reservations.pop(job_id, None)
+            if size <= 0:
+                return
+            free = shutil.disk_usage(self.path).free
+            pending = sum(item.remaining() for item in self._reservations.values())
+            available = free - pending - self.min_free
+            if size > available:
+                if size > free - self.min_free:
+                    raise DiskSpaceError(f"磁盘空间不足: 需要 {format_size(size)}，"
+                                         f"剩余 {format_size(max(0, free - self.min_free))}")
+                raise WaitForSpace(f"等待磁盘空间: 需要 {format_size(size)}，"
+                                   f"其他任务预留后剩余 {format_size(max(0, available))}")
+            self._reservations[job_id] = _Reservation(size, written or (lambda: 0))
+        logger.debug(f"预留磁盘空间 {format_size(size)}: {job_id}")
+    
+    def release(self, job_id):
+        """任务结束或取消后释放预留"""
+        with self.lock:
+            self._reservations.pop(job_id, None)
+    
+    def stats(self):
+        """获取磁盘空间和预留状态"""
+        with self.lock:
+            usage = shutil.disk_usage(self.path)
+            return {
+                'free': usage.free,
+                'min_free': self.min_free,
+                'reserved': sum(item.remaining() for item in self._reservations.values()),
+                'jobs': len(self._reservations),
+            }
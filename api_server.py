@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+YouTube批量下载工具 - 本地HTTP任务接口
+
+提供一个常驻进程，其他服务可以通过HTTP批量提交下载任务：
+
+    POST /jobs                  提交任务，JSON: {"urls": [...], "quality": "1080p", "download_type": "视频+音频"}
+                                播放列表和频道链接会在后台逐条展开为单个视频任务
+    GET  /jobs                  列出全部任务
+    GET  /jobs/<id>             查询单个任务
+    POST /jobs/<id>/cancel      取消任务
+    POST /jobs/<id>/pause       暂停任务
+    POST /jobs/<id>/resume      继续任务
+    GET  /events                以Server-Sent Events推送任务进度，可用 ?job=<id> 过滤
+    GET  /bandwidth             查询限速状态
+    GET  /concurrency           查询并发数、后处理队列和磁盘空间预留状态，启用自适应并发时包含最近的调整原因
+    GET  /proxies               查询代理池中各代理的延迟、成功率和隔离状态
+    POST /bandwidth             调整限速，JSON: {"global_limit": "2M", "job_limit": "0", "schedule": "00:00-07:00=0"}
+
+任务由YtdlpDownloader的工作线程池执行，并发数与图形界面相同，取自MaxConcurrentDownloads。
+"""
+
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from queue import Queue, Empty, Full
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from config_manager import ConfigManager
+from ytdlp_downloader import (YtdlpDownloader, STATUS_WAITING, STATUS_DOWNLOADING, STATUS_PROCESSING,
+                              DOWNLOAD_TYPES, QUALITY_HEIGHTS)
+from url_utils import is_playlist_url
+
+logger = logging.getLogger('api_server')
+
+
+class JobService:
+    """下载任务服务，负责任务登记、状态查询和进度事件分发"""
+    
+    def __init__(self, downloader, max_finished_jobs=1000, progress_interval=0.5):
+        """初始化任务服务
+        
+        Args:
+            downloader: YtdlpDownloader实例，可与图形界面共用
+            max_finished_jobs: 保留的已结束任务数量，超过后丢弃最早的任务
+            progress_interval: 同一任务进度事件的最小间隔（秒）
+        """
+        self.downloader = downloader
+        self.max_finished_jobs = max_finished_jobs
+        self.progress_interval = progress_interval
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+        self._finished = []
+        self._last_progress = {}
+        self._subscribers = []
+        self._playlist_cancel = threading.Event()
+    
+    def submit(self, url, quality="1080p", download_type="视频+音频", use_proxy=None):
+        """提交下载任务
+        
+        Returns:
+            DownloadTask: 已提交的任务
+        """
+        task = self.downloader.create_task(url, quality, download_type, use_proxy=use_proxy)
+        task.progress_callback = lambda p, s=None, t=task: self._on_progress(t, p, s)
+        with self.lock:
+            self.jobs[task.task_id] = task
+        self.downloader.submit(task, self._on_done)
+        self.publish('queued', task)
+        return task
+    
+    def submit_playlist(self, url, quality="1080p", download_type="视频+音频", use_proxy=None):
+        """在后台展开播放列表或频道，每发现一个视频就提交一个任务
+        
+        Returns:
+            threading.Thread: 后台展开线程
+        """
+        def on_finish(count, error):
+            self._broadcast({'event': 'playlist', 'time': round(time.time(), 3), 'url': url,
+                             'status': 'error' if error else 'expanded', 'count': count,
+                             'error': str(error) if error else None})
+        
+        self._broadcast({'event': 'playlist', 'time': round(time.time(), 3), 'url': url, 'status': 'expanding'})
+        return self.downloader.stream_playlist(
+            url,
+            lambda video_url: self.submit(video_url, quality, download_type, use_proxy),
+            on_finish,
+            use_proxy=use_proxy,
+            cancel_event=self._playlist_cancel
+        )
+    
+    def shutdown(self):
+        """停止所有正在展开的播放列表"""
+        self._playlist_cancel.set()
+    
+    def get(self, job_id):
+        """获取任务"""
+        with self.lock:
+            return self.jobs.get(job_id)
+    
+    def list(self):
+        """获取全部任务"""
+        with self.lock:
+            return list(self.jobs.values())
+    
+    def cancel(self, job_id):
+        """取消任务"""
+        self.downloader.cancel(job_id)
+    
+    def pause(self, job_id):
+        """暂停任务"""
+        self.downloader.pause(job_id)
+    
+    def resume(self, job_id):
+        """继续任务"""
+        self.downloader.resume(job_id)
+    
+    def subscribe(self):
+        """订阅进度事件
+        
+        Returns:
+            Queue: 事件队列，使用完毕后需调用unsubscribe
+        """
+        queue = Queue(maxsize=1000)
+        with self.lock:
+            self._subscribers.append(queue)
+        return queue
+    
+    def unsubscribe(self, queue):
+        """取消订阅"""
+        with self.lock:
+            if queue in self._subscribers:
+                self._subscribers.remove(queue)
+    
+    def publish(self, event, task):
+        """向所有订阅者发送事件，订阅者处理不及时时丢弃事件"""
+        self._broadcast({'event': event, 'time': round(time.time(), 3), 'job': task.to_dict()})
+    
+    def _broadcast(self, payload):
+        with self.lock:
+            subscribers = list(self._subscribers)
+        for queue in subscribers:
+            try:
+                queue.put_nowait(payload)
+            except Full:
+                pass
+    
+    def _on_progress(self, task, progress, status_text=None):
+        """任务进度回调，按最小间隔节流"""
+        now = time.monotonic()
+        with self.lock:
+            if progress < 1.0 and now - self._last_progress.get(task.task_id, 0) < self.progress_interval:
+                return
+            self._last_progress[task.task_id] = now
+        self.publish('progress', task)
+    
+    def _on_done(self, task):
+        """任务结束回调，只保留最近的已结束任务"""
+        with self.lock:
+            self._last_progress.pop(task.task_id, None)
+            self._finished.append(task.task_id)
+            while len(self._finished) > self.max_finished_jobs:
+                self.jobs.pop(self._finished.pop(0), None)
+        self.publish('done', task)
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """HTTP请求处理"""
+    
+    server_version = "YouTubeDownloaderAPI/1.0"
+    
+    @property
+    def service(self):
+        return self.server.job_service
+    
+    def log_message(self, format, *args):
+        logger.info("%s - %s" % (self.address_string(), format % args))
+    
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _read_json(self):
+        """读取请求中的JSON对象
+        
+        Raises:
+            ValueError: 请求内容不是有效的JSON对象
+        """
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            data = json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError:
+            raise ValueError('请求内容不是有效的JSON')
+        if not isinstance(data, dict):
+            raise ValueError('请求内容必须是JSON对象')
+        return data
+    
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        parts = [part for part in parsed.path.split('/') if part]
+        
+        if parts == ['jobs']:
+            self._send_json(200, {'jobs': [task.to_dict() for task in self.service.list()]})
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            task = self.service.get(parts[1])
+            if task:
+                self._send_json(200, task.to_dict())
+            else:
+                self._send_json(404, {'error': '任务不存在'})
+        elif parts == ['events']:
+            job_filter = parse_qs(parsed.query).get('job', [None])[0]
+            self._stream_events(job_filter)
+        elif parts == ['bandwidth']:
+            self._send_json(200, self.service.downloader.bandwidth.stats())
+        elif parts == ['concurrency']:
+            self._send_json(200, self.service.downloader.concurrency_stats())
+        elif parts == ['proxies']:
+            proxy_manager = self.service.downloader.proxy_manager
+            self._send_json(200, {'proxies': proxy_manager.get_pool().snapshot() if proxy_manager else []})
+        else:
+            self._send_json(404, {'error': '接口不存在'})
+    
+    def do_POST(self):
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        
+        if parts == ['jobs']:
+            try:
+                data = self._read_json()
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            
+            urls = data.get('urls') or ([data['url']] if data.get('url') else [])
+            if not urls:
+                self._send_json(400, {'error': '缺少url或urls'})
+                return
+            if not isinstance(urls, list) or not all(isinstance(url, str) and url.strip() for url in urls):
+                self._send_json(400, {'error': 'url必须是链接字符串，urls必须是链接字符串列表'})
+                return
+            
+            config = self.server.config_manager
+            quality = data.get('quality') or config.get_default_quality()
+            download_type = data.get('download_type') or config.get_default_type()
+            use_proxy = data.get('use_proxy')
+            if quality not in QUALITY_HEIGHTS:
+                self._send_json(400, {'error': f"quality必须是以下之一: {', '.join(QUALITY_HEIGHTS)}"})
+                return
+            if download_type not in DOWNLOAD_TYPES:
+                self._send_json(400, {'error': f"download_type必须是以下之一: {', '.join(DOWNLOAD_TYPES)}"})
+                return
+            if use_proxy is not None and not isinstance(use_proxy, bool):
+                self._send_json(400, {'error': 'use_proxy必须是true、false或null'})
+                return
+            tasks = []
+            playlists = []
+            for url in urls:
+                if is_playlist_url(url):
+                    self.service.submit_playlist(url, quality, download_type, use_proxy)
+                    playlists.append(url)
+                else:
+                    tasks.append(self.service.submit(url, quality, download_type, use_proxy))
+            self._send_json(201, {'jobs': [task.to_dict() for task in tasks], 'playlists': playlists})
+        
+        elif parts == ['bandwidth']:
+            try:
+                data = self._read_json()
+                bandwidth = self.service.downloader.bandwidth
+                bandwidth.set_limits(data.get('global_limit'), data.get('job_limit'), data.get('schedule'))
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            self._send_json(200, bandwidth.stats())
+        
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] in ('cancel', 'pause', 'resume'):
+            task = self.service.get(parts[1])
+            if not task:
+                self._send_json(404, {'error': '任务不存在'})
+                return
+            getattr(self.service, parts[2])(task.task_id)
+            self._send_json(200, task.to_dict())
+        
+        else:
+            self._send_json(404, {'error': '接口不存在'})
+    
+    def _stream_events(self, job_filter=None):
+        """以Server-Sent Events格式推送进度事件，直到客户端断开"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'keep-alive')
+        self.end_headers()
+        
+        queue = self.service.subscribe()
+        try:
+            # 先推送当前未结束任务的状态
+            for task in self.service.list():
+                if task.status in (STATUS_WAITING, STATUS_DOWNLOADING, STATUS_PROCESSING) and job_filter in (None, task.task_id):
+                    self._write_event({'event': 'snapshot', 'time': round(time.time(), 3), 'job': task.to_dict()})
+            
+            while True:
+                try:
+                    payload = queue.get(timeout=15)
+                except Empty:
+                    # 定期发送注释行保持连接
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                if job_filter and payload.get('job', {}).get('task_id') != job_filter:
+                    continue
+                self._write_event(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.service.unsubscribe(queue)
+    
+    def _write_event(self, payload):
+        try:
+            data = json.dumps(payload, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            # 无法序列化的事件只跳过这一条，不断开订阅
+            logger.error(f"无法序列化事件 {payload.get('event')}: {str(e)}")
+            return
+        self.wfile.write(f"event: {payload['event']}\ndata: {data}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+
+def create_server(downloader, config_manager, host="127.0.0.1", port=8770):
+    """创建HTTP服务器，可与图形界面共用同一个下载器
+    
+    Returns:
+        ThreadingHTTPServer: 尚未启动的服务器，调用serve_forever()开始处理请求
+    """
+    server = ThreadingHTTPServer((host, port), ApiRequestHandler)
+    server.daemon_threads = True
+    server.job_service = JobService(downloader)
+    server.config_manager = config_manager
+    return server
+
+
+def main(argv=None):
+    """启动HTTP任务服务"""
+    config = ConfigManager()
+    parser = argparse.ArgumentParser(prog='python -m api_server', description='YouTube批量下载工具 - HTTP任务接口')
+    parser.add_argument('--host', default=config.get_api_host(), help='监听地址')
+    parser.add_argument('--port', type=int, default=config.get_api_port(), help='监听端口')
+    parser.add_argument('-o', '--output', help='下载目录，默认使用config.ini中的DownloadPath')
+    args = parser.parse_args(argv)
+    
+    downloader = YtdlpDownloader(args.output or config.get_download_path(),
+                                 config.get_max_concurrent_downloads(), config)
+    server = create_server(downloader, config, args.host, args.port)
+    logger.info(f"HTTP任务接口已启动: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.job_service.shutdown()
+        downloader.shutdown()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+YouTube批量下载工具 - 带宽调度
+
+所有下载任务共用一个令牌桶调度器：
+- 全局限速：所有任务的下载速度总和
+- 单任务限速：每个任务各自的上限
+- 按时段限速：例如白天限速、夜间不限速
+- 公平分配：全局带宽在正在下载的任务之间平均分配
+
+限速值可以写成字节数或带单位的形式，如 "500K"、"2M"、"1.5M"，0表示不限速。
+时段规则写成 "09:00-18:00=2M, 00:00-07:00=0"，不在任何时段内时使用全局限速。
+"""
+
+import re
+import time
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger('bandwidth')
+
+# 超过该时间没有下载数据的任务不参与带宽分配（秒）
+IDLE_TIMEOUT = 2.0
+
+# 单次等待的最长时间，便于及时响应取消和限速调整（秒）
+MAX_SLEEP = 0.25
+
+_UNITS = {'': 1, 'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_rate(value):
+    """解析限速值
+    
+    Args:
+        value: 字节数或带单位的字符串，如 "500K"、"2M"
+    
+    Returns:
+        int: 每秒字节数，0表示不限速
+    """
+    if value is None:
+        return 0
+    if isinstance(value, (int, float)):
+        return max(0, int(value))
+    
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGB]?)(?:I?B)?(?:/S)?\s*', str(value).upper())
+    if not match:
+        raise ValueError(f"无效的限速值: {value}")
+    return int(float(match.group(1)) * _UNITS[match.group(2)])
+
+
+def format_rate(rate):
+    """把每秒字节数格式化为便于阅读的字符串"""
+    if not rate:
+        return "不限速"
+    for unit in ('G', 'M', 'K'):
+        if rate >= _UNITS[unit]:
+            return f"{rate / _UNITS[unit]:g}{unit}/s"
+    return f"{rate}B/s"
+
+
+def parse_schedule(text):
+    """解析时段限速规则
+    
+    Args:
+        text: 形如 "09:00-18:00=2M, 22:00-07:00=0" 的规则，可跨越午夜
+    
+    Returns:
+        list: [(开始分钟, 结束分钟, 每秒字节数), ...]
+    """
+    rules = []
+    for part in re.split(r'[,;\n]', text or ''):
+        part = part.strip()
+        if not part:
+            continue
+        match = re.fullmatch(r'(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)', part)
+        if not match:
+            raise ValueError(f"无效的时段规则: {part}")
+        start = int(match.group(1)) * 60 + int(match.group(2))
+        end = int(match.group(3)) * 60 + int(match.group(4))
+        if start >= 24 * 60 or end > 24 * 60:
+            raise ValueError(f"无效的时段规则: {part}")
+        rules.append((start, end, parse_rate(match.group(5))))
+    return rules
+
+
+class TokenBucket:
+    """令牌桶，允许预支令牌，调用方按返回的时间等待"""
+    
+    def __init__(self, rate=0):
+        self.rate = rate
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+    
+    def set_rate(self, rate):
+        """调整速率，突发容量为一秒的流量"""
+        if rate != self.rate:
+            self.rate = rate
+            self.tokens = min(self.tokens, float(rate))
+    
+    def reserve(self, amount, now):
+        """取出令牌
+        
+        Returns:
+            float: 需要等待的秒数，0表示无需等待
+        """
+        if not self.rate:
+            self.tokens = 0.0
+            self.updated = now
+            return 0.0
+        self.tokens = min(float(self.rate), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class BandwidthScheduler:
+    """所有下载任务共用的带宽调度器（线程安全）"""
+    
+    def __init__(self, global_limit=0, job_limit=0, schedule=None):
+        """初始化带宽调度器
+        
+        Args:
+            global_limit: 全局限速（每秒字节数），0表示不限速
+            job_limit: 单任务限速（每秒字节数），0表示不限速
+            schedule: parse_schedule返回的时段规则
+        """
+        self.lock = threading.Lock()
+        self.global_limit = 0
+        self.job_limit = 0
+        self.schedule = []
+        self._global_bucket = TokenBucket()
+        self._jobs = {}
+        # 限速设置的版本号，设置变化后正在等待的任务立即重新计算
+        self._generation = 0
+        self.set_limits(global_limit, job_limit, schedule)
+    
+    def set_limits(self, global_limit=None, job_limit=None, schedule=None):
+        """调整限速设置，立即对正在下载的任务生效，None表示保持不变"""
+        with self.lock:
+            if global_limit is not None:
+                self.global_limit = parse_rate(global_limit)
+            if job_limit is not None:
+                self.job_limit = parse_rate(job_limit)
+            if schedule is not None:
+                self.schedule = parse_schedule(schedule) if isinstance(schedule, str) else list(schedule)
+            self._generation += 1
+        logger.info(f"带宽设置: 全局 {format_rate(self.global_limit)}, 单任务 {format_rate(self.job_limit)}, "
+                    f"当前生效 {format_rate(self.current_global_limit())}")
+    
+    def current_global_limit(self, now=None):
+        """获取当前时段生效的全局限速"""
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end, rate in self.schedule:
+            if start <= end:
+                if start <= minute < end:
+                    return rate
+            elif minute >= start or minute < end:
+                return rate
+        return self.global_limit
+    
+    def unregister(self, job_id):
+        """任务结束后释放其带宽份额"""
+        with self.lock:
+            self._jobs.pop(job_id, None)
+    
+    def stats(self):
+        """获取当前限速状态"""
+        with self.lock:
+            now = time.monotonic()
+            active = sum(1 for job in self._jobs.values() if now - job['active'] < IDLE_TIMEOUT)
+            return {
+                'global_limit': self.global_limit,
+                'job_limit': self.job_limit,
+                'effective_global_limit': self.current_global_limit(),
+                'active_jobs': active,
+            }
+    
+    def throttle(self, job_id, amount, cancel_event=None):
+        """记录任务下载的字节数，超出限速时阻塞相应的时间
+        
+        Args:
+            job_id: 任务ID
+            amount: 本次下载的字节数
+            cancel_event: threading.Event，置位后立即返回
+        """
+        if amount <= 0:
+            return
+        
+        with self.lock:
+            now = time.monotonic()
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._jobs[job_id] = {'bucket': TokenBucket(), 'active': now}
+            job['active'] = now
+            
+            # 全局带宽在活跃任务之间平均分配，再受单任务上限约束
+            global_limit = self.current_global_limit()
+            active = sum(1 for item in self._jobs.values() if now - item['active'] < IDLE_TIMEOUT)
+            share = global_limit // max(1, active) if global_limit else 0
+            job_rate = min(rate for rate in (share, self.job_limit) if rate) if (share or self.job_limit) else 0
+            
+            self._global_bucket.set_rate(global_limit)
+            job['bucket'].set_rate(job_rate)
+            wait = max(self._global_bucket.reserve(amount, now), job['bucket'].reserve(amount, now))
+            generation = self._generation
+        
+        deadline = time.monotonic() + wait
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._generation != generation:
+                return
+            if cancel_event is not None:
+                if cancel_event.wait(min(remaining, MAX_SLEEP)):
+                    return
+            else:
+                time.sleep(min(remaining, MAX_SLEEP))
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+YouTube批量下载工具 - 命令行入口
+
+不依赖tkinter，可在无图形界面的服务器上通过cron或systemd运行：
+
+    python -m cli URL [URL ...]
+    python -m cli -i links.txt -j 8
+    cat links.txt | python -m cli -i -
+
+播放列表和频道链接会边展开边下载。
+
+每个任务的进度以一行JSON输出到标准输出，日志输出到标准错误。
+运行中修改config.ini的[Bandwidth]后发送SIGHUP，限速设置立即生效。
+"""
+
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import threading
+
+from config_manager import ConfigManager
+from ytdlp_downloader import YtdlpDownloader, STATUS_DONE, AUDIO_FORMATS
+from job_journal import JobJournal
+from url_utils import is_playlist_url
+
+logger = logging.getLogger('cli')
+
+# 下载类型的英文别名
+TYPE_ALIASES = {
+    'av': "视频+音频",
+    'video': "仅视频",
+    'audio': "仅音频",
+}
+
+
+class JsonProgressPrinter:
+    """把任务进度以JSON行的形式输出，同一任务的进度输出有最小间隔"""
+    
+    def __init__(self, stream=sys.stdout, interval=0.5):
+        self.stream = stream
+        self.interval = interval
+        self.lock = threading.Lock()
+        self._last_emit = {}
+    
+    def emit(self, event, **fields):
+        """输出一行JSON事件"""
+        record = {'event': event, 'time': round(time.time(), 3)}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+    
+    def progress(self, task, progress, status_text=None):
+        """输出进度事件，间隔过短的更新会被丢弃"""
+        now = time.monotonic()
+        with self.lock:
+            last = self._last_emit.get(task.task_id, 0)
+            if progress < 1.0 and now - last < self.interval:
+                return
+            self._last_emit[task.task_id] = now
+        self.emit('progress', task_id=task.task_id, url=task.url,
+                  progress=round(progress, 4), status=status_text,
+                  downloaded_bytes=task.downloaded_bytes, total_bytes=task.total_bytes)
+
+
+def read_urls(args):
+    """从命令行参数、文件或标准输入读取链接，忽略空行和#开头的注释"""
+    lines = list(args.urls)
+    if args.input:
+        if args.input == '-':
+            lines.extend(sys.stdin)
+        else:
+            with open(args.input, 'r', encoding='utf-8') as f:
+                lines.extend(f)
+    elif not lines and not sys.stdin.isatty():
+        lines.extend(sys.stdin)
+    
+    urls = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            urls.append(line)
+    return urls
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(prog='python -m cli', description='YouTube批量下载工具（命令行版）')
+    parser.add_argument('urls', nargs='*', help='YouTube视频链接')
+    parser.add_argument('-i', '--input', help='链接列表文件，每行一个链接，"-"表示标准输入')
+    parser.add_argument('-o', '--output', help='下载目录，默认使用config.ini中的DownloadPath')
+    parser.add_argument('-q', '--quality', help='视频质量 (最高质量, 4K, 2K, 1080p, 720p, 480p, 360p)')
+    parser.add_argument('-t', '--type', dest='download_type',
+                        help='下载类型 (视频+音频, 仅视频, 仅音频 或 av, video, audio)')
+    parser.add_argument('-j', '--workers', type=int, help='并发下载数，默认使用MaxConcurrentDownloads')
+    parser.add_argument('--audio-format', choices=AUDIO_FORMATS,
+                        help='仅音频时的输出格式：native保留原始音频不转码，mp3转码，默认使用config.ini中的设置')
+    proxy_group = parser.add_mutually_exclusive_group()
+    proxy_group.add_argument('--proxy', dest='use_proxy', action='store_true', default=None, help='强制使用代理')
+    proxy_group.add_argument('--no-proxy', dest='use_proxy', action='store_false', help='强制不使用代理')
+    parser.add_argument('--adaptive', action='store_true', default=None,
+                        help='根据下载速度和限流错误自动调整并发数，默认使用config.ini中的设置')
+    parser.add_argument('--rate-limit', help='全局限速，如 2M、500K，0表示不限速，默认使用config.ini中的设置')
+    parser.add_argument('--job-rate-limit', help='单任务限速，默认使用config.ini中的设置')
+    parser.add_argument('--journal', help='任务日志文件，指定后会先继续日志中未完成的任务')
+    parser.add_argument('--quiet', action='store_true', help='只输出警告和错误日志')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """命令行主函数
+    
+    Returns:
+        int: 退出码，全部任务成功时为0
+    """
+    args = parse_args(argv)
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+    
+    config = ConfigManager()
+    download_path = args.output or config.get_download_path()
+    quality = args.quality or config.get_default_quality()
+    download_type = TYPE_ALIASES.get(args.download_type, args.download_type) or config.get_default_type()
+    workers = args.workers or config.get_max_concurrent_downloads()
+    
+    downloader = YtdlpDownloader(download_path, workers, config)
+    if args.audio_format:
+        downloader.audio_format = args.audio_format
+    try:
+        downloader.bandwidth.set_limits(args.rate_limit, args.job_rate_limit)
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+    if args.journal:
+        downloader.set_journal(JobJournal(args.journal))
+    
+    printer = JsonProgressPrinter()
+    tasks = []
+    
+    # 先继续日志中未完成的任务
+    if downloader.journal:
+        for job in downloader.journal.unfinished():
+            tasks.append(downloader.create_task(job['url'], job['quality'], job['download_type'],
+                                                use_proxy=job['use_proxy'], task_id=job['job_id']))
+    playlists = []
+    for url in read_urls(args):
+        if is_playlist_url(url):
+            playlists.append(url)
+        else:
+            tasks.append(downloader.create_task(url, quality, download_type, use_proxy=args.use_proxy))
+    
+    if not tasks and not playlists:
+        logger.error("没有需要下载的链接")
+        return 2
+    
+    # 未结束的任务数加上正在展开的播放列表数，归零时全部完成；
+    # 直接提交的任务在提交前全部计入，另外多计1直到提交结束，避免先完成的任务提前归零
+    counts = {'total': 0, 'succeeded': 0, 'failed': 0}
+    pending = [len(tasks) + len(playlists) + 1]
+    all_done = threading.Event()
+    lock = threading.Lock()
+    cancel_event = threading.Event()
+    
+    def finish_one():
+        with lock:
+            pending[0] -= 1
+            if pending[0] == 0:
+                all_done.set()
+    
+    def on_done(task):
+        if task.status == STATUS_DONE:
+            printer.emit('skipped' if task.skipped else 'done', task_id=task.task_id, url=task.url,
+                         file=task.result, processing=task.processing,
+                         from_store=task.from_store)
+        else:
+            printer.emit('error', task_id=task.task_id, url=task.url, status=task.status,
+                         error=str(task.error) if task.error else None)
+        with lock:
+            counts['succeeded' if task.status == STATUS_DONE else 'failed'] += 1
+        finish_one()
+    
+    def submit(task, counted=False):
+        """提交任务，counted为True表示已计入pending（直接提交的任务）"""
+        with lock:
+            if not counted:
+                pending[0] += 1
+            counts['total'] += 1
+        task.progress_callback = lambda p, s=None, t=task: printer.progress(t, p, s)
+        printer.emit('queued', task_id=task.task_id, url=task.url,
+                     quality=task.quality, download_type=task.download_type)
+        downloader.submit(task, on_done)
+    
+    # 自适应并发：每次调整并发数时输出一行事件
+    if args.adaptive or downloader.concurrency:
+        downloader.set_adaptive_concurrency(
+            True, lambda level, reason: printer.emit('concurrency', level=level, reason=reason))
+    
+    def on_playlist_finish(url, count, error):
+        printer.emit('playlist', url=url, status='error' if error else 'expanded', count=count,
+                     error=str(error) if error else None)
+        finish_one()
+    
+    # 收到终止信号时中断下载，任务日志中的任务下次运行时继续
+    def on_signal(signum, frame):
+        logger.warning(f"收到信号 {signum}，正在中断下载...")
+        cancel_event.set()
+        downloader.shutdown()
+    
+    # 收到SIGHUP时重新读取限速设置，命令行参数指定的限速保持不变
+    def on_reload(signum, frame):
+        config.load_config()
+        downloader.reload_bandwidth_settings()
+        downloader.bandwidth.set_limits(args.rate_limit, args.job_rate_limit)
+    
+    signal.signal(signal.SIGINT, on_signal)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, on_signal)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, on_reload)
+    
+    for task in tasks:
+        submit(task, counted=True)
+    
+    # 播放列表边展开边下载
+    for url in playlists:
+        printer.emit('playlist', url=url, status='expanding')
+        downloader.stream_playlist(
+            url,
+            lambda video_url: submit(downloader.create_task(video_url, quality, download_type, use_proxy=args.use_proxy)),
+            lambda count, error, u=url: on_playlist_finish(u, count, error),
+            args.use_proxy, cancel_event=cancel_event
+        )
+    # 全部任务和播放列表已提交
+    finish_one()
+    
+    # 使用带超时的等待，保证主线程能及时处理信号
+    while not all_done.wait(0.5):
+        pass
+    
+    printer.emit('summary', **counts)
+    return 0 if counts['failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
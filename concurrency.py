@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+YouTube批量下载工具 - 自适应并发控制
+
+按固定间隔采样所有任务的总下载速度，以AIMD方式调整并发下载数：
+- 总吞吐量随并发数上升时，每次增加一个并发
+- 出现429等限流错误，或单任务速度骤降时，并发数减半
+- 增加并发后总吞吐量反而下降时，回退上一次的增加
+
+每次调整的原因写入日志，并可通过stats()查询。
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+
+from retry_policy import ERROR_THROTTLED, classify_error
+
+logger = logging.getLogger('concurrency')
+
+# 总吞吐量增加超过该比例才视为上升
+GAIN_THRESHOLD = 0.05
+
+# 总吞吐量下降超过该比例时回退
+DROP_THRESHOLD = 0.10
+
+# 单任务速度降到上次的该比例以下，且总吞吐量没有上升时，视为被限速
+PER_JOB_COLLAPSE = 0.5
+
+# 连续稳定多少次采样后重新尝试增加并发
+PROBE_AFTER = 6
+
+
+def is_throttle_error(error):
+    """判断错误是否为服务器限流，与重试策略使用同一套错误分类"""
+    return classify_error(error) == ERROR_THROTTLED
+
+
+class AdaptiveConcurrency:
+    """根据吞吐量和错误率自动调整YtdlpDownloader的并发下载数"""
+    
+    def __init__(self, downloader, min_workers=1, max_workers=16, interval=10.0, on_change=None):
+        """初始化自适应并发控制
+        
+        Args:
+            downloader: YtdlpDownloader实例
+            min_workers: 最小并发数
+            max_workers: 最大并发数
+            interval: 采样间隔（秒）
+            on_change: 并发数变化时的回调，签名为 on_change(level, reason)
+        """
+        self.downloader = downloader
+        self.min_workers = max(1, int(min_workers))
+        self.max_workers = max(self.min_workers, int(max_workers))
+        self.interval = interval
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.history = deque(maxlen=50)
+        self.throttle_errors = 0
+        self.reason = "尚未采样"
+        self.throughput = 0.0
+        self.per_job_speed = 0.0
+        
+        self._pending_errors = 0
+        self._last_bytes = downloader.bytes_received
+        self._last_time = time.monotonic()
+        # 上一次采样的结果，用于判断吞吐量变化趋势
+        self._prev_throughput = None
+        self._prev_per_job = None
+        self._stable_samples = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    @property
+    def level(self):
+        """当前并发数"""
+        return self.downloader.max_workers
+    
+    def start(self):
+        """启动后台采样线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        logger.info(f"自适应并发已启用: {self.min_workers}-{self.max_workers}，采样间隔 {self.interval} 秒")
+    
+    def stop(self):
+        """停止后台采样线程"""
+        self._stop_event.set()
+    
+    def record_error(self, error):
+        """记录下载错误，限流错误会在下次采样时触发并发减半"""
+        if is_throttle_error(error):
+            with self.lock:
+                self._pending_errors += 1
+                self.throttle_errors += 1
+    
+    def stats(self):
+        """获取当前并发状态和最近的调整记录"""
+        with self.lock:
+            return {
+                'adaptive': True,
+                'level': self.level,
+                'min_workers': self.min_workers,
+                'max_workers': self.max_workers,
+                'reason': self.reason,
+                'throughput': round(self.throughput),
+                'per_job_speed': round(self.per_job_speed),
+                'throttle_errors': self.throttle_errors,
+                'history': list(self.history),
+            }
+    
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"自适应并发采样失败: {str(e)}")
+    
+    def sample(self):
+        """采样一次并调整并发数
+        
+        Returns:
+            int: 调整后的并发数
+        """
+        now = time.monotonic()
+        received = self.downloader.bytes_received
+        elapsed = max(now - self._last_time, 1e-6)
+        throughput = (received - self._last_bytes) / elapsed
+        self._last_bytes, self._last_time = received, now
+        
+        running, queued = self.downloader.running_counts()
+        per_job = throughput / running if running else 0.0
+        
+        with self.lock:
+            errors, self._pending_errors = self._pending_errors, 0
+            self.throughput, self.per_job_speed = throughput, per_job
+        
+        level = self.level
+        prev_throughput, prev_per_job = self._prev_throughput, self._prev_per_job
+        new_level, reason = self._decide(level, throughput, per_job, running, queued, errors,
+                                         prev_throughput, prev_per_job)
+        
+        if running:
+            self._prev_throughput, self._prev_per_job = throughput, per_job
+        else:
+            self._prev_throughput = self._prev_per_job = None
+        
+        new_level = min(self.max_workers, max(self.min_workers, new_level))
+        with self.lock:
+            self.reason = reason
+            self.history.append({
+                'time': round(time.time(), 3),
+                'level': new_level,
+                'throughput': round(throughput),
+                'per_job_speed': round(per_job),
+                'running': running,
+                'reason': reason,
+            })
+        
+        if new_level != level:
+            logger.info(f"自适应并发: {level} -> {new_level}，{reason}"
+                        f"（总速度 {throughput / 1024:.0f}KB/s，单任务 {per_job / 1024:.0f}KB/s）")
+            self.downloader.set_max_workers(new_level)
+            if self.on_change:
+                self.on_change(new_level, reason)
+        else:
+            logger.debug(f"自适应并发保持 {level}，{reason}")
+        return new_level
+    
+    def _decide(self, level, throughput, per_job, running, queued, errors, prev_throughput, prev_per_job):
+        """AIMD决策：乘性减少，加性增加
+        
+        Returns:
+            tuple: (新的并发数, 原因)
+        """
+        if errors:
+            self._stable_samples = 0
+            return level // 2, f"出现 {errors} 次限流错误，并发减半"
+        
+        if running < level and queued == 0:
+            return level, "待下载任务不足，保持并发"
+        
+        if prev_throughput is None:
+            return level + 1, "开始探测可用带宽"
+        
+        if prev_per_job and per_job < prev_per_job * PER_JOB_COLLAPSE and throughput <= prev_throughput:
+            self._stable_samples = 0
+            return level // 2, "单任务速度骤降，疑似被限速，并发减半"
+        
+        if throughput > prev_throughput * (1 + GAIN_THRESHOLD):
+            self._stable_samples = 0
+            return level + 1, "总吞吐量上升，增加并发"
+        
+        if throughput < prev_throughput * (1 - DROP_THRESHOLD):
+            self._stable_samples = 0
+            return level - 1, "增加并发后总吞吐量下降，回退"
+        
+        self._stable_samples += 1
+        if self._stable_samples >= PROBE_AFTER:
+            self._stable_samples = 0
+            return level + 1, "吞吐量稳定，重新探测"
+        return level, "总吞吐量不再上升，保持并发"
@@ -35,7 +35,60 @@ class ConfigManager:
             self.config["Settings"] = {
                 "DefaultQuality": "1080p",
                 "DefaultType": "视频+音频",
-                "MaxConcurrentDownloads": "10"
+                "MaxConcurrentDownloads": "3",
+                "UseDownloadArchive": "true",
+                "ResumeUnfinishedJobs": "true"
+            }
+            self.config["Api"] = {
+                "Enabled": "false",
+                "Host": "127.0.0.1",
+                "Port": "8770"
+            }
+            self.config["Cache"] = {
+                "MetadataCacheEnabled": "true",
+                "MetadataCacheTTL": "14400",
+                "MetadataCacheMaxEntries": "2000"
+            }
+            self.config["Download"] = {
+                "SegmentedDownload": "false",
+                "ConcurrentFragments": "4",
+                "CodecAwareFormats": "true",
+                "AudioFormat": "native",
+                "StreamingMerge": "false",
+                "DiskAdmission": "true",
+                "MinFreeSpaceMB": "512",
+                "SessionPool": "true",
+                "MaxSessions": "8",
+                "SessionIdleTimeout": "300"
+            }
+            self.config["PostProcess"] = {
+                "Workers": "0",
+                "MaxPending": "0"
+            }
+            self.config["Storage"] = {
+                "ContentStore": "false",
+                "StorePath": "",
+                "LinkMode": "hardlink",
+                "VerifyHash": "false"
+            }
+            self.config["Concurrency"] = {
+                "Adaptive": "false",
+                "MinWorkers": "1",
+                "MaxWorkers": "16",
+                "SampleInterval": "10"
+            }
+            self.config["Retry"] = {
+                "Throttled": "5",
+                "Network": "4",
+                "Proxy": "2",
+                "Unknown": "2",
+                "BaseDelay": "2",
+                "MaxDelay": "300"
+            }
+            self.config["Bandwidth"] = {
+                "GlobalLimit": "0",
+                "JobLimit": "0",
+                "Schedule": ""
             }
             self.save_config()
     
@@ -78,9 +131,167 @@ class ConfigManager:
     
     def get_max_concurrent_downloads(self):
         """获取最大并发下载数"""
-        return int(self.config.get("Settings", "MaxConcurrentDownloads"))
+        return max(1, self.config.getint("Settings", "MaxConcurrentDownloads", fallback=3))
     
     def set_max_concurrent_downloads(self, count):
         """设置最大并发下载数"""
         self.config["Settings"]["MaxConcurrentDownloads"] = str(count)
-        self.save_config()
\ No newline at end of file
+        self.save_config()
+    
+    def is_download_archive_enabled(self):
+        """是否启用下载记录，启用后已下载的视频会被跳过"""
+        return self.config.getboolean("Settings", "UseDownloadArchive", fallback=True)
+    
+    def is_resume_enabled(self):
+        """是否在启动时恢复上次未完成的任务"""
+        return self.config.getboolean("Settings", "ResumeUnfinishedJobs", fallback=True)
+    
+    def is_metadata_cache_enabled(self):
+        """是否启用视频信息缓存"""
+        return self.config.getboolean("Cache", "MetadataCacheEnabled", fallback=True)
+    
+    def get_metadata_cache_ttl(self):
+        """获取视频信息缓存有效期（秒）"""
+        return self.config.getint("Cache", "MetadataCacheTTL", fallback=14400)
+    
+    def get_metadata_cache_max_entries(self):
+        """获取视频信息缓存最大条目数"""
+        return self.config.getint("Cache", "MetadataCacheMaxEntries", fallback=2000)
+    
+    def is_adaptive_concurrency_enabled(self):
+        """是否根据吞吐量和限流错误自动调整并发下载数"""
+        return self.config.getboolean("Concurrency", "Adaptive", fallback=False)
+    
+    def set_adaptive_concurrency_enabled(self, enabled):
+        """设置是否启用自适应并发"""
+        if "Concurrency" not in self.config:
+            self.config["Concurrency"] = {}
+        self.config["Concurrency"]["Adaptive"] = "true" if enabled else "false"
+        self.save_config()
+    
+    def get_adaptive_min_workers(self):
+        """获取自适应并发的最小并发数"""
+        return max(1, self.config.getint("Concurrency", "MinWorkers", fallback=1))
+    
+    def get_adaptive_max_workers(self):
+        """获取自适应并发的最大并发数"""
+        return max(1, self.config.getint("Concurrency", "MaxWorkers", fallback=16))
+    
+    def get_adaptive_sample_interval(self):
+        """获取自适应并发的采样间隔（秒）"""
+        return max(1.0, self.config.getfloat("Concurrency", "SampleInterval", fallback=10.0))
+    
+    def is_segmented_download_enabled(self):
+        """是否启用分段下载，单个文件通过多个连接并行下载"""
+        return self.config.getboolean("Download", "SegmentedDownload", fallback=False)
+    
+    def get_concurrent_fragments(self):
+        """获取单个文件的并行分段数"""
+        return max(1, self.config.getint("Download", "ConcurrentFragments", fallback=4))
+    
+    def is_codec_aware_formats_enabled(self):
+        """是否按编码选择可直接复制码流合并的视频和音频"""
+        return self.config.getboolean("Download", "CodecAwareFormats", fallback=True)
+    
+    def get_audio_format(self):
+        """获取仅音频下载的输出格式：native保留原始音频，mp3转码"""
+        audio_format = self.config.get("Download", "AudioFormat", fallback="native").strip().lower()
+        return audio_format if audio_format in ("native", "mp3") else "native"
+    
+    def is_streaming_merge_enabled(self):
+        """是否边下载边合并视频和音频，不保存中间文件"""
+        return self.config.getboolean("Download", "StreamingMerge", fallback=False)
+    
+    def is_disk_admission_enabled(self):
+        """是否在下载前检查并预留磁盘空间"""
+        return self.config.getboolean("Download", "DiskAdmission", fallback=True)
+    
+    def get_min_free_space(self):
+        """获取下载时始终保留的磁盘剩余空间（字节）"""
+        return max(0, self.config.getint("Download", "MinFreeSpaceMB", fallback=512)) * 1024 ** 2
+    
+    def is_session_pool_enabled(self):
+        """是否在任务之间复用网络连接"""
+        return self.config.getboolean("Download", "SessionPool", fallback=True)
+    
+    def get_max_sessions(self):
+        """获取最多保留的网络会话数"""
+        return max(1, self.config.getint("Download", "MaxSessions", fallback=8))
+    
+    def get_session_idle_timeout(self):
+        """获取网络会话的空闲超时（秒）"""
+        return self.config.getfloat("Download", "SessionIdleTimeout", fallback=300.0)
+    
+    def get_postprocess_workers(self):
+        """获取同时执行的FFmpeg后处理数，0表示CPU核心数"""
+        return max(0, self.config.getint("PostProcess", "Workers", fallback=0))
+    
+    def get_postprocess_max_pending(self):
+        """获取后处理队列的容量，队列满时下载线程等待，0表示后处理数的两倍"""
+        return max(0, self.config.getint("PostProcess", "MaxPending", fallback=0))
+    
+    def is_content_store_enabled(self):
+        """是否把下载完成的文件保存到按视频ID和格式索引的内容存储中"""
+        return self.config.getboolean("Storage", "ContentStore", fallback=False)
+    
+    def get_content_store_path(self):
+        """获取内容存储目录，为空时使用下载目录下的.store"""
+        return self.config.get("Storage", "StorePath", fallback="").strip()
+    
+    def get_store_link_mode(self):
+        """获取下载目录中的文件指向内容存储的方式：hardlink（硬链接）或symlink（符号链接）"""
+        link_mode = self.config.get("Storage", "LinkMode", fallback="hardlink").strip().lower()
+        return link_mode if link_mode in ("hardlink", "symlink") else "hardlink"
+    
+    def is_store_hash_verification_enabled(self):
+        """复用内容存储中的文件前是否重新计算并校验SHA-256"""
+        return self.config.getboolean("Storage", "VerifyHash", fallback=False)
+    
+    def get_retry_budgets(self):
+        """获取各类错误的重试次数，永久错误和取消不重试"""
+        return {
+            "throttled": self.config.getint("Retry", "Throttled", fallback=5),
+            "network": self.config.getint("Retry", "Network", fallback=4),
+            "proxy": self.config.getint("Retry", "Proxy", fallback=2),
+            "unknown": self.config.getint("Retry", "Unknown", fallback=2),
+        }
+    
+    def get_retry_base_delay(self):
+        """获取重试退避的基础时间（秒）"""
+        return self.config.getfloat("Retry", "BaseDelay", fallback=2.0)
+    
+    def get_retry_max_delay(self):
+        """获取单次重试的最长等待时间（秒）"""
+        return self.config.getfloat("Retry", "MaxDelay", fallback=300.0)
+    
+    def get_global_rate_limit(self):
+        """获取全局限速，如 "2M"，0表示不限速"""
+        return self.config.get("Bandwidth", "GlobalLimit", fallback="0")
+    
+    def get_job_rate_limit(self):
+        """获取单任务限速，0表示不限速"""
+        return self.config.get("Bandwidth", "JobLimit", fallback="0")
+    
+    def get_rate_limit_schedule(self):
+        """获取按时段限速规则，如 "09:00-18:00=2M, 00:00-07:00=0" """
+        return self.config.get("Bandwidth", "Schedule", fallback="")
+    
+    def set_rate_limits(self, global_limit, job_limit):
+        """保存全局限速和单任务限速"""
+        if "Bandwidth" not in self.config:
+            self.config["Bandwidth"] = {}
+        self.config["Bandwidth"]["GlobalLimit"] = str(global_limit)
+        self.config["Bandwidth"]["JobLimit"] = str(job_limit)
+        self.save_config()
+    
+    def is_api_enabled(self):
+        """是否在图形界面中同时启动HTTP任务接口"""
+        return self.config.getboolean("Api", "Enabled", fallback=False)
+    
+    def get_api_host(self):
+        """获取HTTP任务接口监听地址"""
+        return self.config.get("Api", "Host", fallback="127.0.0.1")
+    
+    def get_api_port(self):
+        """获取HTTP任务接口监听端口"""
+        return self.config.getint("Api", "Port", fallback=8770)
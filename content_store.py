@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+YouTube批量下载工具 - 内容存储
+
+下载完成的文件按SHA-256保存在存储目录中，SQLite索引记录 视频ID + 格式ID + 扩展名 对应的文件。
+下载目录中的文件是指向存储的硬链接（或符号链接），不额外占用空间；
+内容相同的文件只保存一份。
+
+再次请求存储中已有的视频和格式时（换了下载目录、清除了下载记录、不同质量选中了相同格式等），
+直接创建链接，不再下载。复用前检查文件大小，可选重新计算SHA-256校验内容。
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger('content_store')
+
+LINK_MODES = ("hardlink", "symlink")
+
+# 计算哈希时每次读取的字节数
+_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentStore:
+    """按内容哈希保存文件、按视频和格式索引的存储（线程安全）"""
+    
+    def __init__(self, store_dir, link_mode="hardlink", verify=False):
+        """初始化内容存储
+        
+        Args:
+            store_dir: 存储目录，硬链接要求与下载目录在同一个磁盘分区
+            link_mode: 下载目录中的文件指向存储的方式，hardlink或symlink；
+                       无法创建硬链接时（如跨分区）改用符号链接，都失败时复制文件
+            verify: 复用文件前是否重新计算SHA-256
+        """
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"不支持的链接方式: {link_mode}")
+        self.store_dir = os.path.abspath(store_dir)
+        self.link_mode = link_mode
+        self.verify = verify
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+        self.deduplicated = 0
+        self.lock = threading.Lock()
+        
+        os.makedirs(os.path.join(self.store_dir, "objects"), exist_ok=True)
+        self.db_path = os.path.join(self.store_dir, "index.sqlite3")
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            "video_id TEXT NOT NULL, format_id TEXT NOT NULL, ext TEXT NOT NULL, "
+            "sha256 TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL, "
+            "PRIMARY KEY (video_id, format_id, ext))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sha256 ON objects(sha256)")
+        self.conn.commit()
+    
+    def object_path(self, sha256, ext):
+        """内容哈希对应的存储文件路径"""
+        return os.path.join(self.store_dir, "objects", sha256[:2], sha256 + ext)
+    
+    def link(self, video_id, format_id, ext, dest):
+        """存储中有该视频和格式时，在dest创建指向存储文件的链接
+        
+        dest已存在且不是同一个文件时不覆盖。
+        
+        Args:
+            video_id: 视频ID
+            format_id: yt-dlp格式ID，合并的格式如 137+140
+            ext: 文件扩展名，如 .mp4
+            dest: 下载目录中的文件路径
+        
+        Returns:
+            bool: 是否已链接（dest已指向存储文件时也返回True）
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT sha256, size FROM objects WHERE video_id = ? AND format_id = ? AND ext = ?",
+                (video_id, format_id, ext)
+            ).fetchone()
+        if row is None:
+            self._count_miss()
+            return False
+        
+        sha256, size = row
+        path = self.object_path(sha256, ext)
+        if not self._check_object(path, sha256, size):
+            logger.warning(f"存储文件缺失或内容不一致，重新下载: {video_id} {format_id}")
+            with self.lock:
+                self.conn.execute(
+                    "DELETE FROM objects WHERE video_id = ? AND format_id = ? AND ext = ?",
+                    (video_id, format_id, ext)
+                )
+                self.conn.commit()
+            self._count_miss()
+            return False
+        
+        if os.path.lexists(dest):
+            if not os.path.exists(dest) or not os.path.samefile(path, dest):
+                self._count_miss()
+                return False
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+            self._place_link(path, dest)
+        
+        with self.lock:
+            self.conn.execute(
+                "UPDATE objects SET last_access = ? WHERE video_id = ? AND format_id = ? AND ext = ?",
+                (time.time(), video_id, format_id, ext)
+            )
+            self.conn.commit()
+            self.hits += 1
+        logger.info(f"从内容存储链接: {dest}")
+        return True
+    
+    def add(self, video_id, format_id, ext, path, sha256=None):
+        """把下载完成的文件放入存储，原路径替换为指向存储文件的链接
+        
+        存储中已有相同内容的文件时删除新文件，只保留链接。
+        
+        Args:
+            sha256: 已计算好的文件SHA-256，为None时在此计算
+        
+        Returns:
+            str: 存储文件路径
+        """
+        path = os.path.abspath(path)
+        if os.path.islink(path):
+            # 已经是链接（如符号链接模式下复用的文件），无需再次保存
+            return os.path.realpath(path)
+        
+        if sha256 is None:
+            sha256 = file_sha256(path)
+        size = os.path.getsize(path)
+        stored = self.object_path(sha256, ext)
+        os.makedirs(os.path.dirname(stored), exist_ok=True)
+        
+        with self.lock:
+            if os.path.exists(stored) and not self._check_object(stored, sha256, size):
+                # 存储文件已被修改（硬链接的另一端被编辑过），用新下载的文件替换
+                logger.warning(f"存储文件内容不一致，重新保存: {stored}")
+                os.remove(stored)
+            if os.path.exists(stored):
+                if not os.path.samefile(stored, path):
+                    # 内容相同，只保留存储中的文件
+                    self._place_link(stored, path)
+                    self.deduplicated += 1
+            elif not self._store_file(path, stored):
+                shutil.move(path, stored)
+                self._place_link(stored, path)
+            
+            now = time.time()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO objects (video_id, format_id, ext, sha256, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (video_id, format_id, ext, sha256, size, now, now)
+            )
+            self.conn.commit()
+            self.added += 1
+        logger.info(f"已保存到内容存储: {video_id} {format_id} ({sha256[:12]})")
+        return stored
+    
+    def _store_file(self, path, stored):
+        """硬链接模式下直接为下载的文件在存储中增加一个硬链接，不移动文件
+        
+        Returns:
+            bool: 是否成功，失败时（如跨分区）由调用方移动文件
+        """
+        if self.link_mode != "hardlink":
+            return False
+        try:
+            os.link(path, stored)
+            return True
+        except OSError:
+            return False
+    
+    def _place_link(self, stored, dest):
+        """用指向stored的链接替换dest，先创建临时链接再原子替换"""
+        temp_path = dest + '.linking'
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+        if self.link_mode == "hardlink":
+            try:
+                os.link(stored, temp_path)
+                os.replace(temp_path, dest)
+                return
+            except OSError as e:
+                logger.debug(f"无法创建硬链接，改用符号链接: {str(e)}")
+        try:
+            os.symlink(stored, temp_path)
+        except OSError as e:
+            logger.warning(f"无法创建链接，复制文件: {str(e)}")
+            shutil.copy2(stored, temp_path)
+        os.replace(temp_path, dest)
+    
+    def _check_object(self, path, sha256, size):
+        """检查存储文件是否存在、大小一致，开启校验时比较SHA-256"""
+        try:
+            if os.path.getsize(path) != size:
+                return False
+        except OSError:
+            return False
+        return not self.verify or file_sha256(path) == sha256
+    
+    def _count_miss(self):
+        with self.lock:
+            self.misses += 1
+    
+    def stats(self):
+        """获取内容存储的使用情况"""
+        with self.lock:
+            count, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM "
+                "(SELECT sha256, MAX(size) AS size FROM objects GROUP BY sha256)"
+            ).fetchone()
+            return {
+                'objects': count,
+                'bytes': size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'added': self.added,
+                'deduplicated': self.deduplicated,
+            }
+    
+    def close(self):
+        """关闭索引数据库"""
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+下载记录模块
+
+记录已经下载过的视频ID，启动时一次性载入内存，
+在发起任何网络请求之前即可判断视频是否已下载。
+"""
+
+import os
+import threading
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('download_archive')
+
+
+class DownloadArchive:
+    """已下载视频的索引文件
+    
+    记录文件与yt-dlp的--download-archive格式相同：每行一条记录，形如 "youtube <视频ID>"，
+    可以直接交给yt-dlp使用，yt-dlp写入的记录也能被本工具识别。
+    下载类型和质量另外保存在同目录的 *.variants.txt 中，每行形如
+    "youtube dQw4w9WgXcQ 视频+音频@1080p"；
+    没有类型记录的视频（例如yt-dlp下载的）视为任意类型和质量都已下载。
+    """
+    
+    EXTRACTOR = "youtube"
+    
+    def __init__(self, archive_path, variants_path=None):
+        """初始化下载记录
+        
+        Args:
+            archive_path: 记录文件路径
+            variants_path: 类型和质量记录文件路径，默认为 <记录文件名>.variants.txt
+        """
+        self.archive_path = archive_path
+        if variants_path is None:
+            root, ext = os.path.splitext(archive_path)
+            variants_path = f"{root}.variants{ext or '.txt'}"
+        self.variants_path = variants_path
+        self.lock = threading.Lock()
+        # 已下载的视频ID {视频ID: 已下载的类型标识集合}
+        self._entries = {}
+        self.load()
+    
+    @staticmethod
+    def make_variant(download_type, quality):
+        """生成记录中的类型标识，仅音频时与质量无关"""
+        if download_type == "仅音频":
+            return download_type
+        return f"{download_type}@{quality}"
+    
+    def load(self):
+        """从文件载入全部记录
+        
+        旧版本把类型标识直接写在记录文件的行尾，yt-dlp无法识别；
+        载入时把这类记录拆分到类型记录文件中，并重写记录文件。
+        """
+        entries = {}
+        legacy = []
+        for line in self._read_lines(self.archive_path):
+            parts = line.split(" ", 2)
+            if len(parts) < 2 or parts[0] != self.EXTRACTOR:
+                continue
+            variants = entries.setdefault(parts[1], set())
+            if len(parts) == 3:
+                variants.add(parts[2])
+                legacy.append(line)
+        for line in self._read_lines(self.variants_path):
+            parts = line.split(" ", 2)
+            if len(parts) == 3 and parts[0] == self.EXTRACTOR:
+                entries.setdefault(parts[1], set()).add(parts[2])
+        
+        with self.lock:
+            self._entries = entries
+            if legacy:
+                self._migrate(legacy)
+        logger.info(f"已载入下载记录 {len(entries)} 条")
+    
+    def _read_lines(self, path):
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    
+    def _migrate(self, legacy):
+        """把旧格式的记录改写为yt-dlp格式，调用方需持有锁"""
+        with open(self.archive_path, "w", encoding="utf-8") as f:
+            for video_id in self._entries:
+                f.write(f"{self.EXTRACTOR} {video_id}\n")
+        known = set(self._read_lines(self.variants_path))
+        with open(self.variants_path, "a", encoding="utf-8") as f:
+            for line in legacy:
+                if line not in known:
+                    known.add(line)
+                    f.write(line + "\n")
+        logger.info(f"已将 {len(legacy)} 条旧格式下载记录转换为yt-dlp格式")
+    
+    def contains(self, video_id, download_type=None, quality=None):
+        """检查视频是否已下载
+        
+        Args:
+            video_id: 视频ID
+            download_type: 下载类型，为None时只要下载过任意类型即视为已下载
+            quality: 视频质量
+        """
+        with self.lock:
+            variants = self._entries.get(video_id)
+            if variants is None:
+                return False
+            if download_type is None or not variants:
+                return True
+            return self.make_variant(download_type, quality) in variants
+    
+    def add(self, video_id, download_type, quality):
+        """添加一条下载记录"""
+        variant = self.make_variant(download_type, quality)
+        with self.lock:
+            variants = self._entries.get(video_id)
+            if variants and variant in variants:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.archive_path)), exist_ok=True)
+            if variants is None:
+                variants = self._entries[video_id] = set()
+                with open(self.archive_path, "a", encoding="utf-8") as f:
+                    f.write(f"{self.EXTRACTOR} {video_id}\n")
+            variants.add(variant)
+            with open(self.variants_path, "a", encoding="utf-8") as f:
+                f.write(f"{self.EXTRACTOR} {video_id} {variant}\n")
+    
+    def __len__(self):
+        with self.lock:
+            return len(self._entries)
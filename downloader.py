@@ -1,6 +1,7 @@
 import os
 import time
 import threading
+import concurrent.futures
 import pytube
 import subprocess
 from pytube.exceptions import RegexMatchError, VideoUnavailable
@@ -38,6 +39,8 @@ class YouTubeDownloader:
             self._progress_callback = progress_callback
             self._downloaded_bytes = 0
             self._total_bytes = 0
+            # 各个流已下载的字节数，视频和音频同时下载时分别统计
+            self._stream_bytes = {}
             
             # 根据下载类型选择下载方式
             if download_type == "仅音频":
@@ -92,27 +95,31 @@ class YouTubeDownloader:
         if not video_stream:
             raise Exception(f"找不到{quality}质量的视频流")
         
-        # 获取音频流
-        audio_stream = yt.streams.filter(only_audio=True).order_by('abr').desc().first()
+        # 获取音频流，优先mp4（AAC）音频，合并时无需重新编码
+        audio_stream = (yt.streams.filter(only_audio=True, file_extension='mp4').order_by('abr').desc().first()
+                        or yt.streams.filter(only_audio=True).order_by('abr').desc().first())
         if not audio_stream:
             raise Exception("找不到可用的音频流")
         
         # 计算总大小
         self._total_bytes = video_stream.filesize + audio_stream.filesize
         
-        # 下载视频
+        # 同时下载视频和音频
         temp_video_path = os.path.join(self.download_path, f"temp_video_{int(time.time())}.mp4")
-        video_stream.download(output_path=os.path.dirname(temp_video_path), filename=os.path.basename(temp_video_path))
-        
-        # 检查是否取消
-        if self.is_cancelled:
-            if os.path.exists(temp_video_path):
-                os.remove(temp_video_path)
-            return None
-        
-        # 下载音频
         temp_audio_path = os.path.join(self.download_path, f"temp_audio_{int(time.time())}.mp4")
-        audio_stream.download(output_path=os.path.dirname(temp_audio_path), filename=os.path.basename(temp_audio_path))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(stream.download, output_path=os.path.dirname(path), filename=os.path.basename(path))
+                for stream, path in ((video_stream, temp_video_path), (audio_stream, temp_audio_path))
+            ]
+            errors = [future.exception() for future in futures]
+        
+        first_error = next((error for error in errors if error), None)
+        if first_error and not self.is_cancelled:
+            for path in [temp_video_path, temp_audio_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise first_error
         
         # 检查是否取消
         if self.is_cancelled:
@@ -126,7 +133,8 @@ class YouTubeDownloader:
         output_path = self._sanitize_filename(output_path)
         
         try:
-            self._merge_video_audio(temp_video_path, temp_audio_path, output_path)
+            self._merge_video_audio(temp_video_path, temp_audio_path, output_path,
+                                    copy_audio=audio_stream.subtype == 'mp4')
         finally:
             # 清理临时文件
             for path in [temp_video_path, temp_audio_path]:
@@ -158,8 +166,12 @@ class YouTubeDownloader:
         
         return video_stream
     
-    def _merge_video_audio(self, video_path, audio_path, output_path):
-        """使用FFmpeg合并视频和音频"""
+    def _merge_video_audio(self, video_path, audio_path, output_path, copy_audio=True):
+        """使用FFmpeg合并视频和音频
+        
+        Args:
+            copy_audio: 音频已是AAC时直接复制码流，否则转码为AAC
+        """
         try:
             # 检查FFmpeg是否可用
             subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
@@ -167,9 +179,11 @@ class YouTubeDownloader:
             raise Exception("FFmpeg未安装，无法合并视频和音频")
         
         # 合并视频和音频
+        audio_codec = ["-c:a", "copy"] if copy_audio else ["-c:a", "aac"]
         cmd = [
-            "ffmpeg", "-i", video_path, "-i", audio_path, 
-            "-c:v", "copy", "-c:a", "aac", "-strict", "experimental",
+            "ffmpeg", "-i", video_path, "-i", audio_path,
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-c:v", "copy", *audio_codec,
             output_path, "-y"
         ]
         
@@ -191,9 +205,10 @@ class YouTubeDownloader:
         if self.is_cancelled:
             raise Exception("下载已取消")
         
-        # 计算进度
+        # 计算进度，按所有流已下载字节的总和计算
         with self.lock:
-            self._downloaded_bytes = self._total_bytes - bytes_remaining
+            self._stream_bytes[stream.itag] = stream.filesize - bytes_remaining
+            self._downloaded_bytes = sum(self._stream_bytes.values())
             progress = self._downloaded_bytes / self._total_bytes if self._total_bytes > 0 else 0
             
             # 调用进度回调
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+下载任务日志模块
+
+在任务开始前把链接、下载选项、状态和临时文件(.part)路径写入SQLite数据库，
+程序关闭或异常退出后可以据此恢复未完成的任务，并利用.part文件断点续传。
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('job_journal')
+
+# 需要在下次启动时恢复的任务状态
+UNFINISHED_STATES = ("等待中", "下载中", "处理中", "已中断")
+
+
+class JobJournal:
+    """下载任务日志"""
+    
+    def __init__(self, journal_path):
+        """初始化任务日志
+        
+        Args:
+            journal_path: 数据库文件路径
+        """
+        self.journal_path = journal_path
+        self.lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+        self.conn = sqlite3.connect(journal_path, check_same_thread=False)
+        # WAL模式下每次提交只追加日志，异常退出时不会丢失已提交的记录
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, url TEXT NOT NULL, quality TEXT, download_type TEXT, "
+            "use_proxy INTEGER, state TEXT NOT NULL, part_path TEXT, error TEXT, "
+            "created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self.conn.commit()
+    
+    def record(self, task):
+        """记录新加入队列的任务
+        
+        恢复的任务再次提交时保留原有的加入时间和临时文件路径，只更新下载选项和状态。
+        """
+        now = time.time()
+        use_proxy = None if task.use_proxy is None else int(bool(task.use_proxy))
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO jobs (job_id, url, quality, download_type, use_proxy, state, "
+                "part_path, error, created, updated) VALUES (?, ?, ?, ?, ?, ?, NULL, NULL, ?, ?) "
+                "ON CONFLICT(job_id) DO UPDATE SET url = excluded.url, quality = excluded.quality, "
+                "download_type = excluded.download_type, use_proxy = excluded.use_proxy, "
+                "state = excluded.state, error = NULL, updated = excluded.updated",
+                (task.task_id, task.url, task.quality, task.download_type, use_proxy, task.status, now, now)
+            )
+            self.conn.commit()
+    
+    def update_state(self, job_id, state, error=None):
+        """更新任务状态"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated = ? WHERE job_id = ?",
+                (state, error, time.time(), job_id)
+            )
+            self.conn.commit()
+    
+    def update_part_path(self, job_id, part_path):
+        """记录任务正在写入的临时文件"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET part_path = ?, updated = ? WHERE job_id = ?",
+                (part_path, time.time(), job_id)
+            )
+            self.conn.commit()
+    
+    def remove(self, job_id):
+        """删除已结束的任务"""
+        with self.lock:
+            self.conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            self.conn.commit()
+    
+    def unfinished(self):
+        """获取所有未完成的任务，按加入顺序排列
+        
+        同一链接、下载类型和质量有多条记录时只保留最早的一条，其余记录从日志中删除；
+        同一链接不同类型或质量的任务（如仅音频和1080p视频）分别保留。
+        
+        Returns:
+            list: 每个元素为包含任务信息的字典
+        """
+        placeholders = ", ".join("?" for _ in UNFINISHED_STATES)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT job_id, url, quality, download_type, use_proxy, state, part_path FROM jobs "
+                f"WHERE state IN ({placeholders}) ORDER BY created",
+                UNFINISHED_STATES
+            ).fetchall()
+        
+        jobs = []
+        seen = set()
+        duplicates = []
+        for job_id, url, quality, download_type, use_proxy, state, part_path in rows:
+            key = (url, download_type, quality)
+            if key in seen:
+                duplicates.append(job_id)
+                continue
+            seen.add(key)
+            jobs.append({
+                'job_id': job_id,
+                'url': url,
+                'quality': quality,
+                'download_type': download_type,
+                'use_proxy': None if use_proxy is None else bool(use_proxy),
+                'state': state,
+                'part_path': part_path,
+            })
+        
+        if duplicates:
+            with self.lock:
+                self.conn.executemany("DELETE FROM jobs WHERE job_id = ?", [(job_id,) for job_id in duplicates])
+                self.conn.commit()
+            logger.info(f"已删除重复的任务记录 {len(duplicates)} 条")
+        return jobs
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
@@ -6,6 +6,12 @@ from tkinter import ttk, filedialog, messagebox
 import configparser
 from ytdlp_downloader import YtdlpDownloader  # 导入基于yt-dlp的下载器
 from config_manager import ConfigManager
+from job_journal import JobJournal
+from progress_aggregator import ProgressAggregator
+from bandwidth import parse_rate, format_rate
+from queue_model import QueueModel, QUEUE_FILTERS
+from url_utils import is_playlist_url
+from queue import Queue, Empty, Full
 import urllib.request
 import zipfile
 import shutil
@@ -21,18 +27,18 @@ except ImportError:
 def check_and_download_ffmpeg(ffmpeg_dir):
     import platform
     import stat
-
+    
     # 检查ffmpeg是否已存在
     ffmpeg_exe = os.path.join(ffmpeg_dir, "ffmpeg.exe")
     if os.path.exists(ffmpeg_exe):
         return ffmpeg_exe
-
+    
     # 下载windows版ffmpeg静态编译包
     url = "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip"
     zip_path = os.path.join(ffmpeg_dir, "ffmpeg.zip")
     print("正在下载ffmpeg，请稍候...")
     urllib.request.urlretrieve(url, zip_path)
-
+    
     # 解压ffmpeg.exe
     with zipfile.ZipFile(zip_path, 'r') as zip_ref:
         for name in zip_ref.namelist():
@@ -61,17 +67,57 @@ class YouTubeDownloaderApp:
         # 初始化代理管理器
         self.proxy_manager = ProxyManager() if has_proxy_manager else None
         
+        # 下载队列数据模型，界面只渲染其中可见的部分
+        self.queue_model = QueueModel()
+        self.view_offset = 0
+        self.visible_rows = 20
+        
+        # 播放列表展开线程发现的视频，由主线程取出后加入队列
+        self.playlist_entries = Queue(maxsize=500)
+        self.playlist_cancel = threading.Event()
+        self.active_playlists = set()
+        # 恢复时因同一链接已在列表中而没有单独显示的任务
+        self.unlisted_tasks = []
+        
         # 使用基于yt-dlp的下载器
         try:
-            self.downloader = YtdlpDownloader(self.download_path)
+            self.downloader = YtdlpDownloader(self.download_path, self.config_manager.get_max_concurrent_downloads(), self.config_manager)
             print("已启用yt-dlp下载器，提供更可靠的下载体验和更好的错误处理")
+            # 与界面共用代理设置和代理池，界面中的修改立即对下载生效
+            if self.proxy_manager:
+                self.downloader.proxy_manager = self.proxy_manager
         except Exception as e:
             print(f"yt-dlp下载器初始化失败: {str(e)}")
             raise
         
+        # 任务日志，程序重启后继续未完成的任务
+        if self.config_manager.is_resume_enabled():
+            journal_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.sqlite3")
+            self.downloader.set_journal(JobJournal(journal_path))
+        
         # 创建主框架
         self.create_widgets()
         
+        # 工作线程的进度更新先汇总，再由主线程每100毫秒批量刷新
+        self._tasks_finished = False
+        self.progress_aggregator = ProgressAggregator(self.root, self.set_item_status, on_flush=self.on_progress_flush)
+        self.progress_aggregator.start()
+        self.root.after(200, self.drain_playlist_entries)
+        
+        # 恢复上次未完成的任务
+        self.restore_unfinished_jobs()
+        
+        # 启动HTTP任务接口，与界面共用同一个下载队列和并发数
+        self.api_server = None
+        if self.config_manager.is_api_enabled():
+            self.start_api_server()
+        
+        # 自适应并发已启用时，定期同步界面上的并发数
+        self._adaptive_reason = None
+        if self.downloader.concurrency:
+            self.concurrency_spin.state(["disabled"])
+            self.poll_adaptive_concurrency()
+        
         # 绑定关闭事件
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
     
@@ -106,7 +152,18 @@ class YouTubeDownloaderApp:
         links_frame = ttk.LabelFrame(main_frame, text="下载队列", padding="10")
         links_frame.pack(fill=tk.BOTH, expand=True, pady=5)
         
-        # 创建表格
+        # 筛选标签
+        filter_frame = ttk.Frame(links_frame)
+        filter_frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 5))
+        self.filter_var = tk.StringVar(value="全部")
+        self.filter_buttons = {}
+        for name in QUEUE_FILTERS:
+            button = ttk.Radiobutton(filter_frame, text=name, value=name, variable=self.filter_var,
+                                     command=self.on_filter_change, style="Toolbutton")
+            button.pack(side=tk.LEFT, padx=2)
+            self.filter_buttons[name] = button
+        
+        # 创建表格，表格只保留可见的行，内容随滚动从队列模型中取出
         columns = ("序号", "链接", "状态", "进度")
         self.links_tree = ttk.Treeview(links_frame, columns=columns, show="headings")
         
@@ -120,13 +177,17 @@ class YouTubeDownloaderApp:
         self.links_tree.column("状态", width=100)
         self.links_tree.column("进度", width=100)
         
-        # 添加滚动条
-        scrollbar = ttk.Scrollbar(links_frame, orient=tk.VERTICAL, command=self.links_tree.yview)
-        self.links_tree.configure(yscroll=scrollbar.set)
+        # 添加滚动条，滚动位置对应队列模型中的偏移
+        self.queue_scrollbar = ttk.Scrollbar(links_frame, orient=tk.VERTICAL, command=self.on_queue_scroll)
         
         # 放置表格和滚动条
         self.links_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.queue_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.links_tree.bind("<Configure>", self.on_queue_resize)
+        self.links_tree.bind("<MouseWheel>", self.on_queue_wheel)
+        self.links_tree.bind("<Button-4>", self.on_queue_wheel)
+        self.links_tree.bind("<Button-5>", self.on_queue_wheel)
         
         # 按钮区域
         button_frame = ttk.Frame(main_frame)
@@ -174,6 +235,34 @@ class YouTubeDownloaderApp:
         type_combo['values'] = ('视频+音频', '仅视频', '仅音频')
         type_combo.grid(row=0, column=3, sticky=tk.W, padx=5, pady=5)
         
+        # 并发下载数
+        ttk.Label(settings_inner_frame, text="并发数:").grid(row=0, column=4, sticky=tk.W, padx=5, pady=5)
+        self.concurrency_var = tk.IntVar(value=self.downloader.max_workers)
+        self.concurrency_spin = ttk.Spinbox(settings_inner_frame, from_=1, to=32, width=5, textvariable=self.concurrency_var,
+                                            command=self.change_concurrency)
+        self.concurrency_spin.grid(row=0, column=5, sticky=tk.W, padx=5, pady=5)
+        self.concurrency_spin.bind("<Return>", lambda e: self.change_concurrency())
+        
+        # 自适应并发，启用后并发数由下载器根据吞吐量自动调整
+        self.adaptive_var = tk.BooleanVar(value=self.downloader.concurrency is not None)
+        ttk.Checkbutton(settings_inner_frame, text="自动调整并发", variable=self.adaptive_var,
+                        command=self.toggle_adaptive_concurrency).grid(row=1, column=4, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        # 限速设置，如 "2M"、"500K"，0表示不限速
+        ttk.Label(settings_inner_frame, text="总限速:").grid(row=0, column=6, sticky=tk.W, padx=5, pady=5)
+        self.global_limit_var = tk.StringVar(value=self.config_manager.get_global_rate_limit())
+        global_limit_entry = ttk.Entry(settings_inner_frame, textvariable=self.global_limit_var, width=7)
+        global_limit_entry.grid(row=0, column=7, sticky=tk.W, padx=5, pady=5)
+        global_limit_entry.bind("<Return>", lambda e: self.change_rate_limit())
+        global_limit_entry.bind("<FocusOut>", lambda e: self.change_rate_limit())
+        
+        ttk.Label(settings_inner_frame, text="单任务限速:").grid(row=0, column=8, sticky=tk.W, padx=5, pady=5)
+        self.job_limit_var = tk.StringVar(value=self.config_manager.get_job_rate_limit())
+        job_limit_entry = ttk.Entry(settings_inner_frame, textvariable=self.job_limit_var, width=7)
+        job_limit_entry.grid(row=0, column=9, sticky=tk.W, padx=5, pady=5)
+        job_limit_entry.bind("<Return>", lambda e: self.change_rate_limit())
+        job_limit_entry.bind("<FocusOut>", lambda e: self.change_rate_limit())
+        
         # 代理设置
         if self.proxy_manager:
             proxy_frame = ttk.Frame(settings_inner_frame)
@@ -191,11 +280,27 @@ class YouTubeDownloaderApp:
         self.status_var = tk.StringVar(value="就绪")
         ttk.Label(status_frame, textvariable=self.status_var).pack(side=tk.LEFT, padx=5)
     
+    def start_api_server(self):
+        """在后台线程中启动HTTP任务接口"""
+        from api_server import create_server
+        
+        host = self.config_manager.get_api_host()
+        port = self.config_manager.get_api_port()
+        try:
+            self.api_server = create_server(self.downloader, self.config_manager, host, port)
+        except OSError as e:
+            print(f"HTTP任务接口启动失败: {str(e)}")
+            return
+        threading.Thread(target=self.api_server.serve_forever, daemon=True).start()
+        print(f"HTTP任务接口已启动: http://{host}:{port}")
+    
     def add_single_link(self):
         link = self.single_link_entry.get().strip()
         if link:
-            self.add_link_to_list(link)
+            if self.add_link_to_list(link) is None:
+                messagebox.showinfo("提示", f"链接已存在: {link}")
             self.single_link_entry.delete(0, tk.END)
+            self.render_queue()
         else:
             messagebox.showwarning("警告", "请输入有效的YouTube链接")
     
@@ -203,22 +308,127 @@ class YouTubeDownloaderApp:
         links_text = self.batch_link_text.get(1.0, tk.END).strip()
         if links_text:
             links = [link.strip() for link in links_text.split('\n') if link.strip()]
-            for link in links:
-                self.add_link_to_list(link)
+            added, duplicates = self.add_links_to_list(links)
             self.batch_link_text.delete(1.0, tk.END)
+            self.render_queue()
+            
+            # 重复的链接汇总提示一次
+            if duplicates:
+                preview = "\n".join(duplicates[:10])
+                more = f"\n... 等共 {len(duplicates)} 个" if len(duplicates) > 10 else ""
+                messagebox.showinfo("提示", f"已添加 {added} 个链接，跳过 {len(duplicates)} 个重复链接:\n{preview}{more}")
+            self.status_var.set(f"已添加 {added} 个链接")
         else:
             messagebox.showwarning("警告", "请输入有效的YouTube链接")
     
-    def add_link_to_list(self, link):
-        # 检查链接是否已存在
-        for item in self.links_tree.get_children():
-            if self.links_tree.item(item, 'values')[1] == link:
-                messagebox.showinfo("提示", f"链接已存在: {link}")
-                return
+    def add_links_to_list(self, links):
+        """批量添加链接，一次遍历完成去重和插入
+        
+        Returns:
+            (int, list): 新增的数量和重复的链接列表
+        """
+        added = 0
+        duplicates = []
+        for link in links:
+            if self.add_link_to_list(link) is None:
+                duplicates.append(link)
+            else:
+                added += 1
+        return added, duplicates
+    
+    def find_item(self, link):
+        """根据链接查找队列记录，同一视频的不同链接形式视为同一项"""
+        return self.queue_model.find(link)
+    
+    def add_link_to_list(self, link, status="等待中", progress_text="0%"):
+        """添加链接到队列模型，调用方负责刷新界面
+        
+        Returns:
+            int: 新记录的ID，链接已存在时返回None
+        """
+        return self.queue_model.add(link, status, progress_text)
+    
+    def render_queue(self):
+        """按当前筛选和滚动位置渲染可见的行"""
+        model = self.queue_model
+        total = model.view_size()
+        self.view_offset = max(0, min(self.view_offset, total - self.visible_rows))
+        rows = model.view_slice(self.view_offset, self.visible_rows)
+        
+        # 表格中只保留与可见行数相同的控件行
+        children = self.links_tree.get_children()
+        if len(children) > len(rows):
+            self.links_tree.delete(*children[len(rows):])
+        for i, (index, record) in enumerate(rows):
+            values = (record.row, record.url, record.status, record.progress_text)
+            if i < len(children):
+                self.links_tree.item(children[i], values=values)
+            else:
+                self.links_tree.insert("", tk.END, values=values)
+        
+        # 更新滚动条和筛选标签上的数量
+        if total > 0:
+            self.queue_scrollbar.set(self.view_offset / total, min(1.0, (self.view_offset + len(rows)) / total))
+        else:
+            self.queue_scrollbar.set(0.0, 1.0)
+        for name, button in self.filter_buttons.items():
+            button.config(text=f"{name} ({model.count(name)})")
+    
+    def on_queue_scroll(self, *args):
+        """滚动条回调，参数形式与yview相同"""
+        total = self.queue_model.view_size()
+        if args[0] == "moveto":
+            self.view_offset = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self.view_offset += step * self.visible_rows if args[2] == "pages" else step
+        self.render_queue()
+    
+    def on_queue_wheel(self, event):
+        """鼠标滚轮滚动队列"""
+        if event.num == 4 or event.delta > 0:
+            self.view_offset -= 3
+        else:
+            self.view_offset += 3
+        self.render_queue()
+        return "break"
+    
+    def on_queue_resize(self, event):
+        """表格大小变化时重新计算可见行数"""
+        style = ttk.Style()
+        row_height = int(style.lookup("Treeview", "rowheight") or 20)
+        visible = max(1, (event.height - 25) // row_height)
+        if visible != self.visible_rows:
+            self.visible_rows = visible
+            self.render_queue()
+    
+    def on_filter_change(self):
+        """切换筛选标签"""
+        self.queue_model.set_filter(self.filter_var.get())
+        self.view_offset = 0
+        self.render_queue()
+    
+    def restore_unfinished_jobs(self):
+        """将任务日志中未完成的任务重新加入列表并继续下载"""
+        journal = self.downloader.journal
+        if not journal:
+            return
         
-        # 添加到列表
-        item_id = len(self.links_tree.get_children()) + 1
-        self.links_tree.insert("", tk.END, values=(item_id, link, "等待中", "0%"))
+        jobs = journal.unfinished()
+        for job in jobs:
+            item = self.add_link_to_list(job['url'], "等待中", "继续下载")
+            if item is None:
+                # 同一链接的其他类型或质量已占用列表中的一行，不显示在列表中，但仍继续下载
+                task = self.downloader.create_task(job['url'], job['quality'], job['download_type'],
+                                                   use_proxy=job['use_proxy'], task_id=job['job_id'])
+                self.unlisted_tasks.append(task)
+                self.downloader.submit(task)
+                continue
+            self.submit_item(item, job['url'], job['quality'], job['download_type'], job['use_proxy'], job['job_id'])
+        self.render_queue()
+        
+        if jobs:
+            self.status_var.set(f"已恢复 {len(jobs)} 个未完成的任务")
     
     def browse_path(self):
         path = filedialog.askdirectory()
@@ -229,24 +439,195 @@ class YouTubeDownloaderApp:
             self.downloader.set_download_path(path)
     
     def start_download(self):
+        # 获取设置
+        quality = self.quality_var.get()
+        download_type = self.type_var.get()
+        
         links = []
-        for item in self.links_tree.get_children():
-            values = self.links_tree.item(item, 'values')
-            if values[2] != "完成":
-                links.append((item, values[1]))
+        for item, record in self.queue_model.items():
+            task = record.task
+            # 跳过已完成以及仍在队列中的任务
+            if record.status == "完成" or (task and task.status in ("等待中", "下载中", "处理中")):
+                continue
+            # 播放列表和频道边展开边下载
+            if is_playlist_url(record.url):
+                if item not in self.active_playlists:
+                    links.append((item, record.url))
+                continue
+            # 下载记录中已有的视频无需再次请求
+            if self.downloader.is_downloaded(record.url, download_type, quality):
+                self.set_item_status(item, "完成", "已下载")
+                continue
+            links.append((item, record.url))
         
         if not links:
+            self.render_queue()
             messagebox.showinfo("提示", "没有待下载的链接")
             return
         
-        # 获取设置
-        quality = self.quality_var.get()
-        download_type = self.type_var.get()
+        use_proxy = self.proxy_enabled_var.get() if hasattr(self, 'proxy_enabled_var') else None
+        
+        # 提交到下载器的工作线程池，并发数由MaxConcurrentDownloads控制
+        for item_id, link in links:
+            if is_playlist_url(link):
+                self.set_item_status(item_id, "下载中", "正在展开列表...")
+                self.expand_playlist_item(item_id, link, quality, download_type, use_proxy)
+            else:
+                self.set_item_status(item_id, "等待中", "0%")
+                self.submit_item(item_id, link, quality, download_type, use_proxy)
+        self.render_queue()
         
-        # 开始下载线程
-        threading.Thread(target=self.download_thread, args=(links, quality, download_type), daemon=True).start()
         self.status_var.set("下载中...")
     
+    def submit_item(self, item_id, link, quality, download_type, use_proxy=None, task_id=None):
+        """为列表项创建下载任务并提交到下载队列"""
+        task = self.downloader.create_task(
+            link, quality, download_type,
+            lambda progress, status_text=None, i=item_id: self.on_task_progress(i, progress, status_text),
+            use_proxy=use_proxy, task_id=task_id
+        )
+        self.queue_model.get(item_id).task = task
+        self.downloader.submit(task, lambda t, i=item_id: self.on_task_done(i, t))
+        return task
+    
+    def expand_playlist_item(self, item_id, link, quality, download_type, use_proxy=None):
+        """在后台展开播放列表，发现的视频逐个加入下载队列"""
+        cancel_event = self.playlist_cancel
+        discovered = [0]
+        self.active_playlists.add(item_id)
+        
+        def on_entry(video_url):
+            # 主线程处理不及时时等待，同时响应取消
+            while not cancel_event.is_set():
+                try:
+                    self.playlist_entries.put((video_url, quality, download_type, use_proxy), timeout=0.5)
+                    break
+                except Full:
+                    continue
+            discovered[0] += 1
+            self.progress_aggregator.update(item_id, "下载中", f"已发现 {discovered[0]} 个视频")
+        
+        def on_finish(count, error):
+            if error:
+                self.progress_aggregator.update(item_id, "错误", str(error)[:20])
+            elif cancel_event.is_set():
+                self.progress_aggregator.update(item_id, "已取消", f"已发现 {count} 个视频")
+            else:
+                self.progress_aggregator.update(item_id, "完成", f"共 {count} 个视频")
+            self.active_playlists.discard(item_id)
+            self._tasks_finished = True
+        
+        self.downloader.stream_playlist(link, on_entry, on_finish, use_proxy, cancel_event=cancel_event)
+    
+    def drain_playlist_entries(self):
+        """定时把播放列表中发现的视频加入队列并提交下载（在主线程中运行）"""
+        added = False
+        for _ in range(200):
+            try:
+                video_url, quality, download_type, use_proxy = self.playlist_entries.get_nowait()
+            except Empty:
+                break
+            item = self.add_link_to_list(video_url)
+            if item is None:
+                continue
+            added = True
+            if self.downloader.is_downloaded(video_url, download_type, quality):
+                self.set_item_status(item, "完成", "已下载")
+            else:
+                self.submit_item(item, video_url, quality, download_type, use_proxy)
+        
+        if added:
+            self.render_queue()
+        self.root.after(200, self.drain_playlist_entries)
+    
+    def change_concurrency(self):
+        """调整并发下载数，立即对下载队列生效"""
+        try:
+            count = max(1, int(self.concurrency_var.get()))
+        except (tk.TclError, ValueError):
+            return
+        self.downloader.set_max_workers(count)
+        self.config_manager.set_max_concurrent_downloads(count)
+        self.status_var.set(f"并发下载数已设置为 {count}")
+    
+    def toggle_adaptive_concurrency(self):
+        """启用或关闭自适应并发"""
+        enabled = self.adaptive_var.get()
+        self.downloader.set_adaptive_concurrency(enabled)
+        self.config_manager.set_adaptive_concurrency_enabled(enabled)
+        if enabled:
+            self.concurrency_spin.state(["disabled"])
+            self.status_var.set("已启用自动调整并发，并发数将根据下载速度和限流情况调整")
+            self.poll_adaptive_concurrency()
+        else:
+            self.concurrency_spin.state(["!disabled"])
+            self.change_concurrency()
+    
+    def poll_adaptive_concurrency(self):
+        """同步自适应并发的当前并发数和调整原因（在主线程中定期执行）"""
+        concurrency = self.downloader.concurrency
+        if not concurrency:
+            return
+        stats = concurrency.stats()
+        self.concurrency_var.set(stats['level'])
+        if stats['history'] and stats['reason'] != self._adaptive_reason:
+            self._adaptive_reason = stats['reason']
+            self.status_var.set(f"并发数 {stats['level']}: {stats['reason']}")
+        self.root.after(1000, self.poll_adaptive_concurrency)
+    
+    def change_rate_limit(self):
+        """调整限速，立即对正在下载的任务生效"""
+        global_limit = self.global_limit_var.get().strip() or "0"
+        job_limit = self.job_limit_var.get().strip() or "0"
+        try:
+            global_rate = parse_rate(global_limit)
+            job_rate = parse_rate(job_limit)
+        except ValueError as e:
+            messagebox.showerror("错误", f"{str(e)}\n请输入如 2M、500K 的限速值，0表示不限速")
+            return
+        if (global_rate, job_rate) == (self.downloader.bandwidth.global_limit, self.downloader.bandwidth.job_limit):
+            return
+        self.downloader.bandwidth.set_limits(global_rate, job_rate)
+        self.config_manager.set_rate_limits(global_limit, job_limit)
+        self.status_var.set(f"限速已设置: 总计 {format_rate(global_rate)}，单任务 {format_rate(job_rate)}")
+    
+    def set_item_status(self, item_id, status, progress_text):
+        """更新队列记录的状态和进度（需在主线程中调用，界面在下次渲染时更新）"""
+        # 已清空的记录不再更新，记录ID不会被新记录重复使用
+        self.queue_model.update(item_id, status, progress_text)
+    
+    def on_task_progress(self, item_id, progress, status_text=None):
+        """下载任务进度回调（在工作线程中调用）"""
+        # 如果提供了状态文本，显示在进度中
+        progress_text = status_text or f"{int(progress*100)}%"
+        # 显示任务的实际状态（下载中、处理中等），列表已清空时按下载中处理
+        record = self.queue_model.get(item_id)
+        status = record.task.status if record and record.task else "下载中"
+        self.progress_aggregator.update(item_id, status, progress_text)
+    
+    def on_task_done(self, item_id, task):
+        """下载任务结束回调（在工作线程中调用）"""
+        if task.status == "完成":
+            self.progress_aggregator.update(item_id, "完成", "已下载" if task.skipped else "100%")
+        elif task.status in ("已取消", "已中断"):
+            self.progress_aggregator.update(item_id, task.status, f"{int(task.progress*100)}%")
+        else:
+            self.progress_aggregator.update(item_id, "错误", str(task.error)[:20])
+        self._tasks_finished = True
+    
+    def on_progress_flush(self):
+        """每批进度刷新后重新渲染可见行，如有任务结束则检查是否全部完成"""
+        self.render_queue()
+        if self._tasks_finished:
+            self._tasks_finished = False
+            self.check_all_done()
+    
+    def check_all_done(self):
+        """所有任务结束后更新状态栏"""
+        # 下载器中没有排队或运行中的任务，且播放列表都已展开完毕，即为全部完成
+        if not self.downloader.tasks and not self.active_playlists:
+            self.status_var.set("下载完成")
+    
     def toggle_proxy(self):
         """切换代理状态"""
         if self.proxy_manager:
@@ -347,107 +728,66 @@ class YouTubeDownloaderApp:
         else:
             messagebox.showinfo("自动检测", "未检测到系统代理设置")
     
-    def download_thread(self, links, quality, download_type):
-        for item_id, link in links:
-            # 更新状态
-            self.root.after(0, lambda i=item_id: self.links_tree.item(i, values=(
-                self.links_tree.item(i, 'values')[0],
-                self.links_tree.item(i, 'values')[1],
-                "下载中",
-                "0%"
-            )))
-            
-            try:
-                # 设置进度回调
-                def progress_callback(progress, status_text=None, i=item_id):
-                    # 支持增强版下载器的状态文本
-                    status = "下载中"
-                    progress_text = f"{int(progress*100)}%"
-                    
-                    # 如果提供了状态文本，显示在进度中
-                    if status_text:
-                        progress_text = status_text
-                    
-                    self.root.after(0, lambda p=progress, i=i: self.links_tree.item(i, values=(
-                        self.links_tree.item(i, 'values')[0],
-                        self.links_tree.item(i, 'values')[1],
-                        status,
-                        progress_text
-                    )))
-                
-                # 执行下载，传递代理设置
-                use_proxy = self.proxy_enabled_var.get() if hasattr(self, 'proxy_enabled_var') else None
-                
-                # 检查下载器是否支持代理参数
-                if hasattr(self.downloader, 'download') and 'use_proxy' in self.downloader.download.__code__.co_varnames:
-                    self.downloader.download(link, quality, download_type, progress_callback, use_proxy=use_proxy)
-                else:
-                    self.downloader.download(link, quality, download_type, progress_callback)
-                
-                # 更新状态为完成
-                self.root.after(0, lambda i=item_id: self.links_tree.item(i, values=(
-                    self.links_tree.item(i, 'values')[0],
-                    self.links_tree.item(i, 'values')[1],
-                    "完成",
-                    "100%"
-                )))
-            except Exception as e:
-                # 更新状态为错误
-                self.root.after(0, lambda i=item_id, e=str(e): self.links_tree.item(i, values=(
-                    self.links_tree.item(i, 'values')[0],
-                    self.links_tree.item(i, 'values')[1],
-                    "错误",
-                    str(e)[:20]
-                )))
-        
-        # 更新状态栏
-        self.root.after(0, lambda: self.status_var.set("下载完成"))
+    def gui_task_ids(self):
+        """界面提交的任务ID
+        
+        界面和内置API共用一个下载器，暂停、继续和取消只作用于这些任务，不影响通过API提交的任务。
+        """
+        task_ids = [record.task.task_id for _, record in self.queue_model.items() if record.task]
+        return task_ids + [task.task_id for task in self.unlisted_tasks]
     
     def pause_download(self):
-        self.downloader.pause()
+        self.downloader.pause(task_ids=self.gui_task_ids())
         self.status_var.set("已暂停")
     
     def resume_download(self):
-        self.downloader.resume()
+        self.downloader.resume(task_ids=self.gui_task_ids())
         self.status_var.set("下载中...")
     
     def cancel_download(self):
-        self.downloader.cancel()
+        self.downloader.cancel(task_ids=self.gui_task_ids())
+        self.unlisted_tasks = []
         self.status_var.set("已取消")
         
+        # 停止正在展开的播放列表，丢弃尚未加入队列的条目
+        self.playlist_cancel.set()
+        self.playlist_cancel = threading.Event()
+        while True:
+            try:
+                self.playlist_entries.get_nowait()
+            except Empty:
+                break
+        
         # 更新所有未完成的项目状态
-        for item in self.links_tree.get_children():
-            values = self.links_tree.item(item, 'values')
-            if values[2] == "下载中" or values[2] == "等待中":
-                self.links_tree.item(item, values=(
-                    values[0], values[1], "已取消", values[3]
-                ))
+        for item, record in self.queue_model.items():
+            if record.status in ("下载中", "处理中", "等待中"):
+                self.queue_model.update(item, "已取消", record.progress_text)
+        self.render_queue()
     
     def clear_list(self):
         # 清空列表前先取消下载
         self.cancel_download()
-        self.links_tree.delete(*self.links_tree.get_children())
+        self.queue_model.clear()
+        self.active_playlists.clear()
+        self.view_offset = 0
+        self.render_queue()
         self.status_var.set("就绪")
     
     def on_closing(self):
-        # 关闭前取消下载
-        self.cancel_download()
+        # 关闭前中断下载，未完成的任务保留在任务日志中，下次启动时继续
+        self.playlist_cancel.set()
+        self.downloader.shutdown()
+        self.progress_aggregator.stop()
+        if self.api_server:
+            self.api_server.job_service.shutdown()
+            self.api_server.shutdown()
         self.root.destroy()
-
+    
     def update_progress(self, progress, status_text=None, url=None):
         """更新下载进度，支持多任务"""
-        def update():
-            for item in self.links_tree.get_children():
-                values = self.links_tree.item(item, 'values')
-                if url and values[1] == url:
-                    self.links_tree.item(item, values=(
-                        values[0],
-                        values[1],
-                        status_text or "下载中",
-                        f"{progress}%"
-                    ))
-                    break
-        self.root.after(0, update)
+        item = self.find_item(url) if url else None
+        if item is not None:
+            self.progress_aggregator.update(item, status_text or "下载中", f"{progress}%")
 
 def main():
     # 确保下载目录存在
@@ -465,13 +805,13 @@ def main():
         except Exception as e2:
             messagebox.showerror("错误", f"无法创建下载目录：\n{str(e)}\n尝试使用临时目录也失败：\n{str(e2)}\n请手动选择下载目录。")
             return
-
+    
     # 检查ffmpeg
     ffmpeg_dir = os.path.abspath(os.path.dirname(__file__))
     ffmpeg_path = check_and_download_ffmpeg(ffmpeg_dir)
     # 把ffmpeg目录加入环境变量，确保yt-dlp能找到
     os.environ["PATH"] = ffmpeg_dir + os.pathsep + os.environ.get("PATH", "")
-
+    
     # 启动应用
     root = tk.Tk()
     app = YouTubeDownloaderApp(root)
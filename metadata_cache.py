@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+视频信息缓存模块
+
+把yt-dlp解析得到的视频信息（包括格式列表）按视频ID保存在本地SQLite数据库中，
+重试或重新下载同一视频时无需再次请求YouTube。
+格式列表中的媒体地址与解析时的出口IP绑定，调用方可以在视频ID后附加代理作为键，不同代理分别缓存。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('metadata_cache')
+
+
+class MetadataCache:
+    """带过期时间和容量上限的视频信息缓存
+    
+    YouTube的媒体地址会在数小时后失效，因此缓存条目超过ttl秒后自动失效；
+    条目数超过max_entries时按最近访问时间淘汰最旧的条目。
+    """
+    
+    def __init__(self, cache_dir, ttl=4 * 3600, max_entries=2000):
+        """初始化视频信息缓存
+        
+        Args:
+            cache_dir: 缓存目录
+            ttl: 缓存有效期（秒）
+            max_entries: 最大缓存条目数
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, "metadata_cache.sqlite3")
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS video_info ("
+            "video_id TEXT PRIMARY KEY, info TEXT NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON video_info(last_access)")
+        self.conn.commit()
+    
+    def get(self, video_id):
+        """获取缓存的视频信息
+        
+        Returns:
+            dict: 视频信息，未命中或已过期时返回None
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT info, created FROM video_info WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            
+            info, created = row
+            if now - created > self.ttl:
+                # 媒体地址可能已失效，删除后重新解析
+                self.conn.execute("DELETE FROM video_info WHERE video_id = ?", (video_id,))
+                self.conn.commit()
+                self.misses += 1
+                return None
+            
+            self.conn.execute("UPDATE video_info SET last_access = ? WHERE video_id = ?", (now, video_id))
+            self.conn.commit()
+            self.hits += 1
+        
+        logger.info(f"视频信息缓存命中: {video_id}")
+        return json.loads(info)
+    
+    def put(self, video_id, info):
+        """保存视频信息，必要时淘汰最久未访问的条目
+        
+        Args:
+            video_id: 视频ID
+            info: 可JSON序列化的视频信息
+        """
+        now = time.time()
+        data = json.dumps(info, ensure_ascii=False)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO video_info (video_id, info, created, last_access) VALUES (?, ?, ?, ?)",
+                (video_id, data, now, now)
+            )
+            count = self.conn.execute("SELECT COUNT(*) FROM video_info").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                self.conn.execute(
+                    "DELETE FROM video_info WHERE video_id IN "
+                    "(SELECT video_id FROM video_info ORDER BY last_access ASC LIMIT ?)", (excess,)
+                )
+                self.evictions += excess
+            self.conn.commit()
+    
+    def invalidate(self, video_id):
+        """删除指定视频的缓存"""
+        with self.lock:
+            self.conn.execute("DELETE FROM video_info WHERE video_id = ?", (video_id,))
+            self.conn.commit()
+    
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.conn.execute("DELETE FROM video_info")
+            self.conn.commit()
+    
+    def stats(self):
+        """获取缓存统计信息
+        
+        Returns:
+            dict: 命中数、未命中数、淘汰数、当前条目数和命中率
+        """
+        with self.lock:
+            size = self.conn.execute("SELECT COUNT(*) FROM video_info").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': size,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
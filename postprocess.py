@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+YouTube批量下载工具 - 后处理
+
+合并视频和音频、转换音频格式等FFmpeg工作由独立的后处理线程池启动和等待，
+下载线程把下载好的文件交给后处理队列后立即去下载下一个视频，网络和CPU可以同时保持忙碌。
+编码工作在FFmpeg子进程中进行，后处理线程只负责等待，不需要额外的Python进程。
+
+两个阶段各自限制并发：下载并发由下载器控制，后处理并发默认等于CPU核心数。
+后处理队列已满时，提交任务的下载线程会等待，避免待处理的文件无限堆积。
+程序退出时终止正在运行的FFmpeg，不等待合并结束。
+"""
+
+import os
+import logging
+import threading
+import subprocess
+import concurrent.futures
+
+logger = logging.getLogger('postprocess')
+
+# 正在运行的FFmpeg进程，程序退出时终止
+_processes = set()
+_processes_lock = threading.Lock()
+
+
+def merge_streams(video_path, audio_path, output_path):
+    """使用FFmpeg直接复制码流合并视频和音频，不重新编码，完成后删除原始文件
+    
+    在后处理线程中执行。
+    
+    Returns:
+        str: 合并后的文件路径
+    """
+    temp_path = output_path + '.merging' + os.path.splitext(output_path)[1]
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-i", video_path, "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c", "copy",
+        temp_path
+    ]
+    _run_ffmpeg(cmd, temp_path, "合并失败")
+    os.replace(temp_path, output_path)
+    _remove_files(video_path, audio_path)
+    return output_path
+
+
+def extract_audio(input_path, output_path, codec="mp3", quality="192"):
+    """使用FFmpeg转换音频格式，完成后删除原始文件
+    
+    在后处理线程中执行。
+    
+    Args:
+        input_path: 下载的音频文件
+        output_path: 转换后的文件路径
+        codec: 目标编码，目前支持mp3
+        quality: 比特率（kbps）
+    
+    Returns:
+        str: 转换后的文件路径
+    """
+    encoders = {"mp3": "libmp3lame"}
+    temp_path = output_path + '.converting' + os.path.splitext(output_path)[1]
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-i", input_path,
+        "-vn", "-acodec", encoders.get(codec, codec), "-b:a", f"{quality}k",
+        temp_path
+    ]
+    _run_ffmpeg(cmd, temp_path, "音频转换失败")
+    os.replace(temp_path, output_path)
+    if os.path.abspath(input_path) != os.path.abspath(output_path):
+        _remove_files(input_path)
+    return output_path
+
+
+def _run_ffmpeg(cmd, temp_path, error_text):
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    with _processes_lock:
+        _processes.add(process)
+    try:
+        _, stderr = process.communicate()
+    finally:
+        with _processes_lock:
+            _processes.discard(process)
+    if process.returncode != 0:
+        _remove_files(temp_path)
+        raise Exception(f"{error_text}: {stderr.decode(errors='replace')}")
+
+
+def _kill_running():
+    """终止所有正在运行的FFmpeg进程，原始文件保留，下次启动时重新合并"""
+    with _processes_lock:
+        processes = list(_processes)
+    for process in processes:
+        try:
+            process.kill()
+        except OSError:
+            pass
+    return len(processes)
+
+
+def _remove_files(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class PostProcessor:
+    """FFmpeg后处理队列，在线程池中执行（线程安全）"""
+    
+    def __init__(self, max_workers=0, max_pending=0):
+        """初始化后处理队列
+        
+        Args:
+            max_workers: 同时执行的后处理数，0表示CPU核心数
+            max_pending: 排队和执行中的后处理总数上限，0表示max_workers的两倍
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+        self.lock = threading.Lock()
+        self._slots = threading.Semaphore(self.max_pending)
+        self._executor = None
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+    
+    def submit(self, func, *args, cancel_event=None):
+        """提交后处理工作，队列已满时阻塞直到有空位
+        
+        Args:
+            func: 在后处理线程中执行的函数
+            args: 函数参数
+            cancel_event: threading.Event，等待空位期间置位时放弃提交
+        
+        Returns:
+            concurrent.futures.Future: 后处理结果，放弃提交时返回None
+        """
+        while not self._slots.acquire(timeout=0.5):
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+        
+        with self.lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                                       thread_name_prefix='postprocess')
+            self._pending += 1
+            executor = self._executor
+        try:
+            future = executor.submit(func, *args)
+        except Exception:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+    
+    def _done(self, future):
+        with self.lock:
+            self._pending -= 1
+            if future is not None and not future.cancelled():
+                if future.exception() is None:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+        self._slots.release()
+    
+    def stats(self):
+        """获取后处理队列状态"""
+        with self.lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'completed': self._completed,
+                'failed': self._failed,
+            }
+    
+    def shutdown(self):
+        """取消尚未开始的后处理，终止正在运行的FFmpeg，不等待后处理结束"""
+        with self.lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+            killed = _kill_running()
+            if killed:
+                logger.info(f"已终止 {killed} 个正在运行的后处理")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+界面进度聚合模块
+
+工作线程只把最新进度写入线程安全的字典，由Tk主线程按固定频率批量刷新界面，
+无论同时运行多少下载任务，界面刷新的开销都保持稳定。
+"""
+
+import threading
+
+
+class ProgressAggregator:
+    """收集各下载任务的进度，定时批量刷新到界面"""
+    
+    def __init__(self, root, apply_update, interval_ms=100, on_flush=None):
+        """初始化进度聚合器
+        
+        Args:
+            root: tkinter根窗口
+            apply_update: 在主线程中更新单行的函数，签名为 apply_update(item_id, status, progress_text)
+            interval_ms: 刷新间隔（毫秒），默认每秒10次
+            on_flush: 每批更新应用完成后在主线程中调用的函数
+        """
+        self.root = root
+        self.apply_update = apply_update
+        self.interval_ms = interval_ms
+        self.on_flush = on_flush
+        self.lock = threading.Lock()
+        self._pending = {}
+        self._running = False
+    
+    def update(self, item_id, status, progress_text):
+        """记录某一行的最新状态（可在任意线程中调用）
+        
+        同一行在两次刷新之间的多次更新只保留最后一次。
+        """
+        with self.lock:
+            self._pending[item_id] = (status, progress_text)
+    
+    def start(self):
+        """开始定时刷新（需在主线程中调用）"""
+        if not self._running:
+            self._running = True
+            self.root.after(self.interval_ms, self._tick)
+    
+    def stop(self):
+        """停止定时刷新"""
+        self._running = False
+    
+    def flush(self):
+        """立即把所有待刷新的更新应用到界面（需在主线程中调用）"""
+        with self.lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        
+        for item_id, (status, progress_text) in pending.items():
+            self.apply_update(item_id, status, progress_text)
+        if self.on_flush:
+            self.on_flush()
+    
+    def _tick(self):
+        if not self._running:
+            return
+        try:
+            self.flush()
+        finally:
+            self.root.after(self.interval_ms, self._tick)
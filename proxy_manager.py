@@ -9,12 +9,15 @@
 """
 
 import os
+import re
 import configparser
 import logging
-import requests
-import socket
+import threading
 import urllib.request
 
+from proxy_pool import ProxyPool
+from proxy_probe import probe_proxies, target_from_url, format_results
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('proxy_manager')
@@ -42,6 +45,10 @@ class ProxyManager:
             self.config['Proxy']['https_proxy'] = ''
             self.config['Proxy']['no_proxy'] = 'localhost,127.0.0.1'
             self.save_config()
+        
+        # 代理池，首次使用时创建并启动后台健康检查
+        self._pool = None
+        self._pool_lock = threading.Lock()
     
     def load_config(self):
         """加载配置"""
@@ -105,6 +112,53 @@ class ProxyManager:
         self.config['Proxy']['no_proxy'] = no_proxy
         self.save_config()
     
+    def get_proxy_pool_list(self):
+        """获取代理池中的代理列表
+        
+        config.ini中的pool可填写多个代理，以逗号或换行分隔；
+        未填写时使用http_proxy/https_proxy作为唯一的代理。
+        """
+        pool = [url.strip() for url in re.split(r'[,\s]+', self.config.get('Proxy', 'pool', fallback='')) if url.strip()]
+        if not pool:
+            single = self.get_https_proxy() or self.get_http_proxy()
+            if single:
+                pool = [single]
+        return pool
+    
+    def set_proxy_pool_list(self, proxies):
+        """设置代理池中的代理列表
+        
+        Args:
+            proxies: 代理地址列表
+        """
+        self.config['Proxy']['pool'] = ', '.join(proxies)
+        self.save_config()
+        if self._pool:
+            self._pool.set_proxies(self.get_proxy_pool_list())
+    
+    def get_pool(self):
+        """获取代理池，并按当前配置更新代理列表
+        
+        Returns:
+            ProxyPool: 代理池，首次调用时启动后台健康检查
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProxyPool(
+                    self.get_proxy_pool_list(),
+                    probe_url=self.config.get('Proxy', 'pool_probe_url', fallback='https://www.youtube.com'),
+                    probe_interval=self.config.getint('Proxy', 'pool_probe_interval', fallback=60),
+                )
+                self._pool.start()
+            else:
+                self._pool.set_proxies(self.get_proxy_pool_list())
+            return self._pool
+    
+    def stop_pool(self):
+        """停止代理池的后台健康检查"""
+        if self._pool:
+            self._pool.stop()
+    
     def apply_proxy_settings(self):
         """应用代理设置到环境变量"""
         if self.is_proxy_enabled():
@@ -128,72 +182,57 @@ class ProxyManager:
     def test_proxy_connection(self, test_url="https://www.youtube.com"):
         """测试代理连接
         
+        并发检测代理池中的所有代理，只建立到目标站点的隧道，不下载页面，也不修改环境变量。
+        
         Args:
             test_url: 测试URL
             
         Returns:
             (bool, str): 测试结果和错误信息
         """
-        try:
-            # 应用代理设置
-            self.apply_proxy_settings()
-            
-            # 创建代理字典
-            proxies = {}
-            if self.is_proxy_enabled():
-                http_proxy = self.get_http_proxy()
-                https_proxy = self.get_https_proxy()
-                if http_proxy:
-                    proxies['http'] = http_proxy
-                if https_proxy:
-                    proxies['https'] = https_proxy
-                
-                # 验证代理格式
-                for proxy_type, proxy_url in proxies.items():
-                    if not self._validate_proxy_format(proxy_url):
-                        return False, f"代理格式错误: {proxy_url}，正确格式应为 http(s)://host:port"
-            
-            # 设置超时时间
-            timeout = 10
-            
-            # 先测试DNS解析
-            try:
-                host = test_url.split('://')[1].split('/')[0]
-                socket.gethostbyname(host)
-                logger.info(f"DNS解析成功: {host}")
-            except Exception as e:
-                logger.error(f"DNS解析失败: {str(e)}")
-                return False, f"DNS解析失败: 无法解析 {host}，请检查网络连接或DNS设置"
-            
-            # 发送请求
-            logger.info(f"开始测试连接: {test_url} {'使用代理' if proxies else '不使用代理'}")
-            response = requests.get(test_url, proxies=proxies, timeout=timeout)
+        proxies = self.get_proxy_pool_list() if self.is_proxy_enabled() else [None]
+        if not proxies:
+            return False, "未配置代理服务器"
+        
+        for proxy_url in proxies:
+            if proxy_url and not self._validate_proxy_format(proxy_url):
+                return False, f"代理格式错误: {proxy_url}，正确格式应为 http(s)://host:port"
+        
+        logger.info(f"开始测试连接: {test_url} {'使用代理' if proxies != [None] else '不使用代理'}")
+        results = self.probe_candidates(proxies, test_url)
+        available = [result for result in results if result.ok]
+        
+        if len(results) == 1:
+            result = results[0]
+            if result.ok:
+                return True, f"连接成功 (延迟 {result.latency * 1000:.0f}ms)"
+            return False, self._analyze_proxy_error(result.error or "")
+        
+        if available:
+            best = available[0]
+            return True, (f"{len(available)}/{len(results)} 个代理可用，最快: {best.proxy} "
+                          f"({best.latency * 1000:.0f}ms)\n{format_results(results)}")
+        return False, f"所有代理均不可用\n{format_results(results)}"
+    
+    def probe_candidates(self, proxies, test_url="https://www.youtube.com", connect_timeout=3.0, read_timeout=5.0):
+        """并发检测多个候选代理
+        
+        Args:
+            proxies: 代理地址列表，None表示直接连接
+            test_url: 测试URL
+            connect_timeout: 连接代理的超时（秒）
+            read_timeout: 等待代理响应的超时（秒）
             
-            # 检查响应状态码
-            if response.status_code == 200:
-                logger.info(f"代理连接测试成功: {test_url}")
-                return True, "连接成功"
+        Returns:
+            list: 按可用性和延迟排序的ProbeResult列表
+        """
+        results = probe_proxies(proxies, target_from_url(test_url), connect_timeout, read_timeout)
+        for result in results:
+            if result.ok:
+                logger.info(f"代理可用: {result.proxy or '直接连接'} ({result.latency * 1000:.0f}ms)")
             else:
-                logger.warning(f"代理连接测试失败: 状态码 {response.status_code}")
-                return False, f"连接失败: 状态码 {response.status_code}，请检查代理服务器是否支持HTTPS连接"
-                
-        except requests.exceptions.ProxyError as e:
-            logger.error(f"代理错误: {str(e)}")
-            error_details = self._analyze_proxy_error(str(e))
-            return False, f"代理错误: {error_details}"
-        except requests.exceptions.SSLError as e:
-            logger.error(f"SSL错误: {str(e)}")
-            return False, f"SSL错误: 代理服务器可能不支持HTTPS连接或证书有问题"
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"连接错误: {str(e)}")
-            error_details = self._analyze_connection_error(str(e))
-            return False, f"连接错误: {error_details}"
-        except requests.exceptions.Timeout as e:
-            logger.error(f"连接超时: {str(e)}")
-            return False, f"连接超时: 代理服务器响应时间过长，请检查代理服务器状态或网络连接"
-        except Exception as e:
-            logger.error(f"测试代理连接时出错: {str(e)}")
-            return False, f"未知错误: {str(e)}"
+                logger.warning(f"代理不可用: {result.proxy or '直接连接'} - {result.error}")
+        return results
     
     def _validate_proxy_format(self, proxy_url):
         """验证代理URL格式
@@ -204,9 +243,8 @@ class ProxyManager:
         Returns:
             bool: 格式是否有效
         """
-        import re
-        # 检查格式是否为 http(s)://host:port
-        pattern = r'^(http|https)://([a-zA-Z0-9.-]+)(:\d+)?$'
+        # 检查格式是否为 http(s)://[user:pass@]host:port 或 socks5://host:port
+        pattern = r'^(http|https|socks4|socks4a|socks5|socks5h)://([^@/\s]+@)?([a-zA-Z0-9.-]+)(:\d+)?/?$'
         return bool(re.match(pattern, proxy_url))
     
     def _analyze_proxy_error(self, error_msg):
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+代理池模块
+
+管理多个代理服务器，后台定期并发探测每个代理的可用性和延迟，
+用指数加权移动平均（EWMA）给代理打分，每个下载任务选择当前得分最高的健康代理。
+连续失败的代理会被暂时隔离，隔离时间随失败次数翻倍；隔离期间仍会被探测，探测成功即解除隔离。
+"""
+
+import time
+import logging
+import threading
+
+from proxy_probe import probe_proxy, probe_proxies, target_from_url
+
+logger = logging.getLogger('proxy_pool')
+
+
+class ProxyState:
+    """单个代理的健康状态"""
+    
+    __slots__ = ('url', 'latency', 'success_rate', 'failures', 'quarantined_until',
+                 'in_use', 'last_error', 'last_checked')
+    
+    def __init__(self, url):
+        self.url = url
+        # 延迟和成功率的EWMA，尚未探测时使用中性的初始值
+        self.latency = 1.0
+        self.success_rate = 1.0
+        # 连续失败次数
+        self.failures = 0
+        self.quarantined_until = 0.0
+        # 正在使用该代理的任务数
+        self.in_use = 0
+        self.last_error = None
+        self.last_checked = None
+    
+    def is_quarantined(self, now=None):
+        return self.quarantined_until > (now or time.monotonic())
+    
+    def score(self):
+        """得分越高越好：成功率高、延迟低、当前负载少"""
+        return self.success_rate / (self.latency + 0.05) / (1 + self.in_use)
+    
+    def to_dict(self):
+        now = time.monotonic()
+        return {
+            'url': self.url,
+            'latency_ms': round(self.latency * 1000),
+            'success_rate': round(self.success_rate, 3),
+            'failures': self.failures,
+            'quarantined': self.is_quarantined(now),
+            'quarantine_remaining': max(0, round(self.quarantined_until - now)),
+            'in_use': self.in_use,
+            'last_error': self.last_error,
+            'score': round(self.score(), 3),
+        }
+
+
+class ProxyPool:
+    """带健康检查和自动隔离的代理池（线程安全）"""
+    
+    def __init__(self, proxies=None, probe_url="https://www.youtube.com", probe_interval=60,
+                 probe_timeout=5, alpha=0.3, failure_threshold=2, quarantine_time=60, max_quarantine=900):
+        """初始化代理池
+        
+        Args:
+            proxies: 代理地址列表
+            probe_url: 健康检查使用的地址
+            probe_interval: 后台探测间隔（秒）
+            probe_timeout: 单次探测超时（秒）
+            alpha: EWMA平滑系数，越大越看重最近的结果
+            failure_threshold: 连续失败多少次后隔离
+            quarantine_time: 首次隔离时间（秒），之后每次翻倍
+            max_quarantine: 最长隔离时间（秒）
+        """
+        self.probe_url = probe_url
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.quarantine_time = quarantine_time
+        self.max_quarantine = max_quarantine
+        self.lock = threading.Lock()
+        self.proxies = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.set_proxies(proxies or [])
+    
+    def __len__(self):
+        return len(self.proxies)
+    
+    def set_proxies(self, proxies):
+        """更新代理列表，保留已有代理的统计数据"""
+        with self.lock:
+            self.proxies = {url: self.proxies.get(url) or ProxyState(url) for url in proxies if url}
+    
+    def start(self):
+        """启动后台健康检查线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._probe_loop, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """停止后台健康检查"""
+        self._stop_event.set()
+    
+    def select(self, exclude=()):
+        """选择得分最高的健康代理，并计入使用数
+        
+        所有代理都被隔离时，选择最先解除隔离的代理，避免整批任务无代理可用。
+        
+        Args:
+            exclude: 本任务已经失败过的代理，优先避开
+        
+        Returns:
+            str: 代理地址，代理池为空时返回None
+        """
+        with self.lock:
+            if not self.proxies:
+                return None
+            now = time.monotonic()
+            candidates = [state for url, state in self.proxies.items() if url not in exclude] \
+                or list(self.proxies.values())
+            healthy = [state for state in candidates if not state.is_quarantined(now)]
+            if healthy:
+                best = max(healthy, key=lambda state: state.score())
+            else:
+                best = min(candidates, key=lambda state: state.quarantined_until)
+            best.in_use += 1
+            return best.url
+    
+    def release(self, url):
+        """任务不再使用该代理"""
+        with self.lock:
+            state = self.proxies.get(url)
+            if state and state.in_use > 0:
+                state.in_use -= 1
+    
+    def report_success(self, url, latency=None):
+        """记录一次成功的请求或下载"""
+        with self.lock:
+            state = self.proxies.get(url)
+            if not state:
+                return
+            state.success_rate = self._ewma(state.success_rate, 1.0)
+            if latency is not None:
+                state.latency = self._ewma(state.latency, latency)
+            if state.failures or state.quarantined_until:
+                logger.info(f"代理已恢复: {url}")
+            state.failures = 0
+            state.quarantined_until = 0.0
+            state.last_error = None
+    
+    def report_failure(self, url, error=None):
+        """记录一次失败，连续失败达到阈值后隔离该代理"""
+        with self.lock:
+            state = self.proxies.get(url)
+            if not state:
+                return
+            state.success_rate = self._ewma(state.success_rate, 0.0)
+            state.failures += 1
+            state.last_error = str(error) if error else None
+            if state.failures >= self.failure_threshold:
+                duration = min(self.max_quarantine,
+                               self.quarantine_time * 2 ** (state.failures - self.failure_threshold))
+                state.quarantined_until = time.monotonic() + duration
+                logger.warning(f"代理连续失败 {state.failures} 次，隔离 {duration:.0f} 秒: {url}")
+    
+    def snapshot(self):
+        """按得分从高到低返回所有代理的状态"""
+        with self.lock:
+            states = sorted(self.proxies.values(), key=lambda state: (state.is_quarantined(), -state.score()))
+            return [state.to_dict() for state in states]
+    
+    def probe(self, url):
+        """探测单个代理，并把结果计入统计
+        
+        Returns:
+            ProbeResult: 探测结果
+        """
+        result = probe_proxy(url, target_from_url(self.probe_url), read_timeout=self.probe_timeout)
+        self._record_probe(result)
+        return result
+    
+    def probe_all(self):
+        """并发探测所有代理
+        
+        Returns:
+            list: 按可用性和延迟排序的ProbeResult列表
+        """
+        with self.lock:
+            urls = list(self.proxies)
+        results = probe_proxies(urls, target_from_url(self.probe_url), read_timeout=self.probe_timeout)
+        for result in results:
+            self._record_probe(result)
+        return results
+    
+    def _record_probe(self, result):
+        """把探测结果计入代理的统计"""
+        with self.lock:
+            state = self.proxies.get(result.proxy)
+            if state:
+                # 首次探测成功时直接采用实测延迟，不与初始值平均
+                if result.ok and state.last_checked is None:
+                    state.latency = result.latency
+                state.last_checked = time.time()
+        if result.ok:
+            self.report_success(result.proxy, result.latency)
+        else:
+            self.report_failure(result.proxy, result.error)
+    
+    def _probe_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.probe_all()
+            except Exception as e:
+                logger.error(f"代理健康检查出错: {str(e)}")
+            self._stop_event.wait(self.probe_interval)
+    
+    def _ewma(self, current, sample):
+        return self.alpha * sample + (1 - self.alpha) * current
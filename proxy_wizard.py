@@ -10,8 +10,7 @@
 
 import os
 import sys
-import socket
-import requests
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 from urllib.parse import urlparse
@@ -19,6 +18,7 @@ from urllib.parse import urlparse
 # 导入代理管理器
 try:
     from proxy_manager import ProxyManager
+    from proxy_probe import format_results
 except ImportError:
     print("错误: 找不到代理管理器模块")
     sys.exit(1)
@@ -213,18 +213,11 @@ class ProxyWizard:
             return False
     
     def _test_connection(self):
-        """测试代理连接"""
-        # 保存当前设置到临时配置
-        temp_enabled = self.proxy_manager.is_proxy_enabled()
-        temp_http = self.proxy_manager.get_http_proxy()
-        temp_https = self.proxy_manager.get_https_proxy()
+        """测试代理连接
         
-        # 应用当前界面设置
-        self.proxy_manager.set_proxy_enabled(self.enable_proxy_var.get())
-        self.proxy_manager.set_http_proxy(self.http_proxy_var.get())
-        self.proxy_manager.set_https_proxy(self.https_proxy_var.get())
-        
-        # 验证代理格式
+        直接检测界面中填写的代理，不修改配置文件和环境变量；
+        多个代理在后台线程中并发检测，完成后显示按延迟排序的结果。
+        """
         if self.enable_proxy_var.get():
             http_proxy = self.http_proxy_var.get()
             https_proxy = self.https_proxy_var.get()
@@ -236,44 +229,51 @@ class ProxyWizard:
             if https_proxy and not self._validate_proxy_url(https_proxy):
                 messagebox.showerror("格式错误", f"HTTPS代理格式无效: {https_proxy}\n正确格式: http(s)://主机名:端口号")
                 return
+            
+            candidates = [proxy for proxy in (https_proxy, http_proxy) if proxy]
+            if not candidates:
+                messagebox.showerror("配置错误", "启用代理时，必须至少配置一个HTTP或HTTPS代理")
+                return
+        else:
+            candidates = [None]
         
         # 更新状态
         self.status_var.set("正在测试连接...")
-        self.root.update()
         
-        # 测试连接
-        success, message = self.proxy_manager.test_proxy_connection()
+        def run():
+            results = self.proxy_manager.probe_candidates(candidates)
+            self.root.after(0, lambda: self._show_test_results(results))
         
-        # 恢复原始设置
-        self.proxy_manager.set_proxy_enabled(temp_enabled)
-        self.proxy_manager.set_http_proxy(temp_http)
-        self.proxy_manager.set_https_proxy(temp_https)
-        
-        # 显示结果
-        if success:
-            self.status_var.set("连接测试成功")
-            messagebox.showinfo("测试成功", "代理连接测试成功！")
+        threading.Thread(target=run, daemon=True).start()
+    
+    def _show_test_results(self, results):
+        """显示代理检测结果"""
+        available = [result for result in results if result.ok]
+        if available:
+            best = available[0]
+            self.status_var.set(f"连接测试成功，延迟 {best.latency * 1000:.0f}ms")
+            messagebox.showinfo("测试成功", f"代理连接测试成功！\n\n{format_results(results)}")
+            return
+        
+        message = results[0].error if results else "未知错误"
+        self.status_var.set(f"连接测试失败: {message}")
+        
+        # 提供详细的错误信息和建议
+        error_msg = f"代理连接测试失败:\n{format_results(results)}\n\n"
+        
+        # 根据错误类型提供建议
+        if "代理格式错误" in message:
+            error_msg += "请检查代理格式是否正确，应为 http(s)://主机名:端口号"
+        elif "代理服务器拒绝连接" in message:
+            error_msg += "请检查代理服务器是否在线，以及端口是否正确"
+        elif "代理服务器需要认证" in message:
+            error_msg += "请在代理URL中包含用户名和密码，格式为 http(s)://用户名:密码@主机名:端口号"
+        elif "无法解析代理服务器主机名" in message:
+            error_msg += "请检查代理地址是否正确，以及网络连接和DNS设置"
         else:
-            self.status_var.set(f"连接测试失败: {message}")
-            
-            # 提供详细的错误信息和建议
-            error_msg = f"代理连接测试失败: {message}\n\n"
-            
-            # 根据错误类型提供建议
-            if "代理格式错误" in message:
-                error_msg += "请检查代理格式是否正确，应为 http(s)://主机名:端口号"
-            elif "代理服务器拒绝连接" in message:
-                error_msg += "请检查代理服务器是否在线，以及端口是否正确"
-            elif "代理服务器需要认证" in message:
-                error_msg += "请在代理URL中包含用户名和密码，格式为 http(s)://用户名:密码@主机名:端口号"
-            elif "无法连接到代理服务器" in message:
-                error_msg += "请检查代理地址和端口是否正确，以及代理服务器是否在线"
-            elif "DNS解析失败" in message:
-                error_msg += "请检查网络连接和DNS设置"
-            else:
-                error_msg += "\n建议:\n1. 检查代理服务器是否在线\n2. 确认代理地址和端口是否正确\n3. 尝试使用不同的代理服务器"
-            
-            messagebox.showerror("测试失败", error_msg)
+            error_msg += "\n建议:\n1. 检查代理服务器是否在线\n2. 确认代理地址和端口是否正确\n3. 尝试使用不同的代理服务器"
+        
+        messagebox.showerror("测试失败", error_msg)
     
     def _save_settings(self):
         """保存设置"""
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+下载队列数据模型
+
+队列中的每个链接保存为一条紧凑的JobRecord，界面只渲染当前可见的几十行，
+筛选、计数和查找都在模型上完成，不依赖界面控件，可支持十万级别的队列。
+"""
+
+from url_utils import extract_video_id
+
+# 筛选标签 -> 包含的状态，None表示全部
+QUEUE_FILTERS = {
+    "全部": None,
+    "等待中": ("等待中",),
+    "进行中": ("下载中", "处理中"),
+    "失败": ("错误", "已取消", "已中断"),
+    "完成": ("完成",),
+}
+
+
+class JobRecord:
+    """队列中的一条记录"""
+    
+    __slots__ = ('row', 'url', 'status', 'progress_text', 'task')
+    
+    def __init__(self, row, url, status="等待中", progress_text="0%"):
+        self.row = row
+        self.url = url
+        self.status = status
+        self.progress_text = progress_text
+        self.task = None
+
+
+class QueueModel:
+    """下载队列模型
+    
+    记录ID单调递增，清空队列后也不会重复使用，
+    已清空记录的任务迟到的进度回调不会更新到新记录上；
+    同时维护加入顺序、链接和视频ID索引、各状态计数以及当前筛选结果。
+    """
+    
+    def __init__(self):
+        # 记录ID -> JobRecord
+        self.records = {}
+        # 按加入顺序排列的记录ID
+        self.order = []
+        self._next_id = 0
+        self.url_index = {}
+        self.video_index = {}
+        self.status_counts = {}
+        self.filter_name = "全部"
+        self._view = None
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def __contains__(self, record_id):
+        return record_id in self.records
+    
+    def items(self):
+        """按加入顺序返回 (记录ID, JobRecord) 列表"""
+        return [(record_id, self.records[record_id]) for record_id in self.order]
+    
+    def find(self, url):
+        """根据链接查找记录ID，同一视频的不同链接形式视为同一条记录"""
+        index = self.url_index.get(url)
+        if index is None:
+            video_id = extract_video_id(url)
+            if video_id:
+                index = self.video_index.get(video_id)
+        return index
+    
+    def add(self, url, status="等待中", progress_text="0%"):
+        """添加记录
+        
+        Returns:
+            int: 新记录的ID，链接已存在时返回None
+        """
+        if self.find(url) is not None:
+            return None
+        
+        record_id = self._next_id
+        self._next_id += 1
+        self.records[record_id] = JobRecord(len(self.order) + 1, url, status, progress_text)
+        self.order.append(record_id)
+        self.url_index[url] = record_id
+        video_id = extract_video_id(url)
+        if video_id:
+            self.video_index[video_id] = record_id
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if self._view is not None and self._matches(status):
+            self._view.append(record_id)
+        return record_id
+    
+    def get(self, record_id):
+        """获取记录，记录不存在（如已清空）时返回None"""
+        return self.records.get(record_id)
+    
+    def update(self, record_id, status, progress_text):
+        """更新记录的状态和进度，记录已不存在时忽略
+        
+        Returns:
+            bool: 是否已更新
+        """
+        record = self.records.get(record_id)
+        if record is None:
+            return False
+        if record.status != status:
+            self.status_counts[record.status] -= 1
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            # 状态变化可能影响筛选结果
+            if self.filter_name != "全部":
+                self._view = None
+            record.status = status
+        record.progress_text = progress_text
+        return True
+    
+    def clear(self):
+        """清空队列，记录ID继续递增"""
+        self.records = {}
+        self.order = []
+        self.url_index = {}
+        self.video_index = {}
+        self.status_counts = {}
+        self._view = None
+    
+    def count(self, filter_name):
+        """获取某个筛选标签下的记录数"""
+        statuses = QUEUE_FILTERS[filter_name]
+        if statuses is None:
+            return len(self.records)
+        return sum(self.status_counts.get(status, 0) for status in statuses)
+    
+    def set_filter(self, filter_name):
+        """切换筛选标签"""
+        if filter_name != self.filter_name:
+            self.filter_name = filter_name
+            self._view = None
+    
+    def view_size(self):
+        """当前筛选结果的记录数"""
+        if self.filter_name == "全部":
+            return len(self.records)
+        return len(self._get_view())
+    
+    def view_slice(self, start, count):
+        """获取当前筛选结果中从start开始的count条记录
+        
+        Returns:
+            list: (记录ID, JobRecord) 列表
+        """
+        if self.filter_name == "全部":
+            record_ids = self.order[start:start + count]
+        else:
+            record_ids = self._get_view()[start:start + count]
+        return [(record_id, self.records[record_id]) for record_id in record_ids]
+    
+    def _matches(self, status):
+        statuses = QUEUE_FILTERS[self.filter_name]
+        return statuses is None or status in statuses
+    
+    def _get_view(self):
+        if self._view is None:
+            self._view = [record_id for record_id in self.order if self._matches(self.records[record_id].status)]
+        return self._view
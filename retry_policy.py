@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+YouTube批量下载工具 - 重试策略
+
+把下载错误分为以下几类，每类有各自的重试次数上限：
+- permanent  永久错误（私有视频、视频已删除、无效链接等），不重试
+- throttled  服务器限流（429、人机验证等），较长的退避时间，优先使用Retry-After
+- network    临时网络错误（超时、连接重置、5xx、媒体地址过期等）
+- proxy      代理连接失败
+- cancelled  用户取消，不重试
+- unknown    无法识别的错误
+
+重试间隔使用带随机抖动的指数退避，避免大量任务同时重试。
+"""
+
+import random
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger('retry_policy')
+
+ERROR_PERMANENT = "permanent"
+ERROR_THROTTLED = "throttled"
+ERROR_NETWORK = "network"
+ERROR_PROXY = "proxy"
+ERROR_CANCELLED = "cancelled"
+ERROR_UNKNOWN = "unknown"
+
+# 错误类型的中文名称，用于状态显示
+ERROR_LABELS = {
+    ERROR_PERMANENT: "无法下载",
+    ERROR_THROTTLED: "服务器限流",
+    ERROR_NETWORK: "网络错误",
+    ERROR_PROXY: "代理错误",
+    ERROR_CANCELLED: "已取消",
+    ERROR_UNKNOWN: "未知错误",
+}
+
+# 各类错误的默认重试次数
+DEFAULT_BUDGETS = {
+    ERROR_PERMANENT: 0,
+    ERROR_THROTTLED: 5,
+    ERROR_NETWORK: 4,
+    ERROR_PROXY: 2,
+    ERROR_CANCELLED: 0,
+    ERROR_UNKNOWN: 2,
+}
+
+# 按顺序匹配，先匹配到的类型优先
+ERROR_SIGNATURES = (
+    (ERROR_PERMANENT, (
+        "Private video",
+        "Video unavailable",
+        "This video is unavailable",
+        "This video has been removed",
+        "This video is no longer available",
+        "account associated with this video has been terminated",
+        "members-only",
+        "Join this channel",
+        "Sign in to confirm your age",
+        "is not a valid URL",
+        "Unsupported URL",
+        "Incomplete YouTube ID",
+        "HTTP Error 404",
+        "Requested format is not available",
+        "copyright",
+        "磁盘空间不足",
+    )),
+    (ERROR_THROTTLED, (
+        "HTTP Error 429",
+        "Too Many Requests",
+        "rate-limit",
+        "rate limit",
+        "Sign in to confirm you",
+    )),
+    (ERROR_PROXY, (
+        "ProxyError",
+        "Unable to connect to proxy",
+        "Cannot connect to proxy",
+        "Tunnel connection failed",
+        "HTTP Error 407",
+        "SOCKS",
+    )),
+    (ERROR_NETWORK, (
+        "timed out",
+        "Timeout",
+        "Connection reset",
+        "Connection refused",
+        "Connection aborted",
+        "RemoteDisconnected",
+        "IncompleteRead",
+        "Temporary failure in name resolution",
+        "Name or service not known",
+        "Network is unreachable",
+        # 媒体地址过期或绑定了其他出口IP，重新解析后重试，不视为限流
+        "HTTP Error 403",
+        "HTTP Error 410",
+        "HTTP Error 500",
+        "HTTP Error 502",
+        "HTTP Error 503",
+        "HTTP Error 504",
+        "Unable to download",
+        "did not get any data blocks",
+        "The read operation timed out",
+    )),
+)
+
+
+class DownloadCancelled(Exception):
+    """任务被用户取消或因程序退出而中断"""
+
+
+def classify_error(error):
+    """判断错误类型
+    
+    Args:
+        error: 下载过程中抛出的异常
+    
+    Returns:
+        str: ERROR_*常量之一
+    """
+    if isinstance(error, DownloadCancelled):
+        return ERROR_CANCELLED
+    message = str(error)
+    for error_class, signatures in ERROR_SIGNATURES:
+        if any(signature in message for signature in signatures):
+            return error_class
+    return ERROR_UNKNOWN
+
+
+def get_retry_after(error):
+    """从异常链中取出HTTP响应的Retry-After（秒），没有时返回None"""
+    seen = set()
+    pending = [error]
+    while pending:
+        current = pending.pop()
+        if current is None or id(current) in seen:
+            continue
+        seen.add(id(current))
+        
+        response = getattr(current, 'response', None)
+        headers = getattr(response, 'headers', None) or getattr(current, 'headers', None)
+        value = headers.get('Retry-After') if headers is not None and hasattr(headers, 'get') else None
+        if value:
+            seconds = _parse_retry_after(value)
+            if seconds is not None:
+                return seconds
+        
+        # yt-dlp的DownloadError把原始异常保存在exc_info中
+        exc_info = getattr(current, 'exc_info', None)
+        if isinstance(exc_info, tuple) and len(exc_info) > 1:
+            pending.append(exc_info[1])
+        pending.append(current.__cause__)
+        pending.append(current.__context__)
+    return None
+
+
+def _parse_retry_after(value):
+    """解析Retry-After，支持秒数和HTTP日期两种格式"""
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """按错误类型决定是否重试以及重试前的等待时间"""
+    
+    def __init__(self, budgets=None, base_delay=2.0, max_delay=300.0, throttle_base_delay=30.0):
+        """初始化重试策略
+        
+        Args:
+            budgets: 各类错误的重试次数 {错误类型: 次数}，未指定的使用默认值
+            base_delay: 指数退避的基础时间（秒）
+            max_delay: 单次等待的最长时间（秒）
+            throttle_base_delay: 限流错误的基础退避时间（秒）
+        """
+        self.budgets = dict(DEFAULT_BUDGETS)
+        self.budgets.update(budgets or {})
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.throttle_base_delay = throttle_base_delay
+    
+    def next_delay(self, error_class, attempt, retry_after=None):
+        """计算第attempt次重试前的等待时间
+        
+        Args:
+            error_class: 错误类型
+            attempt: 该类错误已重试的次数，从0开始
+            retry_after: 服务器要求的等待时间（秒）
+        
+        Returns:
+            float: 等待秒数，不再重试时返回None
+        """
+        if attempt >= self.budgets.get(error_class, 0):
+            return None
+        
+        base = self.throttle_base_delay if error_class == ERROR_THROTTLED else self.base_delay
+        ceiling = min(self.max_delay, base * (2 ** attempt))
+        # 随机抖动：在[base/2, ceiling]之间取值，避免大量任务同时重试
+        delay = random.uniform(min(base / 2, ceiling), ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+    
+    def decide(self, error, attempts):
+        """判断错误是否需要重试
+        
+        Args:
+            error: 下载过程中抛出的异常
+            attempts: 任务各类错误已重试次数的字典，重试时会被更新
+        
+        Returns:
+            tuple: (错误类型, 等待秒数)，不再重试时等待秒数为None
+        """
+        error_class = classify_error(error)
+        delay = self.next_delay(error_class, attempts.get(error_class, 0), get_retry_after(error))
+        if delay is not None:
+            attempts[error_class] = attempts.get(error_class, 0) + 1
+        return error_class, delay
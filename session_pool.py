@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+YouTube批量下载工具 - 网络会话池
+
+每个代理（包括不使用代理）对应一个长期存在的网络会话，所有工作线程共用：
+会话保存yt-dlp的请求处理器（HTTP连接池、TLS会话）和Cookie，
+每个任务新建的YoutubeDL借用对应代理的会话发送请求，任务结束时不关闭连接，
+后续任务直接复用已建立的keep-alive连接，省去DNS查询、TCP和TLS握手。
+
+会话数量有上限，超过上限时关闭最久未使用的空闲会话；
+空闲超过一定时间的会话也会被关闭，释放连接。
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import yt_dlp
+
+logger = logging.getLogger('session_pool')
+
+
+class _Session:
+    """单个代理的共享会话"""
+    
+    __slots__ = ('proxy', 'ydl', 'director', 'cookiejar', 'in_use', 'last_used', 'uses')
+    
+    def __init__(self, proxy, ydl):
+        self.proxy = proxy
+        self.ydl = ydl
+        # 立即创建请求处理器，避免多个线程同时首次访问时重复创建
+        self.director = ydl._request_director
+        self.cookiejar = ydl.cookiejar
+        # 正在借用该会话的YoutubeDL数
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.uses = 0
+    
+    def close(self):
+        self.ydl.close()
+
+
+class SessionPool:
+    """按代理划分的共享网络会话池（线程安全）"""
+    
+    def __init__(self, max_sessions=8, idle_timeout=300):
+        """初始化会话池
+        
+        Args:
+            max_sessions: 最多保留的会话数（不同代理的数量）
+            idle_timeout: 会话空闲超过该时间后关闭（秒）
+        """
+        self.max_sessions = max(1, int(max_sessions))
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self._sessions = {}
+        self._created = 0
+        self._reused = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def set_limits(self, max_sessions=None, idle_timeout=None):
+        """调整会话数上限和空闲超时，None表示保持不变"""
+        with self.lock:
+            if max_sessions is not None:
+                self.max_sessions = max(1, int(max_sessions))
+            if idle_timeout is not None:
+                self.idle_timeout = idle_timeout
+        self.evict_idle()
+    
+    @contextmanager
+    def attach(self, ydl, proxy=None):
+        """让ydl在with块内使用代理对应的共享会话
+        
+        必须在ydl关闭之前退出，退出时把会话从ydl上取下，ydl.close()不会关闭共享连接。
+        会话数已达上限且都在使用中时，ydl使用自己的连接。
+        
+        Args:
+            ydl: 新建的yt_dlp.YoutubeDL
+            proxy: ydl使用的代理，None表示不使用代理
+        """
+        session = self._acquire(proxy, ydl.params)
+        if session is None:
+            yield ydl
+            return
+        
+        # _request_director和cookiejar是YoutubeDL的cached_property，直接写入实例属性即可替换
+        ydl._request_director = session.director
+        ydl.cookiejar = session.cookiejar
+        try:
+            yield ydl
+        finally:
+            ydl.__dict__.pop('_request_director', None)
+            self._release(session)
+    
+    def _acquire(self, proxy, params):
+        """取出代理对应的会话，没有时新建"""
+        key = proxy or ''
+        expired = []
+        with self.lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                session.in_use += 1
+                session.uses += 1
+                session.last_used = time.monotonic()
+                self._reused += 1
+                return session
+            
+            if len(self._sessions) >= self.max_sessions:
+                idle = [item for item in self._sessions.values() if item.in_use == 0]
+                if not idle:
+                    return None
+                oldest = min(idle, key=lambda item: item.last_used)
+                expired.append(self._sessions.pop(oldest.proxy))
+            
+            try:
+                session = _Session(key, yt_dlp.YoutubeDL(self._session_opts(proxy, params)))
+            except Exception as e:
+                logger.warning(f"创建网络会话失败: {str(e)}")
+                session = None
+            else:
+                session.in_use = session.uses = 1
+                self._sessions[key] = session
+                self._created += 1
+                self._start_eviction()
+        
+        self._close_sessions(expired, "会话数达到上限")
+        return session
+    
+    def _release(self, session):
+        with self.lock:
+            session.in_use -= 1
+            session.last_used = time.monotonic()
+    
+    def _session_opts(self, proxy, params):
+        """会话使用的yt-dlp选项，只包含影响连接建立的部分"""
+        opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'nocheckcertificate': params.get('nocheckcertificate', False),
+        }
+        for key in ('socket_timeout', 'source_address', 'http_headers'):
+            if params.get(key) is not None:
+                opts[key] = params[key]
+        if proxy:
+            opts['proxy'] = proxy
+        return opts
+    
+    def _start_eviction(self):
+        """启动后台线程定期关闭空闲会话，调用方需持有锁"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._eviction_loop, daemon=True)
+        self._thread.start()
+    
+    def _eviction_loop(self):
+        while not self._stop_event.wait(max(1.0, self.idle_timeout / 2)):
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"清理空闲会话出错: {str(e)}")
+    
+    def evict_idle(self):
+        """关闭空闲超时的会话
+        
+        Returns:
+            int: 关闭的会话数
+        """
+        now = time.monotonic()
+        with self.lock:
+            expired = [session for session in self._sessions.values()
+                       if session.in_use == 0 and now - session.last_used > self.idle_timeout]
+            for session in expired:
+                del self._sessions[session.proxy]
+        self._close_sessions(expired, "空闲超时")
+        return len(expired)
+    
+    def _close_sessions(self, sessions, reason):
+        for session in sessions:
+            try:
+                session.close()
+            except Exception as e:
+                logger.warning(f"关闭网络会话失败: {str(e)}")
+            logger.info(f"关闭网络会话（{reason}）: {session.proxy or '直接连接'}，共使用 {session.uses} 次")
+    
+    def close(self):
+        """关闭所有空闲会话，正在使用的会话在任务结束后由空闲超时关闭"""
+        with self.lock:
+            if not any(session.in_use for session in self._sessions.values()):
+                self._stop_event.set()
+            idle = [session for session in self._sessions.values() if session.in_use == 0]
+            for session in idle:
+                del self._sessions[session.proxy]
+        self._close_sessions(idle, "程序退出")
+    
+    def stats(self):
+        """获取会话池状态"""
+        with self.lock:
+            now = time.monotonic()
+            return {
+                'max_sessions': self.max_sessions,
+                'idle_timeout': self.idle_timeout,
+                'created': self._created,
+                'reused': self._reused,
+                'sessions': [{
+                    'proxy': session.proxy or None,
+                    'in_use': session.in_use,
+                    'uses': session.uses,
+                    'idle': round(now - session.last_used) if session.in_use == 0 else 0,
+                } for session in self._sessions.values()],
+            }
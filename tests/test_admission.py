@@ -0,0 +1,68 @@
+from collections import namedtuple
+
+import pytest
+
+import admission
+from admission import DiskAdmission, DiskSpaceError, WaitForSpace
+
+MB = 1024 ** 2
+
+Usage = namedtuple('Usage', 'total used free')
+
+
+@pytest.fixture
+def disk(monkeypatch):
+    """可调整剩余空间的磁盘"""
+    state = {'free': 1000 * MB}
+    monkeypatch.setattr(admission.shutil, 'disk_usage',
+                        lambda path: Usage(2000 * MB, 2000 * MB - state['free'], state['free']))
+    return state
+
+
+def test_estimate_counts_merge_overhead():
+    gate = DiskAdmission("/", min_free=0)
+    formats = [{'filesize': 100 * MB}, {'filesize_approx': 20 * MB}, {}]
+    assert gate.estimate(formats) == 120 * MB
+    assert gate.estimate(formats, merge=True) == 240 * MB
+
+
+def test_waits_until_other_jobs_release(disk):
+    gate = DiskAdmission("/", min_free=100 * MB)
+    gate.reserve("a", 600 * MB)
+    
+    with pytest.raises(WaitForSpace):
+        gate.reserve("b", 400 * MB)
+    assert gate.stats()['jobs'] == 1
+    
+    gate.release("a")
+    gate.reserve("b", 400 * MB)
+    assert gate.stats()['reserved'] == 400 * MB
+
+
+def test_rejects_job_larger_than_disk(disk):
+    gate = DiskAdmission("/", min_free=100 * MB)
+    with pytest.raises(DiskSpaceError):
+        gate.reserve("a", 950 * MB)
+
+
+def test_written_bytes_are_not_counted_twice(disk):
+    gate = DiskAdmission("/", min_free=0)
+    written = {'a': 0}
+    gate.reserve("a", 800 * MB, lambda: written['a'])
+    
+    # 任务a已写入600MB，磁盘剩余空间相应减少，预留只计算未写入的部分
+    written['a'] = 600 * MB
+    disk['free'] = 400 * MB
+    assert gate.stats()['reserved'] == 200 * MB
+    gate.reserve("b", 200 * MB)
+    with pytest.raises(WaitForSpace):
+        gate.reserve("c", 1 * MB)
+
+
+def test_re_reserve_replaces_previous_reservation(disk):
+    gate = DiskAdmission("/", min_free=0)
+    gate.reserve("a", 900 * MB)
+    # 重试时同一任务重新预留，不与之前的预留叠加
+    gate.reserve("a", 900 * MB)
+    gate.reserve("a", 0)
+    assert gate.stats()['jobs'] == 0
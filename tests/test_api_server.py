@@ -0,0 +1,100 @@
+import json
+import time
+import threading
+import http.client
+
+import pytest
+
+from api_server import create_server
+
+
+class StubDownloader:
+    """只模拟播放列表展开失败的下载器"""
+    
+    def stream_playlist(self, url, on_entry, on_finish=None, use_proxy=None, cancel_event=None):
+        on_finish(0, RuntimeError("列表不存在"))
+
+
+@pytest.fixture
+def server():
+    server = create_server(StubDownloader(), None, "127.0.0.1", 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, path, body):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    conn.request("POST", path, body=body.encode("utf-8"), headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    data = json.loads(response.read())
+    conn.close()
+    return response.status, data
+
+
+def read_event(response):
+    fields = {}
+    while True:
+        raw = response.fp.readline()
+        assert raw, "事件流已断开"
+        line = raw.decode('utf-8').rstrip('\n')
+        if not line:
+            if fields:
+                return fields['event'], json.loads(fields['data'])
+            continue
+        if line.startswith(':'):
+            continue
+        key, _, value = line.partition(': ')
+        fields[key] = value
+
+
+def test_playlist_error_is_sent_as_text(server):
+    service = server.job_service
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    conn.request("GET", "/events")
+    response = conn.getresponse()
+    deadline = time.monotonic() + 5
+    while not service._subscribers and time.monotonic() < deadline:
+        time.sleep(0.01)
+    
+    service.submit_playlist("https://www.youtube.com/playlist?list=PLx")
+    assert read_event(response)[1]['status'] == 'expanding'
+    event, data = read_event(response)
+    assert event == 'playlist'
+    assert data['status'] == 'error'
+    assert data['error'] == "列表不存在"
+    
+    # 订阅仍然有效
+    service._broadcast({'event': 'ping', 'value': 1})
+    assert read_event(response) == ('ping', {'event': 'ping', 'value': 1})
+    assert len(service._subscribers) == 1
+    conn.close()
+
+
+def test_unserializable_event_does_not_disconnect(server):
+    service = server.job_service
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    conn.request("GET", "/events")
+    response = conn.getresponse()
+    deadline = time.monotonic() + 5
+    while not service._subscribers and time.monotonic() < deadline:
+        time.sleep(0.01)
+    
+    service._broadcast({'event': 'bad', 'value': object()})
+    service._broadcast({'event': 'ping', 'value': 1})
+    assert read_event(response)[0] == 'ping'
+    conn.close()
+
+
+@pytest.mark.parametrize("body", ['"https://youtu.be/xxxx"', '[1, 2]', '{"urls": "https://youtu.be/xxxx"}',
+                                  '{"urls": [1]}', '{"url": 5}', 'not json',
+                                  '{"url": "https://youtu.be/xxxx", "quality": "1080p", "download_type": "mp4"}',
+                                  '{"url": "https://youtu.be/xxxx", "quality": "1080", "download_type": "仅音频"}',
+                                  '{"url": "https://youtu.be/xxxx", "quality": "720p", "download_type": "仅视频", '
+                                  '"use_proxy": "yes"}'])
+def test_invalid_job_requests_are_rejected(server, body):
+    status, data = post(server, "/jobs", body)
+    assert status == 400
+    assert data['error']
@@ -0,0 +1,102 @@
+import time
+import threading
+from datetime import datetime
+
+import pytest
+
+from bandwidth import BandwidthScheduler, TokenBucket, format_rate, parse_rate, parse_schedule
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, 0),
+    (0, 0),
+    ("1024", 1024),
+    ("500K", 500 * 1024),
+    ("1.5M", int(1.5 * 1024 ** 2)),
+    ("2mb/s", 2 * 1024 ** 2),
+    ("1GiB", 1024 ** 3),
+])
+def test_parse_rate(value, expected):
+    assert parse_rate(value) == expected
+
+
+def test_parse_rate_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_rate("fast")
+
+
+def test_format_rate():
+    assert format_rate(0) == "不限速"
+    assert format_rate(2 * 1024 ** 2) == "2M/s"
+    assert format_rate(100) == "100B/s"
+
+
+def test_parse_schedule_accepts_both_separators():
+    rules = parse_schedule("09:00-18:00=2M; 22:00-07:00=0")
+    assert rules == [(9 * 60, 18 * 60, 2 * 1024 ** 2), (22 * 60, 7 * 60, 0)]
+    with pytest.raises(ValueError):
+        parse_schedule("25:00-26:00=1M")
+
+
+def test_token_bucket_burst_then_wait():
+    bucket = TokenBucket(1000)
+    # 突发容量为一秒的流量
+    assert bucket.reserve(1000, bucket.updated) == 0.0
+    # 令牌不足时按欠额计算等待时间
+    assert bucket.reserve(500, bucket.updated) == pytest.approx(0.5)
+    # 经过的时间补充令牌
+    assert bucket.reserve(500, bucket.updated + 1.0) == pytest.approx(0.0)
+
+
+def test_token_bucket_unlimited_and_rate_change():
+    bucket = TokenBucket(0)
+    assert bucket.reserve(10 ** 9, time.monotonic()) == 0.0
+    bucket.set_rate(100)
+    assert bucket.tokens == 0.0
+    assert bucket.reserve(100, bucket.updated) == pytest.approx(1.0)
+
+
+def test_schedule_overrides_global_limit_across_midnight():
+    scheduler = BandwidthScheduler(global_limit="1M", schedule="09:00-18:00=2M, 22:00-07:00=0")
+    assert scheduler.current_global_limit(datetime(2026, 1, 1, 12, 0)) == 2 * 1024 ** 2
+    assert scheduler.current_global_limit(datetime(2026, 1, 1, 23, 30)) == 0
+    assert scheduler.current_global_limit(datetime(2026, 1, 1, 3, 0)) == 0
+    assert scheduler.current_global_limit(datetime(2026, 1, 1, 8, 0)) == 1024 ** 2
+
+
+def test_throttle_enforces_job_limit():
+    scheduler = BandwidthScheduler(job_limit=100 * 1024)
+    start = time.monotonic()
+    # 新任务没有突发额度，20K按100K/s需要约0.2秒
+    scheduler.throttle("a", 10 * 1024)
+    scheduler.throttle("a", 10 * 1024)
+    assert 0.15 < time.monotonic() - start < 0.6
+    assert scheduler.stats()['active_jobs'] == 1
+    scheduler.unregister("a")
+    assert scheduler.stats()['active_jobs'] == 0
+
+
+def test_global_limit_is_shared_between_jobs():
+    scheduler = BandwidthScheduler(global_limit=100 * 1024 * 1024)
+    scheduler.throttle("a", 1)
+    assert scheduler._jobs["a"]['bucket'].rate == 100 * 1024 * 1024
+    scheduler.throttle("b", 1)
+    scheduler.throttle("a", 1)
+    # 两个活跃任务各分得一半的全局带宽
+    assert scheduler._jobs["a"]['bucket'].rate == 50 * 1024 * 1024
+    assert scheduler._jobs["b"]['bucket'].rate == 50 * 1024 * 1024
+
+
+def test_throttle_returns_on_cancel_and_limit_change():
+    scheduler = BandwidthScheduler(global_limit=1024)
+    cancel_event = threading.Event()
+    threading.Timer(0.1, cancel_event.set).start()
+    start = time.monotonic()
+    scheduler.throttle("a", 10 * 1024, cancel_event)
+    assert time.monotonic() - start < 1.0
+    
+    # 取消限速后正在等待的任务立即继续
+    threading.Timer(0.1, scheduler.set_limits, kwargs={'global_limit': 0}).start()
+    start = time.monotonic()
+    scheduler.throttle("b", 10 * 1024)
+    assert time.monotonic() - start < 1.0
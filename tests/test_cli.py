@@ -0,0 +1,30 @@
+import io
+import json
+import signal
+
+import cli
+
+
+def test_summary_waits_for_every_archived_task(tmp_path, monkeypatch):
+    # 下载记录中已有的视频会立即完成，不能在其余链接提交之前就输出汇总
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(signal, 'signal', lambda *args: None)
+    output = io.StringIO()
+    printer_class = cli.JsonProgressPrinter
+    monkeypatch.setattr(cli, 'JsonProgressPrinter', lambda: printer_class(output))
+    
+    video_ids = [f"v{i:010d}" for i in range(300)]
+    download_path = tmp_path / "downloads"
+    download_path.mkdir()
+    (download_path / "download_archive.txt").write_text(
+        "".join(f"youtube {video_id}\n" for video_id in video_ids), encoding="utf-8")
+    
+    urls = [f"https://www.youtube.com/watch?v={video_id}" for video_id in video_ids]
+    assert cli.main(urls + ["-o", str(download_path), "-j", "8"]) == 0
+    
+    events = [json.loads(line) for line in output.getvalue().splitlines()]
+    summary = events[-1]
+    assert summary['event'] == 'summary'
+    assert summary['total'] == 300
+    assert summary['succeeded'] == 300
+    assert sum(1 for event in events if event['event'] == 'skipped') == 300
@@ -0,0 +1,117 @@
+import pytest
+
+import concurrency
+from concurrency import AdaptiveConcurrency, is_throttle_error
+from retry_policy import ERROR_THROTTLED, classify_error
+
+
+class FakeDownloader:
+    """只提供自适应并发需要的接口"""
+    
+    def __init__(self, max_workers=4, running=4, queued=10):
+        self.max_workers = max_workers
+        self.bytes_received = 0
+        self.running = running
+        self.queued = queued
+    
+    def running_counts(self):
+        return self.running, self.queued
+    
+    def set_max_workers(self, count):
+        self.max_workers = count
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """每次采样间隔固定为1秒，吞吐量即本次增加的字节数"""
+    now = [1000.0]
+    
+    def monotonic():
+        now[0] += 1.0
+        return now[0]
+    
+    monkeypatch.setattr(concurrency.time, 'monotonic', monotonic)
+    return now
+
+
+def feed(controller, downloader, throughput):
+    downloader.bytes_received += throughput
+    return controller.sample()
+
+
+def test_additive_increase_while_throughput_grows(clock):
+    downloader = FakeDownloader(max_workers=2, running=2)
+    changes = []
+    controller = AdaptiveConcurrency(downloader, max_workers=5, on_change=lambda level, reason: changes.append(level))
+    
+    assert feed(controller, downloader, 1000) == 3
+    downloader.running = 3
+    assert feed(controller, downloader, 1500) == 4
+    downloader.running = 4
+    assert feed(controller, downloader, 2000) == 5
+    downloader.running = 5
+    # 不超过上限
+    assert feed(controller, downloader, 3000) == 5
+    assert changes == [3, 4, 5]
+
+
+def test_throttle_errors_halve_concurrency(clock):
+    downloader = FakeDownloader(max_workers=8, running=8)
+    controller = AdaptiveConcurrency(downloader, min_workers=3)
+    
+    controller.record_error(Exception("HTTP Error 429: Too Many Requests"))
+    controller.record_error(Exception("HTTP Error 404: Not Found"))
+    assert feed(controller, downloader, 1000) == 4
+    assert controller.stats()['throttle_errors'] == 1
+    
+    controller.record_error(Exception("Sign in to confirm you're not a bot"))
+    # 不低于下限
+    assert feed(controller, downloader, 1000) == 3
+
+
+def test_back_off_when_throughput_drops(clock):
+    downloader = FakeDownloader(max_workers=4, running=4)
+    controller = AdaptiveConcurrency(downloader)
+    
+    feed(controller, downloader, 4000)
+    downloader.running = 5
+    # 总吞吐量下降超过10%，回退一级
+    assert feed(controller, downloader, 3000) == 4
+
+
+def test_per_job_collapse_halves(clock):
+    downloader = FakeDownloader(max_workers=4, running=2)
+    controller = AdaptiveConcurrency(downloader)
+    
+    feed(controller, downloader, 4000)
+    downloader.running = 5
+    # 单任务速度从2000降到600，总吞吐量没有上升
+    assert feed(controller, downloader, 3000) == 2
+
+
+def test_hold_when_queue_is_empty_and_probe_when_stable(clock):
+    downloader = FakeDownloader(max_workers=4, running=2, queued=0)
+    controller = AdaptiveConcurrency(downloader)
+    assert feed(controller, downloader, 1000) == 4
+    assert controller.stats()['reason'] == "待下载任务不足，保持并发"
+    
+    downloader.running, downloader.queued = 4, 10
+    for _ in range(concurrency.PROBE_AFTER - 1):
+        assert feed(controller, downloader, 1000) == 4
+    # 连续稳定后重新尝试增加并发
+    assert feed(controller, downloader, 1000) == 5
+
+
+@pytest.mark.parametrize("message, throttled", [
+    ("HTTP Error 429: Too Many Requests", True),
+    ("Sign in to confirm you're not a bot", True),
+    ("HTTP Error 403: Forbidden", False),
+    ("Sign in to confirm your age", False),
+    ("HTTP Error 404: Not Found", False),
+    ("Connection reset by peer", False),
+])
+def test_throttle_errors_match_retry_classification(message, throttled):
+    # 自适应并发和重试策略对同一错误的判断一致：403按网络错误重试，不减少并发
+    error = Exception(message)
+    assert is_throttle_error(error) == throttled
+    assert (classify_error(error) == ERROR_THROTTLED) == throttled
@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+
+from job_journal import JobJournal
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+def job(task_id, download_type="视频+音频", quality="1080p", url=URL):
+    return SimpleNamespace(task_id=task_id, url=url, quality=quality, download_type=download_type,
+                           use_proxy=None, status="等待中")
+
+
+def test_unfinished_keeps_variants_and_drops_true_duplicates(tmp_path):
+    journal = JobJournal(str(tmp_path / "jobs.sqlite3"))
+    journal.record(job("a"))
+    journal.record(job("b", download_type="仅音频"))
+    journal.record(job("c", quality="720p"))
+    journal.record(job("d"))
+
+    # 同一链接不同类型或质量的任务分别保留，完全相同的任务只保留最早的一条
+    assert [item['job_id'] for item in journal.unfinished()] == ["a", "b", "c"]
+    assert [item['job_id'] for item in journal.unfinished()] == ["a", "b", "c"]
+    count = journal.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+    assert count == 3
+    journal.close()
+
+
+def test_record_again_keeps_part_path(tmp_path):
+    journal = JobJournal(str(tmp_path / "jobs.sqlite3"))
+    journal.record(job("a"))
+    journal.update_part_path("a", "/downloads/video.mp4.part")
+    journal.record(job("a"))
+
+    assert journal.unfinished()[0]['part_path'] == "/downloads/video.mp4.part"
+    journal.close()
@@ -0,0 +1,84 @@
+import pytest
+
+from proxy_pool import ProxyPool
+from ytdlp_downloader import YtdlpDownloader
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+class FakeYdl:
+    """只模拟视频信息解析的YoutubeDL"""
+    
+    def __init__(self, proxy=None):
+        self.params = {'proxy': proxy} if proxy else {}
+        self.extracted = 0
+    
+    def extract_info(self, url, download=False, process=False):
+        self.extracted += 1
+        return {'id': "dQw4w9WgXcQ", 'extractor_key': 'Youtube', 'formats': [{'url': self.params.get('proxy')}]}
+    
+    def sanitize_info(self, info, remove_private_keys=False):
+        return info
+
+
+class FakeProxyManager:
+    def __init__(self, pool):
+        self.pool = pool
+    
+    def get_pool(self):
+        return self.pool
+    
+    def stop_pool(self):
+        self.pool.stop()
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    downloader = YtdlpDownloader(str(tmp_path))
+    downloader.proxy_manager = FakeProxyManager(ProxyPool(["http://user:secret@a:8080", "http://b:8080"]))
+    yield downloader
+    downloader.shutdown()
+
+
+def test_cache_is_keyed_by_proxy(downloader):
+    task = downloader.create_task(URL)
+    ydl_a = FakeYdl("http://user:secret@a:8080")
+    
+    downloader._extract_info(ydl_a, task)
+    assert not task.info_cached
+    info = downloader._extract_info(ydl_a, task)
+    assert task.info_cached and ydl_a.extracted == 1
+    assert info['formats'][0]['url'] == "http://user:secret@a:8080"
+    
+    # 换用其他代理或直接连接时重新解析，不使用绑定旧出口IP的地址
+    ydl_b = FakeYdl("http://b:8080")
+    downloader._extract_info(ydl_b, task)
+    assert not task.info_cached and ydl_b.extracted == 1
+    ydl_direct = FakeYdl()
+    downloader._extract_info(ydl_direct, task)
+    assert ydl_direct.extracted == 1
+    
+    # 缓存键中不包含代理的用户名和密码
+    assert "secret" not in downloader._cache_key("dQw4w9WgXcQ", "http://user:secret@a:8080")
+
+
+def test_stale_cache_403_does_not_blame_proxy(downloader):
+    proxy = "http://b:8080"
+    pool = downloader.proxy_manager.pool
+    task = downloader.create_task(URL)
+    ydl = FakeYdl(proxy)
+    downloader._extract_info(ydl, task)
+    downloader._extract_info(ydl, task)
+    assert task.info_cached
+    
+    downloader._handle_failure(task, Exception("ERROR: unable to download video data: HTTP Error 403: Forbidden"), proxy)
+    assert proxy not in task.failed_proxies
+    assert pool.proxies[proxy].failures == 0
+    # 失效的缓存已删除，重试时重新解析
+    downloader._extract_info(ydl, task)
+    assert not task.info_cached and ydl.extracted == 2
+    
+    # 新解析的地址仍然失败时才计入代理
+    downloader._handle_failure(task, Exception("Connection reset by peer"), proxy)
+    assert proxy in task.failed_proxies
+    assert pool.proxies[proxy].failures == 1
@@ -0,0 +1,28 @@
+from ytdlp_downloader import YtdlpDownloader, PROCESSING_COPY, PROCESSING_TRANSCODE, STATUS_PROCESSING
+
+
+def test_hand_off_reports_processing_state(tmp_path):
+    downloader = YtdlpDownloader(str(tmp_path))
+    reports = []
+    task = downloader.create_task("https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                                  progress_callback=lambda progress, text=None: reports.append((task.status, text)))
+    task.processing = PROCESSING_COPY
+    
+    downloader._postprocess(task, lambda: None).result(timeout=5)
+    downloader.shutdown()
+    
+    # 排队和执行期间回调看到的都是处理中，界面不再显示为下载中100%
+    assert reports == [(STATUS_PROCESSING, "等待合并"), (STATUS_PROCESSING, "正在合并...")]
+
+
+def test_transcode_reports_conversion(tmp_path):
+    downloader = YtdlpDownloader(str(tmp_path))
+    reports = []
+    task = downloader.create_task("https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                                  progress_callback=lambda progress, text=None: reports.append(text))
+    task.processing = PROCESSING_TRANSCODE
+    
+    downloader._postprocess(task, lambda: None).result(timeout=5)
+    downloader.shutdown()
+    
+    assert reports == ["等待转换", "正在转换..."]
@@ -0,0 +1,124 @@
+import time
+import socket
+import threading
+
+import pytest
+
+from proxy_pool import ProxyPool
+
+
+class StandInProxy:
+    """本地代理替身：对CONNECT请求延迟后返回指定的状态行"""
+    
+    def __init__(self, status="HTTP/1.1 200 Connection established", delay=0.0):
+        self.status = status
+        self.delay = delay
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(16)
+        self.url = f"http://127.0.0.1:{self.sock.getsockname()[1]}"
+        threading.Thread(target=self._serve, daemon=True).start()
+    
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                data = b""
+                while b"\r\n\r\n" not in data:
+                    chunk = conn.recv(1024)
+                    if not chunk:
+                        break
+                    data += chunk
+                time.sleep(self.delay)
+                conn.sendall(f"{self.status}\r\n\r\n".encode())
+    
+    def close(self):
+        self.sock.close()
+
+
+def closed_port_url():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
+
+
+@pytest.fixture
+def proxies():
+    servers = {
+        'fast': StandInProxy(),
+        'slow': StandInProxy(delay=0.2),
+        'denied': StandInProxy(status="HTTP/1.1 502 Bad Gateway"),
+    }
+    yield servers
+    for server in servers.values():
+        server.close()
+
+
+def test_probe_prefers_fast_healthy_proxy(proxies):
+    dead = closed_port_url()
+    urls = [proxies['slow'].url, proxies['denied'].url, dead, proxies['fast'].url]
+    pool = ProxyPool(urls, probe_url="http://example.invalid/", failure_threshold=1)
+    
+    pool.probe_all()
+    
+    assert pool.select() == proxies['fast'].url
+    # 探测失败的代理被隔离，排在快照最后
+    snapshot = pool.snapshot()
+    assert [item['url'] for item in snapshot[:2]] == [proxies['fast'].url, proxies['slow'].url]
+    assert not any(item['quarantined'] for item in snapshot[:2])
+    assert {item['url'] for item in snapshot[2:]} == {proxies['denied'].url, dead}
+    assert all(item['quarantined'] and item['last_error'] for item in snapshot[2:])
+
+
+def test_select_spreads_load_and_honours_exclude():
+    pool = ProxyPool(["http://a:1", "http://b:1"])
+    
+    first = pool.select()
+    second = pool.select()
+    assert {first, second} == {"http://a:1", "http://b:1"}
+    
+    pool.release(first)
+    pool.release(second)
+    # 任务失败过的代理优先避开
+    assert pool.select(exclude={"http://a:1"}) == "http://b:1"
+
+
+def test_failover_quarantines_and_recovers():
+    pool = ProxyPool(["http://a:1", "http://b:1"], failure_threshold=2, quarantine_time=60)
+    pool.report_success("http://a:1", latency=0.01)
+    assert pool.select() == "http://a:1"
+    pool.release("http://a:1")
+    
+    pool.report_failure("http://a:1", "连接超时")
+    assert not pool.proxies["http://a:1"].is_quarantined()
+    pool.report_failure("http://a:1", "连接超时")
+    assert pool.proxies["http://a:1"].is_quarantined()
+    assert pool.select() == "http://b:1"
+    pool.release("http://b:1")
+    
+    # 再次失败时隔离时间翻倍
+    pool.report_failure("http://a:1")
+    remaining = pool.proxies["http://a:1"].quarantined_until - time.monotonic()
+    assert 60 < remaining <= 120
+    
+    pool.report_success("http://a:1")
+    assert not pool.proxies["http://a:1"].is_quarantined()
+    assert pool.proxies["http://a:1"].failures == 0
+
+
+def test_all_quarantined_picks_first_to_recover():
+    pool = ProxyPool(["http://a:1", "http://b:1"], failure_threshold=1, quarantine_time=60)
+    pool.report_failure("http://a:1")
+    pool.report_failure("http://b:1")
+    pool.report_failure("http://b:1")
+    
+    assert pool.select() == "http://a:1"
+
+
+def test_empty_pool_selects_nothing():
+    assert ProxyPool([]).select() is None
@@ -0,0 +1,88 @@
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from retry_policy import (RetryPolicy, DownloadCancelled, classify_error, get_retry_after,
+                          ERROR_CANCELLED, ERROR_NETWORK, ERROR_PERMANENT, ERROR_PROXY,
+                          ERROR_THROTTLED, ERROR_UNKNOWN)
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class HTTPError(Exception):
+    def __init__(self, message, headers):
+        super().__init__(message)
+        self.response = FakeResponse(headers)
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("ERROR: [youtube] abc: Private video. Sign in if you've been granted access", ERROR_PERMANENT),
+    ("HTTP Error 404: Not Found", ERROR_PERMANENT),
+    ("HTTP Error 429: Too Many Requests", ERROR_THROTTLED),
+    ("Sign in to confirm you're not a bot", ERROR_THROTTLED),
+    ("ProxyError: Unable to connect to proxy", ERROR_PROXY),
+    ("The read operation timed out", ERROR_NETWORK),
+    ("HTTP Error 403: Forbidden", ERROR_NETWORK),
+    ("something odd", ERROR_UNKNOWN),
+])
+def test_classify_error(message, expected):
+    assert classify_error(Exception(message)) == expected
+
+
+def test_cancelled_is_never_retried():
+    error = DownloadCancelled("下载已取消")
+    assert classify_error(error) == ERROR_CANCELLED
+    assert RetryPolicy().decide(error, {}) == (ERROR_CANCELLED, None)
+
+
+def test_retry_after_from_exception_chain():
+    cause = HTTPError("HTTP Error 429: Too Many Requests", {'Retry-After': '120'})
+    try:
+        try:
+            raise cause
+        except HTTPError as e:
+            raise Exception("ERROR: Unable to download") from e
+    except Exception as wrapped:
+        assert get_retry_after(wrapped) == 120.0
+    
+    when = datetime.now(timezone.utc) + timedelta(seconds=60)
+    dated = HTTPError("HTTP Error 429", {'Retry-After': format_datetime(when, usegmt=True)})
+    assert 55 <= get_retry_after(dated) <= 60
+    assert get_retry_after(Exception("no headers")) is None
+
+
+def test_backoff_grows_with_jitter_and_cap():
+    policy = RetryPolicy(budgets={ERROR_NETWORK: 10}, base_delay=2.0, max_delay=10.0)
+    for attempt in range(6):
+        ceiling = min(10.0, 2.0 * 2 ** attempt)
+        for _ in range(20):
+            delay = policy.next_delay(ERROR_NETWORK, attempt)
+            assert min(1.0, ceiling) <= delay <= ceiling
+
+
+def test_throttled_uses_longer_base_and_retry_after():
+    policy = RetryPolicy(base_delay=2.0, max_delay=300.0, throttle_base_delay=30.0)
+    assert 15.0 <= policy.next_delay(ERROR_THROTTLED, 0) <= 30.0
+    # 服务器要求的等待时间更长时采用服务器的值，但不超过上限
+    assert policy.next_delay(ERROR_THROTTLED, 0, retry_after=200) == 200
+    assert policy.next_delay(ERROR_THROTTLED, 0, retry_after=1000) == 300.0
+
+
+def test_decide_spends_budget_per_error_class():
+    policy = RetryPolicy(budgets={ERROR_NETWORK: 2, ERROR_PROXY: 1}, base_delay=0.01)
+    attempts = {}
+    network = Exception("Connection reset by peer")
+    proxy = Exception("Tunnel connection failed: 502")
+    
+    assert policy.decide(network, attempts)[1] is not None
+    assert policy.decide(proxy, attempts)[1] is not None
+    assert policy.decide(network, attempts)[1] is not None
+    # 各类错误的次数分别计算，用完后不再重试
+    assert policy.decide(network, attempts) == (ERROR_NETWORK, None)
+    assert policy.decide(proxy, attempts) == (ERROR_PROXY, None)
+    assert attempts == {ERROR_NETWORK: 2, ERROR_PROXY: 1}
+    assert policy.decide(Exception("Video unavailable"), attempts) == (ERROR_PERMANENT, None)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+YouTube链接解析工具
+
+从各种形式的YouTube链接中提取视频ID，
+用于缓存、去重等需要规范化标识的场景。
+"""
+
+import re
+from urllib.parse import urlparse, parse_qs
+
+# YouTube视频ID由11位字母、数字、-和_组成
+_VIDEO_ID_RE = re.compile(r'^[0-9A-Za-z_-]{11}$')
+
+# 路径形式的链接，例如 /shorts/ID、/embed/ID、/live/ID、/v/ID
+_PATH_PREFIXES = ('shorts', 'embed', 'live', 'v', 'e')
+
+
+def extract_video_id(url):
+    """从YouTube链接中提取视频ID
+    
+    支持 watch?v=、youtu.be/、shorts/、embed/、live/ 等形式，
+    忽略 &t=、&list= 等附加参数。
+    
+    Args:
+        url: YouTube链接或视频ID
+        
+    Returns:
+        str: 视频ID，无法识别时返回None
+    """
+    if not url:
+        return None
+    url = url.strip()
+    if _VIDEO_ID_RE.match(url):
+        return url
+    
+    if '://' not in url:
+        url = 'https://' + url
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return None
+    
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if host.startswith('m.') or host.startswith('music.'):
+        host = host.split('.', 1)[1]
+    
+    path_parts = [part for part in parsed.path.split('/') if part]
+    candidate = None
+    if host == 'youtu.be':
+        candidate = path_parts[0] if path_parts else None
+    elif host in ('youtube.com', 'youtube-nocookie.com'):
+        if path_parts and path_parts[0] == 'watch':
+            candidate = parse_qs(parsed.query).get('v', [None])[0]
+        elif len(path_parts) >= 2 and path_parts[0] in _PATH_PREFIXES:
+            candidate = path_parts[1]
+    
+    if candidate and _VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+# 播放列表和频道链接的路径前缀
+_CHANNEL_PREFIXES = ('channel', 'c', 'user')
+
+
+def is_playlist_url(url):
+    """判断链接是否指向播放列表或频道
+    
+    带有v=参数的观看页链接（即使同时带有list=）仍按单个视频处理。
+    """
+    if not url:
+        return False
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return False
+    
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.') or host.startswith('m.') or host.startswith('music.'):
+        host = host.split('.', 1)[1]
+    if host != 'youtube.com':
+        return False
+    
+    path_parts = [part for part in parsed.path.split('/') if part]
+    if not path_parts:
+        return False
+    if path_parts[0] == 'playlist':
+        return 'list' in parse_qs(parsed.query)
+    if path_parts[0].startswith('@'):
+        return True
+    return path_parts[0] in _CHANNEL_PREFIXES and len(path_parts) >= 2
@@ -13,10 +13,25 @@ import time
 import threading
 import subprocess
 import logging
-import random
+import uuid
+import copy
 import yt_dlp
 import concurrent.futures
-from queue import Queue
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from queue import Queue, Empty
+
+from metadata_cache import MetadataCache
+from bandwidth import BandwidthScheduler
+from concurrency import AdaptiveConcurrency
+from session_pool import SessionPool
+from postprocess import PostProcessor, merge_streams, extract_audio
+from admission import DiskAdmission, WaitForSpace, RETRY_DELAY as ADMISSION_RETRY_DELAY
+from content_store import ContentStore, file_sha256
+from retry_policy import (RetryPolicy, DownloadCancelled, ERROR_CANCELLED, ERROR_LABELS,
+                          ERROR_NETWORK, ERROR_PROXY, ERROR_THROTTLED)
+from download_archive import DownloadArchive
+from url_utils import extract_video_id
 
 # 尝试导入代理管理器
 try:
@@ -29,33 +44,423 @@ except ImportError:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('ytdlp_downloader')
 
+# 任务状态
+STATUS_WAITING = "等待中"
+STATUS_DOWNLOADING = "下载中"
+STATUS_PROCESSING = "处理中"
+STATUS_PAUSED = "已暂停"
+STATUS_DONE = "完成"
+STATUS_ERROR = "错误"
+STATUS_CANCELLED = "已取消"
+STATUS_INTERRUPTED = "已中断"
+
+# 后处理方式
+PROCESSING_COPY = "copy"            # 直接复制码流合并，不重新编码
+PROCESSING_TRANSCODE = "transcode"  # 转码
+PROCESSING_NATIVE = "native"        # 保留原始音频流，跳过转码
+
+# 音频格式：native保留YouTube提供的原始音频，mp3转码为192k mp3
+AUDIO_FORMATS = ("native", "mp3")
+
+# 下载类型
+DOWNLOAD_TYPES = ("视频+音频", "仅视频", "仅音频")
+
+# 视频质量对应的最大高度，None表示不限制
+QUALITY_HEIGHTS = {
+    "最高质量": None,
+    "4K": 2160,
+    "2K": 1440,
+    "1080p": 1080,
+    "720p": 720,
+    "480p": 480,
+    "360p": 360,
+}
+
+# 边下载边合并时按Range请求的分段大小，与yt-dlp对YouTube直链的分段一致
+STREAM_RANGE_SIZE = 10 * 1024 * 1024
+# 边下载边合并时每次读取并写入管道的字节数
+STREAM_READ_SIZE = 64 * 1024
+
+
+class _RetryScheduled(Exception):
+    """任务已安排稍后重新入队，工作线程不应视为结束"""
+
+
+class _PostProcessing(Exception):
+    """任务已交给后处理队列，后处理结束时才算完成，工作线程不应视为结束"""
+
+
+class DownloadTask:
+    """单个下载任务
+    
+    每个任务持有自己的进度、字节计数、回调以及暂停/取消标记，
+    多个任务并发运行时互不干扰。
+    """
+    
+    def __init__(self, url, quality="1080p", download_type="视频+音频", progress_callback=None, use_proxy=None, task_id=None):
+        """初始化下载任务
+        
+        Args:
+            url: YouTube视频URL
+            quality: 视频质量
+            download_type: 下载类型 (视频+音频, 仅视频, 仅音频)
+            progress_callback: 进度回调函数，签名为 callback(progress, status_text=None)
+            use_proxy: 是否使用代理，None表示使用当前设置
+            task_id: 任务ID，默认自动生成
+        """
+        self.task_id = task_id or uuid.uuid4().hex
+        self.url = url
+        self.quality = quality
+        self.download_type = download_type
+        self.progress_callback = progress_callback
+        self.use_proxy = use_proxy
+        # 规范化的视频ID，解析后以yt-dlp返回的ID为准
+        self.video_id = extract_video_id(url)
+        
+        self.status = STATUS_WAITING
+        self.status_text = None
+        self.progress = 0.0
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+        self.result = None
+        self.error = None
+        # 视频已在下载记录中，未实际下载
+        self.skipped = False
+        # 程序退出导致的中断，下次启动时可继续下载
+        self.interrupted = False
+        # yt-dlp正在写入的临时文件(.part)
+        self.part_path = None
+        # 任务结束（完成、失败或取消）后的回调，签名为 callback(task)
+        self.done_callback = None
+        # 各类错误已重试的次数 {错误类型: 次数}
+        self.retry_attempts = {}
+        # 本任务失败过的代理，重试时优先换用其他代理
+        self.failed_proxies = set()
+        # 本次尝试使用的视频信息来自缓存
+        self.info_cached = False
+        # 并行下载的各个流的字节计数 {流ID: [已下载, 总大小]}
+        self._streams = {}
+        # 后处理（合并、转码）的Future，交给后处理队列后设置
+        self.postprocess = None
+        # 实际使用的后处理方式，PROCESSING_*常量之一，无需后处理时为None
+        self.processing = None
+        # 内容存储中的索引 (视频ID, 格式ID, 扩展名)，格式选择后设置
+        self.store_key = None
+        # 文件直接链接自内容存储，未实际下载
+        self.from_store = False
+        # 后处理线程中预先计算的结果文件SHA-256，放入内容存储时使用
+        self.result_sha256 = None
+        
+        self.lock = threading.Lock()
+        self._cancel_event = threading.Event()
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+    
+    @property
+    def is_cancelled(self):
+        """任务是否已取消"""
+        return self._cancel_event.is_set()
+    
+    @property
+    def is_paused(self):
+        """任务是否已暂停"""
+        return not self._resume_event.is_set()
+    
+    def pause(self):
+        """暂停任务"""
+        self._resume_event.clear()
+    
+    def resume(self):
+        """继续任务"""
+        self._resume_event.set()
+    
+    def cancel(self):
+        """取消任务"""
+        self._cancel_event.set()
+        # 唤醒暂停中的任务，使其尽快退出
+        self._resume_event.set()
+    
+    def interrupt(self):
+        """中断任务并保留临时文件，用于程序退出时"""
+        self.interrupted = True
+        self.cancel()
+    
+    def report(self, progress, status_text=None):
+        """更新进度并通知回调"""
+        with self.lock:
+            self.progress = progress
+            self.status_text = status_text
+        if self.progress_callback:
+            self.progress_callback(progress, status_text)
+    
+    def to_dict(self):
+        """导出任务状态，便于序列化为JSON"""
+        with self.lock:
+            return {
+                'task_id': self.task_id,
+                'url': self.url,
+                'video_id': self.video_id,
+                'quality': self.quality,
+                'download_type': self.download_type,
+                'status': self.status,
+                'status_text': self.status_text,
+                'paused': self.is_paused,
+                'progress': self.progress,
+                'downloaded_bytes': self.downloaded_bytes,
+                'total_bytes': self.total_bytes,
+                'skipped': self.skipped,
+                'processing': self.processing,
+                'from_store': self.from_store,
+                'result': self.result,
+                'error': str(self.error) if self.error else None,
+            }
+    
+    def _check_control(self):
+        """处理暂停和取消，任务被取消时抛出DownloadCancelled中止yt-dlp下载"""
+        if self.is_cancelled:
+            raise DownloadCancelled("下载已取消")
+        
+        # 暂停下载
+        while self.is_paused and not self.is_cancelled:
+            self._resume_event.wait(0.1)
+        
+        if self.is_cancelled:
+            raise DownloadCancelled("下载已取消")
+    
+    def progress_hook(self, d):
+        """yt-dlp下载进度回调"""
+        self._check_control()
+        
+        # 计算进度
+        if d['status'] == 'downloading':
+            # 获取下载进度
+            downloaded = d.get('downloaded_bytes', 0)
+            total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
+            
+            if total > 0:
+                with self.lock:
+                    self.downloaded_bytes = downloaded
+                    self.total_bytes = total
+                status_text = f"下载中: {d.get('_percent_str', '0%')}"
+                # 分段下载时附带分段进度
+                if d.get('fragment_count'):
+                    status_text += f" (分段 {d.get('fragment_index', 0)}/{d['fragment_count']})"
+                self.report(min(downloaded / total, 1.0), status_text)
+        
+        elif d['status'] == 'finished':
+            self.report(1.0, "下载完成，正在处理...")
+    
+    def make_stream_hook(self, stream_id, expected_bytes=0, stop_event=None):
+        """为同时下载的多个流之一创建进度回调
+        
+        任务进度按所有流的字节总和计算，而不是只反映其中一个流。
+        
+        Args:
+            stream_id: 流标识，通常为format_id
+            expected_bytes: 预估大小，在yt-dlp报告实际大小之前使用
+            stop_event: threading.Event，置位时中止该流的下载（另一个流已失败）
+        """
+        with self.lock:
+            self._streams[stream_id] = [0, expected_bytes or 0]
+        
+        def hook(d):
+            self._check_control()
+            if stop_event is not None and stop_event.is_set():
+                raise DownloadCancelled("另一个流下载失败，停止下载")
+            if d['status'] not in ('downloading', 'finished'):
+                return
+            
+            total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            downloaded = d.get('downloaded_bytes') or (total if d['status'] == 'finished' else 0)
+            with self.lock:
+                stream = self._streams[stream_id]
+                stream[0] = downloaded
+                if total:
+                    stream[1] = total
+                self.downloaded_bytes = sum(s[0] for s in self._streams.values())
+                self.total_bytes = sum(max(s[0], s[1]) for s in self._streams.values())
+                downloaded_sum, total_sum = self.downloaded_bytes, self.total_bytes
+            
+            if total_sum > 0:
+                progress = min(downloaded_sum / total_sum, 1.0)
+                self.report(progress, f"下载中: {progress * 100:.1f}% (视频和音频同时下载)")
+        
+        return hook
+
+
 class YtdlpDownloader:
-    """基于yt-dlp的YouTube下载器"""
+    """基于yt-dlp的YouTube下载器
+    
+    下载器本身不保存单次下载的状态，而是作为一组DownloadTask的容器，
+    每个任务独立维护进度和暂停/取消标记。
+    """
     
-    def __init__(self, download_path):
+    def __init__(self, download_path, max_workers=3, config_manager=None):
         self.download_path = download_path
-        self.is_paused = False
-        self.is_cancelled = False
-        self.current_download = None
+        self.config_manager = config_manager
         self.lock = threading.Lock()
-        self.max_retries = 3  # 最大重试次数
-        self.max_workers = 3  # 最大并发下载数，可根据需要调整
+        # 重试策略，按错误类型决定是否重试和等待时间
+        self.retry_policy = self._create_retry_policy()
+        # 等待重试的任务 {任务ID: threading.Timer}
+        self._retry_timers = {}
+        self.max_workers = max(1, int(max_workers))  # 最大并发下载数，可通过set_max_workers调整
+        
+        # 排队中和正在运行的任务 task_id -> DownloadTask
+        self.tasks = {}
+        
+        # 任务日志，用于程序重启后恢复未完成的任务
+        self.journal = None
+        
+        # FFmpeg是否可用，首次合并时检测
+        self._ffmpeg_available = None
+        
+        # 工作线程池
+        self._queue = Queue()
+        self._worker_count = 0
+        
+        # 所有任务累计接收的字节数，供自适应并发控制计算吞吐量
+        self.bytes_received = 0
+        self.concurrency = None
         
         # 初始化代理管理器
         self.proxy_manager = ProxyManager() if has_proxy_manager else None
         
         # 创建下载目录
         os.makedirs(self.download_path, exist_ok=True)
+        
+        # 视频信息缓存和下载记录，保存在下载目录下
+        self.metadata_cache = None
+        self.archive = None
+        self._init_metadata_cache()
+        self._init_archive()
+        
+        # 按视频ID和格式索引的内容存储，下载目录中的文件链接到存储
+        self.store = None
+        self._init_store()
+        
+        # 按代理划分的共享网络会话，任务之间复用已建立的连接
+        self.sessions = None
+        if not config_manager or config_manager.is_session_pool_enabled():
+            self.sessions = SessionPool(config_manager.get_max_sessions() if config_manager else 8,
+                                        config_manager.get_session_idle_timeout() if config_manager else 300)
+        
+        # 按编码选择可直接复制码流合并的格式；仅音频时的输出格式
+        self.codec_aware = config_manager.is_codec_aware_formats_enabled() if config_manager else True
+        self.audio_format = config_manager.get_audio_format() if config_manager else "native"
+        # 边下载边合并，不产生中间文件
+        self.streaming_merge = config_manager.is_streaming_merge_enabled() if config_manager else False
+        
+        # 磁盘空间准入控制，空间不足时任务继续排队
+        self.admission = None
+        if not config_manager or config_manager.is_disk_admission_enabled():
+            min_free = config_manager.get_min_free_space() if config_manager else 512 * 1024 ** 2
+            self.admission = DiskAdmission(self.download_path, min_free)
+        
+        # FFmpeg后处理队列，与下载分开限制并发
+        self.postprocessor = PostProcessor(config_manager.get_postprocess_workers() if config_manager else 0,
+                                           config_manager.get_postprocess_max_pending() if config_manager else 0)
+        
+        # 所有任务共用的带宽调度器
+        self.bandwidth = BandwidthScheduler()
+        self.reload_bandwidth_settings()
+        
+        if config_manager and config_manager.is_adaptive_concurrency_enabled():
+            self.set_adaptive_concurrency(True)
+    
+    def _create_retry_policy(self):
+        """根据配置创建重试策略"""
+        if not self.config_manager:
+            return RetryPolicy()
+        return RetryPolicy(self.config_manager.get_retry_budgets(),
+                           self.config_manager.get_retry_base_delay(),
+                           self.config_manager.get_retry_max_delay())
+    
+    def reload_bandwidth_settings(self):
+        """从配置文件重新读取限速设置，立即对正在下载的任务生效"""
+        if not self.config_manager:
+            return
+        try:
+            self.bandwidth.set_limits(self.config_manager.get_global_rate_limit(),
+                                      self.config_manager.get_job_rate_limit(),
+                                      self.config_manager.get_rate_limit_schedule())
+        except ValueError as e:
+            logger.warning(f"限速设置无效，已忽略: {str(e)}")
     
     def set_download_path(self, path):
         """设置下载路径"""
         self.download_path = path
         os.makedirs(self.download_path, exist_ok=True)
+        if self.admission:
+            self.admission.set_path(path)
+        self._init_metadata_cache()
+        self._init_archive()
+        self._init_store()
+    
+    def _init_archive(self):
+        """载入下载目录下的下载记录"""
+        self.archive = None
+        if self.config_manager and not self.config_manager.is_download_archive_enabled():
+            return
+        try:
+            self.archive = DownloadArchive(os.path.join(self.download_path, "download_archive.txt"))
+        except Exception as e:
+            logger.warning(f"无法载入下载记录: {str(e)}")
+    
+    def is_downloaded(self, url, download_type="视频+音频", quality="1080p"):
+        """根据下载记录判断视频是否已下载，不发起网络请求"""
+        video_id = extract_video_id(url)
+        return bool(self.archive and video_id and self.archive.contains(video_id, download_type, quality))
+    
+    def _init_metadata_cache(self):
+        """在下载目录下创建视频信息缓存"""
+        if self.metadata_cache:
+            self.metadata_cache.close()
+            self.metadata_cache = None
+        
+        config = self.config_manager
+        if config and not config.is_metadata_cache_enabled():
+            return
+        
+        ttl = config.get_metadata_cache_ttl() if config else 4 * 3600
+        max_entries = config.get_metadata_cache_max_entries() if config else 2000
+        try:
+            self.metadata_cache = MetadataCache(os.path.join(self.download_path, ".cache"), ttl, max_entries)
+        except Exception as e:
+            logger.warning(f"无法创建视频信息缓存: {str(e)}")
+    
+    def _init_store(self):
+        """打开内容存储，未指定存储目录时使用下载目录下的.store"""
+        if self.store:
+            self.store.close()
+            self.store = None
+        
+        config = self.config_manager
+        if not config or not config.is_content_store_enabled():
+            return
+        
+        store_path = config.get_content_store_path() or os.path.join(self.download_path, ".store")
+        try:
+            self.store = ContentStore(store_path, config.get_store_link_mode(),
+                                      config.is_store_hash_verification_enabled())
+        except Exception as e:
+            logger.warning(f"无法打开内容存储: {str(e)}")
     
     def set_proxy(self, proxy_url=None):
         """设置HTTP代理"""
         self.proxy = proxy_url
     
+    def set_journal(self, journal):
+        """设置任务日志，提交的任务及其状态变化都会写入日志"""
+        self.journal = journal
+    
+    def create_task(self, url, quality="1080p", download_type="视频+音频", progress_callback=None, use_proxy=None, task_id=None):
+        """创建下载任务（不会立即开始下载）
+        
+        Returns:
+            DownloadTask: 新建的下载任务
+        """
+        return DownloadTask(url, quality, download_type, progress_callback, use_proxy, task_id)
+    
     def download(self, url, quality="1080p", download_type="视频+音频", progress_callback=None, use_proxy=None):
         """下载YouTube视频
         
@@ -66,65 +471,495 @@ class YtdlpDownloader:
             progress_callback: 进度回调函数
             use_proxy: 是否使用代理，None表示使用当前设置，True强制使用，False强制不使用
         """
-        self.is_cancelled = False
-        self.is_paused = False
+        task = self.create_task(url, quality, download_type, progress_callback, use_proxy)
+        return self.run_task(task)
+    
+    def submit(self, task, done_callback=None):
+        """将任务加入下载队列，由工作线程池并发执行
+        
+        Args:
+            task: DownloadTask实例
+            done_callback: 任务结束后的回调，签名为 callback(task)
+            
+        Returns:
+            DownloadTask: 已提交的任务
+        """
+        if done_callback:
+            task.done_callback = done_callback
+        with self.lock:
+            self.tasks[task.task_id] = task
         
-        # 设置进度回调
-        self._progress_callback = progress_callback
-        self._downloaded_bytes = 0
-        self._total_bytes = 0
+        # 先写日志再入队，保证程序异常退出后任务不会丢失
+        if self.journal:
+            self.journal.record(task)
+        self._queue.put(task)
+        self._ensure_workers()
+        return task
+    
+    def set_max_workers(self, count):
+        """调整最大并发下载数，可在下载过程中随时调用
         
-        # 应用代理设置
-        proxy = None
-        if self.proxy_manager:
-            if use_proxy is not None:
-                self.proxy_manager.set_proxy_enabled(use_proxy)
+        增大时立即启动新的工作线程；减小时多余的线程在完成当前任务后退出。
+        """
+        with self.lock:
+            self.max_workers = max(1, int(count))
+        logger.info(f"最大并发下载数: {self.max_workers}")
+        self._ensure_workers()
+    
+    def set_adaptive_concurrency(self, enabled, on_change=None):
+        """启用或关闭自适应并发，启用后并发数根据吞吐量和限流错误自动调整
+        
+        Args:
+            enabled: 是否启用
+            on_change: 并发数变化时的回调，签名为 on_change(level, reason)
+        """
+        if self.concurrency:
+            self.concurrency.stop()
+            self.concurrency = None
+        if not enabled:
+            return
+        
+        if self.config_manager:
+            min_workers = self.config_manager.get_adaptive_min_workers()
+            max_workers = self.config_manager.get_adaptive_max_workers()
+            interval = self.config_manager.get_adaptive_sample_interval()
+        else:
+            min_workers, max_workers, interval = 1, 16, 10.0
+        self.concurrency = AdaptiveConcurrency(self, min_workers, max_workers, interval, on_change)
+        self.concurrency.start()
+    
+    def concurrency_stats(self):
+        """获取下载和后处理的并发状态，以及磁盘空间预留和内容存储情况"""
+        if self.concurrency:
+            stats = self.concurrency.stats()
+        else:
+            running, queued = self.running_counts()
+            stats = {'adaptive': False, 'level': self.max_workers, 'running': running, 'queued': queued}
+        stats['postprocess'] = self.postprocessor.stats()
+        if self.admission:
+            stats['disk'] = self.admission.stats()
+        if self.store:
+            stats['store'] = self.store.stats()
+        return stats
+    
+    def running_counts(self):
+        """获取正在下载和排队中的任务数
+        
+        Returns:
+            tuple: (正在下载的任务数, 排队中的任务数)
+        """
+        with self.lock:
+            running = sum(1 for task in self.tasks.values() if task.status == STATUS_DOWNLOADING)
+        return running, self._queue.qsize()
+    
+    def _ensure_workers(self):
+        """按需启动工作线程，直到达到最大并发数"""
+        with self.lock:
+            missing = min(self.max_workers - self._worker_count, self._queue.qsize())
+            if missing <= 0:
+                return
+            self._worker_count += missing
+        for _ in range(missing):
+            threading.Thread(target=self._worker_loop, daemon=True).start()
+    
+    def _worker_loop(self):
+        """工作线程：从队列中取出任务依次执行"""
+        while True:
+            with self.lock:
+                if self._worker_count > self.max_workers:
+                    self._worker_count -= 1
+                    return
+            try:
+                task = self._queue.get(timeout=1)
+            except Empty:
+                # 队列空闲时退出，下次提交任务时再按需启动
+                with self.lock:
+                    if self._queue.empty():
+                        self._worker_count -= 1
+                        return
+                continue
+            
+            # 任务稍后重新入队或正在后处理，尚未结束
+            pending = False
+            try:
+                if task.is_cancelled:
+                    task.status = STATUS_INTERRUPTED if task.interrupted else STATUS_CANCELLED
+                    with self.lock:
+                        self.tasks.pop(task.task_id, None)
+                    self._journal_finish(task)
+                else:
+                    self.run_task(task, requeue=True)
+            except (_RetryScheduled, _PostProcessing):
+                pending = True
+            except Exception:
+                # 错误已记录在task.error中
+                pass
+            finally:
+                if task.done_callback and not pending:
+                    try:
+                        task.done_callback(task)
+                    except Exception as e:
+                        logger.error(f"任务回调出错: {str(e)}")
+    
+    def run_task(self, task, requeue=False):
+        """在当前线程中执行下载任务，失败时按重试策略自动重试
+        
+        Args:
+            task: DownloadTask实例
+            requeue: 为True时由工作线程池执行：不在当前线程等待重试，而是定时把任务放回队列末尾，
+                     此时抛出_RetryScheduled；需要后处理时交给后处理队列后立即返回，
+                     此时抛出_PostProcessing，任务结束后调用task.done_callback
+            
+        Returns:
+            str: 下载后的文件路径，任务被取消时返回None
+        """
+        with self.lock:
+            self.tasks[task.task_id] = task
+        
+        finished = True
+        try:
+            # 已下载过的视频直接跳过
+            if self.is_downloaded(task.url, task.download_type, task.quality):
+                logger.info(f"视频已下载，跳过: {task.url}")
+                task.skipped = True
+                task.status = STATUS_DONE
+                task.report(1.0, "已下载，跳过")
+                return None
             
-            if self.proxy_manager.is_proxy_enabled():
-                http_proxy = self.proxy_manager.get_http_proxy()
-                https_proxy = self.proxy_manager.get_https_proxy()
-                proxy = https_proxy or http_proxy
-                logger.info(f"使用代理下载: {proxy}")
+            task.status = STATUS_DOWNLOADING
+            if self.journal:
+                self.journal.update_state(task.task_id, task.status)
+            result = self._run_with_retries(task, requeue)
+            if isinstance(result, concurrent.futures.Future):
+                if requeue:
+                    # 下载线程不等待后处理，立即去下载下一个任务
+                    self._hand_off(task, result)
+                    finished = False
+                    raise _PostProcessing()
+                result = self._wait_postprocess(task, result)
+            return self._complete_task(task, result)
+        except (_RetryScheduled, _PostProcessing):
+            finished = False
+            raise
+        except Exception as e:
+            task.error = e
+            task.status = self._cancelled_status(task) if task.is_cancelled else STATUS_ERROR
+            raise
+        finally:
+            self.bandwidth.unregister(task.task_id)
+            if finished:
+                self._release_space(task)
+                with self.lock:
+                    self.tasks.pop(task.task_id, None)
+                self._journal_finish(task)
+    
+    def _complete_task(self, task, result):
+        """记录任务的下载结果"""
+        task.result = result
+        task.status = self._cancelled_status(task) if task.is_cancelled else STATUS_DONE
+        
+        if task.status == STATUS_DONE and self.archive and task.video_id:
+            self.archive.add(task.video_id, task.download_type, task.quality)
+        if task.status == STATUS_DONE and result and not task.from_store:
+            self._store_result(task, result)
+        return task.result
+    
+    def _storable(self, task, path):
+        """下载结果是否应放入内容存储"""
+        return (bool(self.store and task.store_key and path) and os.path.isfile(path)
+                and os.path.splitext(path)[1] == task.store_key[2])
+    
+    def _store_result(self, task, path):
+        """把下载完成的文件放入内容存储，下载目录中的文件替换为链接"""
+        if not self._storable(task, path):
+            return
+        video_id, format_id, ext = task.store_key
+        try:
+            self.store.add(video_id, format_id, ext, path, sha256=task.result_sha256)
+        except Exception as e:
+            logger.warning(f"保存到内容存储失败: {str(e)}")
+    
+    def _link_stored(self, task, selected, output_path):
+        """内容存储中已有所选格式的文件时，直接链接到输出路径
+        
+        Args:
+            selected: yt-dlp格式选择后的视频信息
+            output_path: 下载完成后的文件路径
+        
+        Returns:
+            str: 链接后的文件路径，存储中没有时返回None
+        """
+        task.store_key = None
+        if not self.store or not selected.get('id') or not selected.get('format_id'):
+            return None
+        task.store_key = (selected['id'], selected['format_id'], os.path.splitext(output_path)[1])
+        try:
+            if not self.store.link(*task.store_key, output_path):
+                return None
+        except Exception as e:
+            logger.warning(f"从内容存储链接失败: {str(e)}")
+            return None
+        task.from_store = True
+        task.processing = None
+        task.report(1.0, "已从本地存储链接")
+        return output_path
+    
+    def _hand_off(self, task, future):
+        """任务进入后处理阶段，后处理结束时完成任务"""
+        task.status = STATUS_PROCESSING
+        task.postprocess = future
+        if self.journal:
+            self.journal.update_state(task.task_id, task.status)
+        future.add_done_callback(lambda f: self._finish_postprocess(task, f))
+    
+    def _finish_postprocess(self, task, future):
+        """后处理结束后的回调，在后处理队列的线程中执行"""
+        try:
+            if future.cancelled():
+                task.status = self._cancelled_status(task)
+            else:
+                self._complete_task(task, future.result())
+        except Exception as e:
+            task.error = e
+            if task.is_cancelled:
+                # 程序退出时终止的后处理，任务保留在日志中，下次启动时重新处理
+                task.status = self._cancelled_status(task)
             else:
-                logger.info("不使用代理下载")
+                task.status = STATUS_ERROR
+                logger.error(f"后处理失败: {str(e)}")
+        finally:
+            self._release_space(task)
+            with self.lock:
+                self.tasks.pop(task.task_id, None)
+            self._journal_finish(task)
+            if task.done_callback:
+                try:
+                    task.done_callback(task)
+                except Exception as e:
+                    logger.error(f"任务回调出错: {str(e)}")
+    
+    def _wait_postprocess(self, task, future):
+        """在当前线程中等待后处理结束，取消任务时放弃尚未开始的后处理"""
+        task.status = STATUS_PROCESSING
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except concurrent.futures.TimeoutError:
+                if task.is_cancelled and future.cancel():
+                    return None
+            except concurrent.futures.CancelledError:
+                return None
+    
+    def _postprocess(self, task, func, *args):
+        """把FFmpeg工作交给后处理队列，队列已满时等待
+        
+        Returns:
+            concurrent.futures.Future: 后处理结果，任务在等待期间被取消时返回None
+        """
+        def job():
+            self._report_processing(task, started=True)
+            path = func(*args)
+            # 在后处理线程中计算哈希，完成回调中只创建链接和写入记录
+            if self._storable(task, path):
+                try:
+                    task.result_sha256 = file_sha256(path)
+                except OSError as e:
+                    logger.warning(f"计算文件哈希失败: {str(e)}")
+            return path
+        
+        # 先切换状态再报告进度，界面和任务接口在排队期间显示处理中
+        task.status = STATUS_PROCESSING
+        self._report_processing(task)
+        return self.postprocessor.submit(job, cancel_event=task._cancel_event)
+    
+    def _report_processing(self, task, started=False):
+        """报告后处理进度：在后处理队列中等待，或正在执行"""
+        action = "转换" if task.processing == PROCESSING_TRANSCODE else "合并"
+        task.report(1.0, f"正在{action}..." if started else f"等待{action}")
+    
+    def _reserve_space(self, task, selected, merge=False):
+        """按选中的格式为任务预留磁盘空间
         
-        # 添加重试机制
-        retry_count = 0
-        last_error = None
+        Args:
+            selected: yt-dlp格式选择后的视频信息
+            merge: 下载后是否还需要合并或转码
+        
+        Raises:
+            WaitForSpace: 暂时没有足够的空间，任务稍后重试
+            DiskSpaceError: 磁盘空间不足以完成该任务
+        """
+        if not self.admission:
+            return
+        formats = selected.get('requested_formats') or [selected]
+        size = self.admission.estimate(formats, merge)
+        self.admission.reserve(task.task_id, size, lambda: task.downloaded_bytes)
+    
+    def _release_space(self, task):
+        """释放任务预留的磁盘空间"""
+        if self.admission:
+            self.admission.release(task.task_id)
+    
+    def _cancelled_status(self, task):
+        """取消任务的最终状态：程序退出导致的中断与用户取消区分开"""
+        return STATUS_INTERRUPTED if task.interrupted else STATUS_CANCELLED
+    
+    def _journal_finish(self, task):
+        """任务结束后更新日志：中断的任务保留以便续传，其余任务从日志中删除"""
+        if not self.journal:
+            return
+        try:
+            if task.status == STATUS_INTERRUPTED:
+                self.journal.update_state(task.task_id, task.status)
+            else:
+                self.journal.remove(task.task_id)
+        except Exception as e:
+            logger.warning(f"更新任务日志失败: {str(e)}")
+    
+    def _journal_progress(self, task, d):
+        """记录任务正在写入的临时文件，续传时使用"""
+        part_path = d.get('tmpfilename')
+        if part_path and part_path != task.part_path:
+            task.part_path = part_path
+            if self.journal:
+                self.journal.update_part_path(task.task_id, part_path)
+    
+    def _resolve_proxy(self, use_proxy=None, exclude=()):
+        """根据任务设置从代理池中选择代理，不修改全局代理配置
         
-        while retry_count < self.max_retries:
+        选中的代理计入使用数，用完后需调用_release_proxy。
+        
+        Args:
+            use_proxy: 是否使用代理，None表示使用当前设置
+            exclude: 优先避开的代理，用于失败后换用其他代理
+        """
+        if not self.proxy_manager:
+            return None
+        
+        enabled = self.proxy_manager.is_proxy_enabled() if use_proxy is None else use_proxy
+        if not enabled:
+            logger.info("不使用代理下载")
+            return None
+        
+        proxy = self.proxy_manager.get_pool().select(exclude)
+        if not proxy:
+            logger.warning("未配置可用的代理，不使用代理下载")
+            return None
+        logger.info(f"使用代理下载: {proxy}")
+        return proxy
+    
+    def _release_proxy(self, proxy, succeeded=False):
+        """归还代理，下载成功时计入代理的成功率"""
+        if not proxy:
+            return
+        pool = self.proxy_manager.get_pool()
+        pool.release(proxy)
+        if succeeded:
+            pool.report_success(proxy)
+    
+    def _run_with_retries(self, task, requeue=False):
+        """按任务设置下载，失败时按错误类型决定是否重试"""
+        while True:
+            # 每次尝试都重新选择代理，避开本任务失败过的代理
+            proxy = self._resolve_proxy(task.use_proxy, task.failed_proxies)
             try:
-                # 如果是重试，添加随机延迟避免频繁请求
-                if retry_count > 0:
-                    delay = random.uniform(1, 3) * retry_count
-                    logger.info(f"重试前等待 {delay:.1f} 秒...")
-                    time.sleep(delay)
-                    
-                    # 提供详细的重试信息
-                    if progress_callback:
-                        progress_callback(0, f"重试下载 ({retry_count}/{self.max_retries})...")
-                
-                # 根据下载类型选择下载方式
-                if download_type == "仅音频":
-                    return self._download_audio_only(url, proxy)
-                elif download_type == "仅视频":
-                    return self._download_video_only(url, quality, proxy)
-                else:  # 视频+音频
-                    return self._download_video_audio(url, quality, proxy)
-                    
+                result = self._download_by_type(task, proxy)
+            except WaitForSpace as e:
+                # 等待其他任务释放磁盘空间，不计入重试次数
+                self._release_proxy(proxy)
+                logger.info(f"{str(e)}，{ADMISSION_RETRY_DELAY:.0f} 秒后重试: {task.url}")
+                task.report(0, f"{str(e)}...")
+                delay = ADMISSION_RETRY_DELAY
             except Exception as e:
-                last_error = e
-                logger.error(f"下载错误: {str(e)} - 重试 {retry_count+1}/{self.max_retries}")
-                retry_count += 1
-        
-        # 如果所有重试都失败
-        error_type = type(last_error).__name__
-        error_msg = str(last_error)
-        detailed_msg = f"下载失败 ({error_type}): {error_msg}"
-        logger.error(detailed_msg)
-        raise Exception(detailed_msg)
-    
-    def _get_ydl_opts(self, proxy=None):
+                self._release_proxy(proxy)
+                self._release_space(task)
+                if task.is_cancelled:
+                    raise DownloadCancelled("下载已取消") from e
+                delay = self._handle_failure(task, e, proxy)
+            else:
+                self._release_proxy(proxy, succeeded=True)
+                return result
+            
+            if requeue:
+                self._schedule_retry(task, delay)
+                raise _RetryScheduled()
+            
+            # 在当前线程中等待，取消时立即结束
+            if task._cancel_event.wait(delay):
+                raise DownloadCancelled("下载已取消")
+    
+    def _download_by_type(self, task, proxy=None):
+        """根据下载类型选择下载方式"""
+        if task.download_type == "仅音频":
+            return self._download_audio_only(task, proxy)
+        elif task.download_type == "仅视频":
+            return self._download_video_only(task, proxy)
+        else:  # 视频+音频
+            return self._download_video_audio(task, proxy)
+    
+    def _handle_failure(self, task, error, proxy=None):
+        """记录下载错误并决定是否重试
+        
+        Returns:
+            float: 重试前的等待秒数
+            
+        Raises:
+            Exception: 不再重试时抛出带错误类型说明的异常
+        """
+        error_class, delay = self.retry_policy.decide(error, task.retry_attempts)
+        label = ERROR_LABELS[error_class]
+        
+        # 媒体地址过期时，丢弃缓存的视频信息以便重新解析
+        stale_cache = False
+        if self.metadata_cache and ("HTTP Error 403" in str(error) or "HTTP Error 410" in str(error)):
+            video_id = extract_video_id(task.url)
+            if video_id:
+                self.metadata_cache.invalidate(self._cache_key(video_id, proxy))
+            # 缓存的地址已失效，不是代理或服务器的问题
+            stale_cache = task.info_cached
+        
+        if self.concurrency and not stale_cache:
+            self.concurrency.record_error(error)
+        
+        # 代理、网络或限流错误时换用其他代理重试，前两者计入代理的失败次数
+        if proxy and not stale_cache and error_class in (ERROR_PROXY, ERROR_NETWORK, ERROR_THROTTLED):
+            task.failed_proxies.add(proxy)
+            if error_class != ERROR_THROTTLED:
+                self.proxy_manager.get_pool().report_failure(proxy, error)
+        
+        if error_class == ERROR_CANCELLED:
+            raise error
+        if delay is None:
+            detailed_msg = f"下载失败 ({label}): {str(error)}"
+            logger.error(detailed_msg)
+            raise Exception(detailed_msg) from error
+        
+        attempt = task.retry_attempts[error_class]
+        logger.warning(f"下载错误 ({label}): {str(error)} - {delay:.1f} 秒后第 {attempt} 次重试")
+        task.report(0, f"{label}，{delay:.0f} 秒后重试 ({attempt}/{self.retry_policy.budgets[error_class]})...")
+        return delay
+    
+    def _schedule_retry(self, task, delay):
+        """定时把任务放回队列末尾，等待期间不占用工作线程"""
+        task.status = STATUS_WAITING
+        if self.journal:
+            self.journal.update_state(task.task_id, task.status)
+        timer = threading.Timer(delay, self._requeue, args=(task,))
+        timer.daemon = True
+        with self.lock:
+            self._retry_timers[task.task_id] = timer
+        timer.start()
+    
+    def _requeue(self, task):
+        """把等待重试的任务放回队列，任务被取消时立即调用以便尽快结束"""
+        with self.lock:
+            timer = self._retry_timers.pop(task.task_id, None)
+        if timer is None:
+            return
+        timer.cancel()
+        self._queue.put(task)
+        self._ensure_workers()
+    
+    def _get_ydl_opts(self, task, proxy=None):
         """获取yt-dlp基本选项"""
         ydl_opts = {
             'quiet': True,
@@ -133,106 +968,448 @@ class YtdlpDownloader:
             'nocheckcertificate': True,
             'noprogress': True,
             'noplaylist': True,
+            # 保留.part文件并通过HTTP Range断点续传
+            'continuedl': True,
+            'nopart': False,
             'outtmpl': os.path.join(self.download_path, '%(title)s.%(ext)s'),
-            'progress_hooks': [self._progress_hook],
+            'progress_hooks': [task.progress_hook, self._make_throttle_hook(task),
+                               lambda d: self._journal_progress(task, d)],
         }
         
+        # 分段下载：把YouTube的直链格式拆成按Range请求的分段，多个连接并行下载后按顺序拼接
+        if self.config_manager and self.config_manager.is_segmented_download_enabled():
+            ydl_opts['concurrent_fragment_downloads'] = self.config_manager.get_concurrent_fragments()
+            ydl_opts['extractor_args'] = {'youtube': {'formats': ['dashy']}}
+        
         # 添加代理设置
         if proxy:
             ydl_opts['proxy'] = proxy
         
         return ydl_opts
     
-    def _download_audio_only(self, url, proxy=None):
-        """仅下载音频"""
-        ydl_opts = self._get_ydl_opts(proxy)
-        ydl_opts.update({
-            'format': 'bestaudio/best',
-            'postprocessors': [{
+    @contextmanager
+    def _open_ydl(self, ydl_opts):
+        """创建YoutubeDL，网络请求使用会话池中对应代理的共享连接"""
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if not self.sessions:
+                yield ydl
+                return
+            # 先于ydl关闭归还会话，共享连接不会随ydl一起关闭
+            with self.sessions.attach(ydl, ydl_opts.get('proxy')):
+                yield ydl
+    
+    def _make_throttle_hook(self, task):
+        """创建限速回调：按两次回调之间新下载的字节数向带宽调度器申请额度，并累计总接收字节数
+        
+        回调在yt-dlp的读取循环中执行，等待期间下载自然暂停，从而实现限速。
+        """
+        last_bytes = {}
+        lock = threading.Lock()
+        
+        def hook(d):
+            if d['status'] != 'downloading':
+                return
+            key = d.get('tmpfilename') or d.get('filename')
+            downloaded = d.get('downloaded_bytes') or 0
+            with lock:
+                # 断点续传时首次回调的字节数包含已有部分，只作为基准
+                amount = downloaded - last_bytes.get(key, downloaded)
+                last_bytes[key] = downloaded
+            if amount > 0:
+                with self.lock:
+                    self.bytes_received += amount
+                self.bandwidth.throttle(task.task_id, amount, task._cancel_event)
+        
+        return hook
+    
+    def _download_audio_only(self, task, proxy=None):
+        """仅下载音频
+        
+        默认保留原始音频流（优先m4a/AAC），不转码；设置为mp3时转码工作交给后处理队列。
+        """
+        ydl_opts = self._get_ydl_opts(task, proxy)
+        
+        if self.audio_format != "mp3":
+            ydl_opts['format'] = 'bestaudio[ext=m4a]/bestaudio/best'
+            path = self._extract_and_download(task, ydl_opts, "准备下载音频...")
+            if not task.from_store:
+                task.processing = PROCESSING_NATIVE
+            return path
+        
+        ydl_opts['format'] = 'bestaudio/best'
+        if not self._has_ffmpeg():
+            # 没有FFmpeg时由yt-dlp报告错误
+            ydl_opts['postprocessors'] = [{
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'mp3',
                 'preferredquality': '192',
-            }],
-        })
+            }]
+            task.processing = PROCESSING_TRANSCODE
+            return self._extract_and_download(task, ydl_opts, "准备下载音频...", merge=True, final_ext='mp3')
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            self._total_bytes = info.get('filesize') or 0
-            if self._progress_callback:
-                self._progress_callback(0, "准备下载音频...")
-            
-            # 检查是否取消
-            if self.is_cancelled:
-                return None
-            
-            # 下载音频
-            ydl.download([url])
-            
-            # 获取下载后的文件路径
-            title = info.get('title', 'video')
-            file_path = os.path.join(self.download_path, f"{title}.mp3")
-            return file_path
+        path = self._extract_and_download(task, ydl_opts, "准备下载音频...", merge=True, final_ext='mp3')
+        if not path or task.is_cancelled:
+            return None
+        if task.from_store:
+            return path
+        output_path = os.path.splitext(path)[0] + '.mp3'
+        if path == output_path:
+            task.processing = PROCESSING_NATIVE
+            return path
+        
+        task.processing = PROCESSING_TRANSCODE
+        return self._postprocess(task, extract_audio, path, output_path, 'mp3', '192')
     
-    def _download_video_only(self, url, quality, proxy=None):
+    def _download_video_only(self, task, proxy=None):
         """仅下载视频"""
         # 根据质量选择格式
-        format_code = self._get_format_code(quality, video_only=True)
+        format_code = self._get_format_code(task.quality, video_only=True)
         
-        ydl_opts = self._get_ydl_opts(proxy)
+        ydl_opts = self._get_ydl_opts(task, proxy)
         ydl_opts.update({
             'format': format_code,
         })
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            self._total_bytes = info.get('filesize') or 0
-            if self._progress_callback:
-                self._progress_callback(0, "准备下载视频...")
-            
-            # 检查是否取消
-            if self.is_cancelled:
-                return None
-            
-            # 下载视频
-            ydl.download([url])
-            
-            # 获取下载后的文件路径
-            title = info.get('title', 'video')
-            ext = info.get('ext', 'mp4')
-            file_path = os.path.join(self.download_path, f"{title}.{ext}")
-            return file_path
+        return self._extract_and_download(task, ydl_opts, "准备下载视频...")
     
-    def _download_video_audio(self, url, quality, proxy=None):
+    def _download_video_audio(self, task, proxy=None):
         """下载视频和音频"""
         # 根据质量选择格式
-        format_code = self._get_format_code(quality)
+        format_code = self._get_format_code(task.quality)
         
-        ydl_opts = self._get_ydl_opts(proxy)
+        ydl_opts = self._get_ydl_opts(task, proxy)
         ydl_opts.update({
             'format': format_code,
-            'merge_output_format': 'mp4',
+            # 按编码选择时，webm视频和音频合并为webm，其余合并为mp4
+            'merge_output_format': 'mp4/webm' if self.codec_aware else 'mp4',
         })
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            self._total_bytes = info.get('filesize') or 0
-            if self._progress_callback:
-                self._progress_callback(0, "准备下载视频...")
+        if not self._has_ffmpeg():
+            return self._extract_and_download(task, ydl_opts, "准备下载视频...", merge=True)
+        
+        with self._open_ydl(ydl_opts) as ydl:
+            info = self._extract_info(ydl, task)
+            if info.get('extractor_key') == 'Youtube' and info.get('id'):
+                task.video_id = info['id']
+            task.report(0, "准备下载视频...")
+            
+            if task.is_cancelled:
+                return None
+            
+            # 先只做格式选择，确定需要下载的视频流和音频流
+            selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+            formats = selected.get('requested_formats') or []
+            output_path = ydl.prepare_filename(selected)
+            stored = self._link_stored(task, selected, output_path)
+            if stored:
+                return stored
+            if len(formats) != 2:
+                # 单文件格式无需合并，按原方式下载
+                self._reserve_space(task, selected)
+                info = ydl.process_ie_result(info, download=True)
+                return self._get_downloaded_path(info)
+        
+        if os.path.exists(output_path):
+            logger.info(f"文件已存在，跳过下载: {output_path}")
+            return output_path
+        
+        streaming = self.streaming_merge and self._can_stream_merge(formats)
+        # 边下载边合并时不产生中间文件，最大占用即成品大小
+        self._reserve_space(task, selected, merge=not streaming)
+        
+        if streaming:
+            task.processing = PROCESSING_COPY
+            return self._stream_merge(task, formats, output_path, ydl_opts)
+        
+        # 视频流和音频流同时下载，两者都完成后立即合并
+        stop_event = threading.Event()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(formats)) as executor:
+            futures = [executor.submit(self._download_stream, task, info, fmt, ydl_opts, stop_event)
+                       for fmt in formats]
+            done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+            errors = [future.exception() for future in futures if future in done and future.exception()]
+            if errors:
+                # 一个流失败后立即停止另一个流，任务重试前不再为它浪费带宽
+                stop_event.set()
+                raise errors[0]
+            stream_paths = [future.result() for future in futures]
+        
+        if task.is_cancelled:
+            return None
+        
+        task.processing = PROCESSING_COPY
+        return self._postprocess(task, merge_streams, stream_paths[0], stream_paths[1], output_path)
+    
+    def _can_stream_merge(self, formats):
+        """检查能否边下载边合并
+        
+        FFmpeg从额外的管道描述符读取两个流，只支持POSIX系统；
+        每个流必须是HTTP直链或按URL给出的分段，由yt-dlp下载后写入管道。
+        不满足时按普通方式分别下载再合并。
+        """
+        if os.name == 'nt':
+            return False
+        for fmt in formats:
+            protocol = fmt.get('protocol')
+            if protocol in ('http', 'https') and fmt.get('url'):
+                continue
+            fragments = fmt.get('fragments')
+            if protocol == 'http_dash_segments' and fragments and all(f.get('url') for f in fragments):
+                continue
+            logger.info(f"格式 {fmt.get('format_id')} 不支持边下载边合并，改为下载后合并")
+            return False
+        return True
+    
+    def _stream_merge(self, task, formats, output_path, ydl_opts):
+        """边下载边合并：yt-dlp下载视频流和音频流并写入管道，FFmpeg从管道读取并复制码流写入最终文件
+        
+        不产生中间文件，磁盘只写入一次，下载结束即合并完成。
+        下载经过yt-dlp，代理、会话池、限速和暂停/取消与普通下载相同；不支持断点续传。
+        
+        Returns:
+            str: 合并后的文件路径
+        """
+        temp_path = output_path + '.merging' + os.path.splitext(output_path)[1]
+        pipes = [os.pipe() for _ in formats]
+        read_fds = [read_fd for read_fd, _ in pipes]
+        cmd = ["ffmpeg", "-y", "-loglevel", "error", "-nostdin"]
+        for read_fd in read_fds:
+            cmd += ["-i", f"pipe:{read_fd}"]
+        cmd += ["-map", "0:v:0", "-map", "1:a:0", "-c", "copy", temp_path]
+        
+        task.report(0, "边下载边合并...")
+        try:
+            process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE, pass_fds=read_fds)
+        except BaseException:
+            for read_fd, write_fd in pipes:
+                os.close(read_fd)
+                os.close(write_fd)
+            raise
+        for read_fd in read_fds:
+            os.close(read_fd)
+        
+        stop_event = threading.Event()
+        errors = []
+        
+        def feed(fmt, write_fd):
+            try:
+                self._feed_stream(task, fmt, write_fd, ydl_opts, temp_path, stop_event)
+            except BrokenPipeError:
+                # FFmpeg已退出，由主线程报告FFmpeg的错误
+                pass
+            except BaseException as e:
+                if stop_event.is_set():
+                    # 另一个流已失败或FFmpeg已结束
+                    return
+                # 一个流失败后停止另一个流并结束FFmpeg
+                errors.append(e)
+                stop_event.set()
+                process.kill()
+        
+        feeders = [threading.Thread(target=feed, args=(fmt, write_fd), daemon=True)
+                   for fmt, (_, write_fd) in zip(formats, pipes)]
+        for feeder in feeders:
+            feeder.start()
+        try:
+            _, stderr = process.communicate()
+        except BaseException:
+            stop_event.set()
+            process.kill()
+            process.wait()
+            raise
+        finally:
+            stop_event.set()
+            for feeder in feeders:
+                feeder.join()
+        
+        if errors or process.returncode != 0:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            if errors:
+                raise errors[0]
+            raise Exception(f"边下载边合并失败: {stderr.decode(errors='replace')}")
+        os.replace(temp_path, output_path)
+        task.report(1.0, "下载完成")
+        return output_path
+    
+    def _feed_stream(self, task, fmt, write_fd, ydl_opts, temp_path, stop_event):
+        """通过yt-dlp下载一个流并写入FFmpeg的输入管道，结束时关闭管道
+        
+        直链按Range分段请求，分段格式逐个请求分段URL。
+        进度、限速和任务日志按下载的字节数回调，与普通下载一致。
+        """
+        headers = fmt.get('http_headers') or {}
+        expected = fmt.get('filesize') or fmt.get('filesize_approx') or 0
+        # 每个流使用独立的限速回调，两个流的字节数分别累计
+        hooks = ([task.make_stream_hook(fmt['format_id'], expected, stop_event), self._make_throttle_hook(task)]
+                 + ydl_opts['progress_hooks'][2:])
+        downloaded = 0
+        
+        def report():
+            progress = {
+                'status': 'downloading',
+                'downloaded_bytes': downloaded,
+                'total_bytes': max(expected, downloaded),
+                'filename': temp_path,
+                'tmpfilename': temp_path,
+            }
+            for hook in hooks:
+                hook(progress)
+        
+        def copy_response(response, pipe):
+            nonlocal downloaded
+            received = 0
+            while True:
+                data = response.read(STREAM_READ_SIZE)
+                if not data:
+                    return received
+                pipe.write(data)
+                received += len(data)
+                downloaded += len(data)
+                report()
+        
+        # 从0开始报告，限速回调把之后的全部字节计入额度
+        report()
+        with os.fdopen(write_fd, 'wb') as pipe, self._open_ydl(ydl_opts) as ydl:
+            if fmt.get('protocol') == 'http_dash_segments':
+                for fragment in fmt['fragments']:
+                    copy_response(ydl.urlopen(yt_dlp.networking.Request(fragment['url'], headers=headers)), pipe)
+                return
+            
+            start = 0
+            while not expected or start < expected:
+                request = yt_dlp.networking.Request(
+                    fmt['url'], headers={**headers, 'Range': f"bytes={start}-{start + STREAM_RANGE_SIZE - 1}"})
+                try:
+                    response = ydl.urlopen(request)
+                except yt_dlp.networking.exceptions.HTTPError as e:
+                    if e.status == 416 and start > 0:
+                        # 上一个分段恰好到文件末尾
+                        break
+                    raise
+                received = copy_response(response, pipe)
+                # 服务器不支持Range时一次返回整个文件
+                if response.status != 206 or received < STREAM_RANGE_SIZE:
+                    break
+                start += received
+    
+    def _download_stream(self, task, info, fmt, ydl_opts, stop_event=None):
+        """单独下载一个视频流或音频流
+        
+        Args:
+            stop_event: threading.Event，置位时中止下载
+        
+        Returns:
+            str: 下载后的文件路径
+        """
+        stream_opts = dict(ydl_opts)
+        stream_opts.pop('merge_output_format', None)
+        stream_opts.update({
+            'format': fmt['format_id'],
+            # 与yt-dlp合并前的中间文件同名，便于断点续传
+            'outtmpl': os.path.join(self.download_path, '%(title)s.f%(format_id)s.%(ext)s'),
+            # 替换任务级进度回调，保留限速和任务日志回调
+            'progress_hooks': [task.make_stream_hook(fmt['format_id'], fmt.get('filesize') or fmt.get('filesize_approx'),
+                                                     stop_event)]
+                              + ydl_opts['progress_hooks'][1:],
+        })
+        with self._open_ydl(stream_opts) as ydl:
+            result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+        return self._get_downloaded_path(result)
+    
+    def _has_ffmpeg(self):
+        """检查FFmpeg是否可用，结果只检测一次"""
+        if self._ffmpeg_available is None:
+            self._ffmpeg_available = self.check_ffmpeg()
+        return self._ffmpeg_available
+    
+    def _extract_and_download(self, task, ydl_opts, prepare_text, merge=False, final_ext=None):
+        """解析视频信息并下载
+        
+        只解析一次页面，随后直接用已解析的信息下载，
+        避免ydl.download()再次请求页面、播放器JS和签名。
+        
+        Args:
+            merge: 下载后是否还需要合并或转码，用于估算磁盘占用
+            final_ext: 转码后的扩展名，用于在内容存储中查找转码结果
+        
+        Returns:
+            str: 下载后的文件路径，任务被取消时返回None
+        """
+        with self._open_ydl(ydl_opts) as ydl:
+            info = self._extract_info(ydl, task)
+            if info.get('extractor_key') == 'Youtube' and info.get('id'):
+                task.video_id = info['id']
+            task.report(0, prepare_text)
             
             # 检查是否取消
-            if self.is_cancelled:
+            if task.is_cancelled:
                 return None
             
-            # 下载视频
-            ydl.download([url])
+            if self.admission or self.store:
+                selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+                output_path = ydl.prepare_filename(selected)
+                if final_ext:
+                    output_path = os.path.splitext(output_path)[0] + '.' + final_ext
+                stored = self._link_stored(task, selected, output_path)
+                if stored:
+                    return stored
+                self._reserve_space(task, selected, merge)
             
-            # 获取下载后的文件路径
-            title = info.get('title', 'video')
-            file_path = os.path.join(self.download_path, f"{title}.mp4")
-            return file_path
+            # 使用已解析的信息选择格式并下载
+            info = ydl.process_ie_result(info, download=True)
+            return self._get_downloaded_path(info)
+    
+    def _extract_info(self, ydl, task):
+        """解析视频信息，优先使用本地缓存
+        
+        Returns:
+            dict: 未经格式选择的原始视频信息
+        """
+        task.info_cached = False
+        proxy = ydl.params.get('proxy')
+        video_id = extract_video_id(task.url)
+        if self.metadata_cache and video_id:
+            info = self.metadata_cache.get(self._cache_key(video_id, proxy))
+            if info is not None:
+                task.info_cached = True
+                return info
+        
+        info = ydl.extract_info(task.url, download=False, process=False)
+        
+        # 只缓存YouTube单个视频，播放列表等结果不缓存
+        if (self.metadata_cache and info.get('extractor_key') == 'Youtube'
+                and info.get('id') and info.get('_type', 'video') == 'video'):
+            try:
+                self.metadata_cache.put(self._cache_key(info['id'], proxy),
+                                        ydl.sanitize_info(info, remove_private_keys=True))
+            except Exception as e:
+                logger.warning(f"保存视频信息缓存失败: {str(e)}")
+        return info
+    
+    def _cache_key(self, video_id, proxy=None):
+        """视频信息缓存的键
+        
+        媒体地址与解析时的出口IP绑定，换用其他代理后无法使用，因此按视频ID和代理分别缓存。
+        代理的用户名和密码不写入缓存。
+        """
+        if not proxy:
+            return f"{video_id}@direct"
+        parsed = urlparse(proxy)
+        return f"{video_id}@{parsed.scheme}://{parsed.hostname}:{parsed.port or ''}"
+    
+    def _get_downloaded_path(self, info):
+        """从yt-dlp返回的信息中获取最终文件路径（包含合并、转码后的结果）"""
+        downloads = info.get('requested_downloads') or []
+        if downloads:
+            return downloads[-1].get('filepath') or downloads[-1].get('_filename')
+        return info.get('filepath') or info.get('_filename')
     
     def _get_format_code(self, quality, video_only=False):
         """根据质量获取格式代码"""
+        if self.codec_aware and not video_only:
+            return self._get_copy_format_code(quality)
         if video_only:
             # 仅视频格式
             if quality == "最高质量":
@@ -270,53 +1447,165 @@ class YtdlpDownloader:
             else:
                 return "bestvideo[ext=mp4]+bestaudio/best[ext=mp4]/best"
     
-    def _progress_hook(self, d):
-        """下载进度回调"""
-        if self.is_cancelled:
-            raise Exception("下载已取消")
+    def _get_copy_format_code(self, quality):
+        """按编码选择视频和音频，保证两者可以用 -c copy 合并到同一容器中
         
-        # 暂停下载
-        while self.is_paused and not self.is_cancelled:
-            time.sleep(0.1)
-        
-        if self.is_cancelled:
-            raise Exception("下载已取消")
-        
-        # 计算进度
-        if d['status'] == 'downloading':
-            # 获取下载进度
-            downloaded = d.get('downloaded_bytes', 0)
-            total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-            
-            if total > 0:
-                with self.lock:
-                    self._downloaded_bytes = downloaded
-                    self._total_bytes = total
-                    progress = downloaded / total
-                    
-                    # 调用进度回调
-                    if self._progress_callback:
-                        self._progress_callback(progress, f"下载中: {d.get('_percent_str', '0%')}")
+        优先H.264/AV1的mp4视频配AAC的m4a音频，其次VP9的webm视频配Opus的webm音频，
+        都没有时使用已包含音频的单个文件。
+        """
+        height = QUALITY_HEIGHTS.get(quality)
+        limit = f"[height<={height}]" if height else ""
+        return (f"bestvideo{limit}[ext=mp4]+bestaudio[ext=m4a]/"
+                f"bestvideo{limit}[ext=webm]+bestaudio[ext=webm]/"
+                f"best{limit}[ext=mp4]/best")
+    
+    def get_task(self, task_id):
+        """获取正在运行的任务"""
+        with self.lock:
+            return self.tasks.get(task_id)
+    
+    def _active_tasks(self, task_ids=None):
+        """获取正在运行任务的快照
         
-        elif d['status'] == 'finished':
-            if self._progress_callback:
-                self._progress_callback(1.0, "下载完成，正在处理...")
+        Args:
+            task_ids: 只返回其中的任务，None表示全部任务
+        """
+        with self.lock:
+            if task_ids is None:
+                return list(self.tasks.values())
+            return [self.tasks[task_id] for task_id in task_ids if task_id in self.tasks]
     
-    def pause(self):
-        """暂停下载"""
-        self.is_paused = True
+    def pause(self, task_id=None, task_ids=None):
+        """暂停下载，未指定task_id和task_ids时暂停全部任务"""
+        for task in self._active_tasks([task_id] if task_id else task_ids):
+            task.pause()
         logger.info("下载已暂停")
     
-    def resume(self):
-        """继续下载"""
-        self.is_paused = False
+    def resume(self, task_id=None, task_ids=None):
+        """继续下载，未指定task_id和task_ids时继续全部任务"""
+        for task in self._active_tasks([task_id] if task_id else task_ids):
+            task.resume()
         logger.info("下载已继续")
     
-    def cancel(self):
-        """取消下载"""
-        self.is_cancelled = True
+    def cancel(self, task_id=None, task_ids=None):
+        """取消下载，未指定task_id和task_ids时取消全部任务"""
+        for task in self._active_tasks([task_id] if task_id else task_ids):
+            task.cancel()
+            self._requeue(task)
+            if task.postprocess:
+                task.postprocess.cancel()
         logger.info("下载已取消")
     
+    def shutdown(self):
+        """程序退出时中断全部任务，任务日志中保留这些任务以便下次继续下载"""
+        if self.concurrency:
+            self.concurrency.stop()
+        if self.proxy_manager:
+            self.proxy_manager.stop_pool()
+        if self.sessions:
+            self.sessions.close()
+        for task in self._active_tasks():
+            task.interrupt()
+            self._requeue(task)
+        # 取消尚未开始的后处理，对应的任务下次启动时重新合并
+        self.postprocessor.shutdown()
+        logger.info("下载已中断，未完成的任务将在下次启动时继续")
+    
+    def expand_playlist(self, url, use_proxy=None, _depth=0):
+        """逐页展开播放列表或频道，按发现顺序逐个返回视频链接
+        
+        这是一个生成器：yt-dlp按页请求列表内容，调用方每取一个条目才会继续向后解析，
+        因此无需等待整个频道解析完成，内存占用也与频道大小无关。
+        
+        Args:
+            url: 播放列表或频道链接
+            use_proxy: 是否使用代理，None表示使用当前设置
+        """
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'nocheckcertificate': True,
+            'extract_flat': 'in_playlist',
+            'lazy_playlist': True,
+        }
+        proxy = self._resolve_proxy(use_proxy)
+        if proxy:
+            ydl_opts['proxy'] = proxy
+        
+        try:
+            with self._open_ydl(ydl_opts) as ydl:
+                # 不处理结果，entries保持为按需翻页的生成器，翻页时仍需使用同一个ydl
+                info = ydl.extract_info(url, download=False, process=False)
+                for entry in self._iter_playlist_entries(info, use_proxy, _depth):
+                    yield entry
+        finally:
+            self._release_proxy(proxy)
+    
+    def _iter_playlist_entries(self, info, use_proxy, depth):
+        """遍历播放列表条目，频道首页等嵌套列表最多向下展开两层"""
+        result_type = info.get('_type', 'video')
+        if result_type == 'video':
+            yield info.get('webpage_url') or info.get('url')
+            return
+        
+        if result_type in ('url', 'url_transparent'):
+            if info.get('ie_key') == 'Youtube' and info.get('id'):
+                yield f"https://www.youtube.com/watch?v={info['id']}"
+            elif depth < 2 and info.get('url'):
+                yield from self.expand_playlist(info['url'], use_proxy, depth + 1)
+            return
+        
+        for entry in info.get('entries') or []:
+            if not entry:
+                continue
+            yield from self._iter_playlist_entries(entry, use_proxy, depth + 1)
+    
+    def stream_playlist(self, url, on_entry, on_finish=None, use_proxy=None, max_pending=200, cancel_event=None):
+        """在后台线程中展开播放列表，每发现一个视频就调用on_entry
+        
+        下载队列中排队的任务超过max_pending时暂停展开，
+        保证超大频道不会一次性把所有条目压入内存。
+        
+        Args:
+            url: 播放列表或频道链接
+            on_entry: 发现视频时的回调，签名为 on_entry(video_url)
+            on_finish: 展开结束后的回调，签名为 on_finish(count, error)
+            use_proxy: 是否使用代理
+            max_pending: 下载队列中允许排队的最大任务数
+            cancel_event: threading.Event，置位后停止展开
+            
+        Returns:
+            threading.Thread: 后台展开线程
+        """
+        def run():
+            count = 0
+            error = None
+            try:
+                for video_url in self.expand_playlist(url, use_proxy):
+                    if cancel_event and cancel_event.is_set():
+                        break
+                    # 下载队列积压时等待，避免无限制地展开
+                    while self._queue.qsize() >= max_pending:
+                        if cancel_event and cancel_event.wait(0.5):
+                            break
+                        elif not cancel_event:
+                            time.sleep(0.5)
+                    if cancel_event and cancel_event.is_set():
+                        break
+                    on_entry(video_url)
+                    count += 1
+            except Exception as e:
+                error = e
+                logger.error(f"展开播放列表失败: {str(e)}")
+            finally:
+                logger.info(f"播放列表展开结束，共 {count} 个视频: {url}")
+                if on_finish:
+                    on_finish(count, error)
+        
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+    
     def check_ffmpeg(self):
         """检查FFmpeg是否已安装"""
         try:
@@ -357,25 +1646,23 @@ class YtdlpDownloader:
     
     def start_concurrent_downloads(self, urls, quality="1080p", download_type="视频+音频", progress_callback=None):
         """启动并发下载"""
-        def single_progress_callback(progress, status_text=None, url=None):
-            # 包装进度回调，带上url
-            if progress_callback:
-                progress_callback(progress, status_text, url)
-
+        tasks = [
+            self.create_task(
+                url, quality, download_type,
+                lambda p, s=None, u=url: progress_callback(p, s, u) if progress_callback else None
+            ) for url in urls
+        ]
+        
         with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_url = {
-                executor.submit(
-                    self.download, url, quality, download_type,
-                    lambda p, s=None, u=url: single_progress_callback(p, s, u)
-                ): url for url in urls
-            }
-            for future in concurrent.futures.as_completed(future_to_url):
-                url = future_to_url[future]
+            future_to_task = {executor.submit(self.run_task, task): task for task in tasks}
+            for future in concurrent.futures.as_completed(future_to_task):
+                task = future_to_task[future]
                 try:
                     future.result()
                 except Exception as exc:
                     if progress_callback:
-                        progress_callback(0, f"下载失败: {exc}", url)
+                        progress_callback(0, f"下载失败: {exc}", task.url)
                 else:
                     if progress_callback:
-                        progress_callback(100, "下载完成", url)
\ No newline at end of file
+                        progress_callback(100, "下载完成", task.url)
+        return tasks